@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+def normalize_table_status(apps, schema_editor):
+    """Store the "A"/"U" codes instead of the labels written so far."""
+    Table = apps.get_model("cafe", "Table")
+    Table.objects.filter(status="available").update(status="A")
+    Table.objects.exclude(status="A").update(status="U")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cafe", "0006_alter_table_status"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="table",
+            name="status",
+            field=models.CharField(
+                choices=[("A", "available"), ("U", "unavailable")],
+                default="A",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(
+            normalize_table_status, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:38
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cafe", "0007_table_status_codes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="table",
+            name="number",
+            field=models.PositiveIntegerField(
+                validators=[
+                    django.core.validators.MinValueValidator(1),
+                    django.core.validators.MaxValueValidator(999),
+                ]
+            ),
+        ),
+    ]
@@ -7,8 +7,12 @@ It defines the following models:
 - Table: Represents a table within a cafe, including its number, status, and the cafe it belongs to.
 """
 
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+# Table numbers are bit positions of the occupancy bitmaps (see cafe/tables.py)
+MAX_TABLE_NUMBER = 999
+
 
 class Cafe(models.Model):
     """
@@ -51,14 +55,16 @@ class Table(models.Model):
     """
 
     cafe = models.ForeignKey(Cafe, on_delete=models.CASCADE)
-    number = models.PositiveIntegerField()
+    number = models.PositiveIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(MAX_TABLE_NUMBER)]
+    )
     status = models.CharField(
         max_length=20,
         choices=[
             ("A", "available"),
             ("U", "unavailable"),
         ],
-        default="available",
+        default="A",
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -76,9 +82,9 @@ class Table(models.Model):
         Check if the table is available.
 
         Returns:
-            bool: True if the table status is "available", False otherwise.
+            bool: True if the table status is "A" (available), False otherwise.
         """
-        return self.status == "available"
+        return self.status == "A"
 
     def which_number(self):
         """
@@ -0,0 +1,19 @@
+"""
+signals.py
+
+This module keeps the table occupancy bitmaps (see cafe/tables.py) coherent
+with tables saved or deleted outside the allocation service, e.g. from the
+admin.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Table
+from .tables import tables_changed
+
+
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def table_changed(sender, instance, **kwargs):
+    """Bumps the table version once the change is committed."""
+    tables_changed()
@@ -0,0 +1,203 @@
+"""
+tables.py
+
+This module allocates and releases cafe tables and answers occupancy queries.
+
+Tables are taken and freed with a single conditional UPDATE (``WHERE status =
+'A'`` to take, ``WHERE status = 'U'`` to free), so the check and the change
+happen in one round trip and two customers can never take the same table: the
+database lets only one of the racing UPDATEs match the row.
+
+Occupancy is read from an in-memory bitmap per cafe, built with a single query
+and tagged with the table version kept in the shared cache. Every change made
+through this module, a Table save or a Table delete (see cafe/signals.py) bumps
+the version once its transaction commits, so each process rebuilds its bitmaps
+on the next read. Bitmaps are also rebuilt after TABLE_OCCUPANCY_TIMEOUT
+seconds, to pick up changes made with raw queryset updates.
+
+Table numbers repeat across cafes, so a table is always looked up by its cafe
+and its number, and numbers outside 1..MAX_TABLE_NUMBER are rejected before
+they reach the database or the bitmaps.
+"""
+
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import MAX_TABLE_NUMBER, Table
+
+AVAILABLE = "A"
+UNAVAILABLE = "U"
+
+TABLE_VERSION_KEY = "cafe:tables:version"
+
+
+class TableUnavailable(Exception):
+    """Raised when a table is already taken."""
+
+
+def table_number(number):
+    """
+    Convert a table number, as entered by a customer, to an int.
+
+    Raises:
+        Table.DoesNotExist: If the number is not a valid table number.
+    """
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        raise Table.DoesNotExist(f"There is no table {number}.") from None
+    if not 1 <= number <= MAX_TABLE_NUMBER:
+        raise Table.DoesNotExist(f"There is no table {number}.")
+    return number
+
+
+class TableOccupancy:
+    """
+    Occupancy of the tables of every cafe at a given table version.
+
+    Bit ``n`` of a cafe's bitmap stands for table number ``n``.
+
+    Attributes:
+        version (int): The table version the bitmaps were built for.
+        tables (dict): Maps cafe IDs to the bitmap of their tables.
+        occupied (dict): Maps cafe IDs to the bitmap of their occupied tables.
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.built_at = time.monotonic()
+        tables = defaultdict(int)
+        occupied = defaultdict(int)
+        for cafe_id, number, status in rows:
+            tables[cafe_id] |= 1 << number
+            if status != AVAILABLE:
+                occupied[cafe_id] |= 1 << number
+        self.tables = dict(tables)
+        self.occupied = dict(occupied)
+
+    def is_free(self, number, cafe_id):
+        """Return whether a table exists and is free."""
+        if not 1 <= number <= MAX_TABLE_NUMBER:
+            return False
+        bit = 1 << number
+        return bool(self.tables.get(cafe_id, 0) & bit) and not (
+            self.occupied.get(cafe_id, 0) & bit
+        )
+
+    def numbers(self, cafe_id, occupied=False):
+        """Return the numbers of a cafe's free (or occupied) tables, ascending."""
+        bitmap = self.tables.get(cafe_id, 0)
+        occupied_bitmap = self.occupied.get(cafe_id, 0)
+        bitmap = bitmap & occupied_bitmap if occupied else bitmap & ~occupied_bitmap
+        numbers = []
+        while bitmap:
+            low_bit = bitmap & -bitmap
+            numbers.append(low_bit.bit_length() - 1)
+            bitmap ^= low_bit
+        return numbers
+
+    def summary(self):
+        """
+        Return the occupancy of every cafe.
+
+        Returns:
+            dict: Maps cafe IDs to dicts listing their ``free`` and ``occupied``
+            table numbers.
+        """
+        return {
+            cafe_id: {
+                "free": self.numbers(cafe_id),
+                "occupied": self.numbers(cafe_id, occupied=True),
+            }
+            for cafe_id in sorted(self.tables)
+        }
+
+
+_occupancy = None
+
+
+def get_table_version():
+    """Return the current table version, starting a new one if none is cached."""
+    return cache.get_or_set(TABLE_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_table_version():
+    """Start a new table version so that every process rebuilds its bitmaps."""
+    cache.set(TABLE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def tables_changed():
+    """Bump the table version once the current transaction commits."""
+    transaction.on_commit(bump_table_version)
+
+
+def get_occupancy():
+    """
+    Return the occupancy bitmaps of this process, rebuilding them with a single
+    query when the table version moved on or they are too old.
+
+    Returns:
+        TableOccupancy: The occupancy of the tables of every cafe.
+    """
+    global _occupancy
+    version = get_table_version()
+    occupancy = _occupancy
+    timeout = getattr(settings, "TABLE_OCCUPANCY_TIMEOUT", 60)
+    if (
+        occupancy is None
+        or occupancy.version != version
+        or time.monotonic() - occupancy.built_at > timeout
+    ):
+        rows = Table.objects.values_list("cafe_id", "number", "status")
+        occupancy = _occupancy = TableOccupancy(version, list(rows))
+    return occupancy
+
+
+def allocate_table(cafe, number):
+    """
+    Take a free table in a single conditional UPDATE.
+
+    Call it inside the transaction that creates the order, so that the table
+    is freed again if the order fails.
+
+    Args:
+        cafe (Cafe or int): The cafe of the table, or its ID.
+        number (int or str): The table number.
+
+    Raises:
+        Table.DoesNotExist: If there is no such table.
+        TableUnavailable: If the table is already taken.
+    """
+    number = table_number(number)
+    tables = Table.objects.filter(cafe=cafe, number=number)
+    taken = tables.filter(status=AVAILABLE).update(status=UNAVAILABLE)
+    if not taken:
+        if not tables.exists():
+            raise Table.DoesNotExist(f"There is no table {number}.")
+        raise TableUnavailable(f"Table {number} is not available.")
+    tables_changed()
+
+
+def release_table(cafe, number):
+    """
+    Free a taken table in a single conditional UPDATE.
+
+    Args:
+        cafe (Cafe or int): The cafe of the table, or its ID.
+        number (int or str): The table number.
+
+    Returns:
+        bool: True if the table was taken and is now free.
+    """
+    try:
+        number = table_number(number)
+    except Table.DoesNotExist:
+        return False
+    released = Table.objects.filter(
+        cafe=cafe, number=number, status=UNAVAILABLE
+    ).update(status=AVAILABLE)
+    if released:
+        tables_changed()
+    return bool(released)
@@ -1,9 +1,11 @@
 from datetime import time
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from menu.models import MenuItem, Category
-from .models import Cafe, Table
+from .models import MAX_TABLE_NUMBER, Cafe, Table
+from .tables import TableUnavailable, allocate_table, get_occupancy, release_table
 
 
 class MyViewTests(TestCase):
@@ -126,3 +128,80 @@ class CafeModelTests(TestCase):
         """Test the string representation of the table."""
         table = Table.objects.create(cafe=self.cafe, number=3)
         self.assertEqual(str(table), "Table 3 in Test Cafe")
+
+
+class TableAllocationTests(TestCase):
+    def setUp(self):
+        """Create two cafes with a few free tables."""
+        cache.clear()
+        self.cafe = Cafe.objects.create(
+            name="Test Cafe",
+            address="123 Test Street",
+            opening_time=time(8, 0),
+            closing_time=time(20, 0),
+        )
+        self.other_cafe = Cafe.objects.create(
+            name="Other Cafe",
+            address="456 Test Street",
+            opening_time=time(8, 0),
+            closing_time=time(20, 0),
+        )
+        for number in (1, 2, 3):
+            Table.objects.create(cafe=self.cafe, number=number)
+        Table.objects.create(cafe=self.other_cafe, number=10)
+
+    def test_table_is_taken_once(self):
+        """Test that a table is taken in one query and cannot be taken twice."""
+        with self.assertNumQueries(1):
+            allocate_table(self.cafe, 2)
+        self.assertEqual(Table.objects.get(number=2).status, "U")
+        with self.assertRaises(TableUnavailable):
+            allocate_table(self.cafe, 2)
+        with self.assertRaises(Table.DoesNotExist):
+            allocate_table(self.cafe, 4)
+
+        self.assertTrue(release_table(self.cafe, 2))
+        self.assertFalse(release_table(self.cafe, 2))
+        self.assertTrue(Table.objects.get(number=2).is_available())
+
+    def test_tables_are_scoped_to_their_cafe(self):
+        """Test that tables with the same number in two cafes are separate."""
+        Table.objects.create(cafe=self.other_cafe, number=2)
+        allocate_table(self.other_cafe.pk, "2")
+        self.assertEqual(Table.objects.get(cafe=self.cafe, number=2).status, "A")
+        allocate_table(self.cafe, 2)
+        with self.assertRaises(Table.DoesNotExist):
+            allocate_table(self.other_cafe, 3)
+
+        self.assertTrue(release_table(self.other_cafe, 2))
+        self.assertEqual(Table.objects.get(cafe=self.cafe, number=2).status, "U")
+
+    def test_table_numbers_out_of_range(self):
+        """Test that invalid table numbers are rejected without a query."""
+        for number in (0, -1, MAX_TABLE_NUMBER + 1, 10**100, "abc", None):
+            with self.assertNumQueries(0):
+                with self.assertRaises(Table.DoesNotExist):
+                    allocate_table(self.cafe, number)
+                self.assertFalse(release_table(self.cafe, number))
+        self.assertFalse(get_occupancy().is_free(10**100, self.cafe.pk))
+
+    def test_occupancy_bitmaps_follow_changes(self):
+        """Test the bulk occupancy and its refresh after committed changes."""
+        with self.assertNumQueries(1):
+            occupancy = get_occupancy()
+            self.assertIs(get_occupancy(), occupancy)
+        self.assertEqual(
+            occupancy.summary(),
+            {
+                self.cafe.pk: {"free": [1, 2, 3], "occupied": []},
+                self.other_cafe.pk: {"free": [10], "occupied": []},
+            },
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            allocate_table(self.cafe, 3)
+        occupancy = get_occupancy()
+        self.assertEqual(occupancy.numbers(self.cafe.pk, occupied=True), [3])
+        self.assertFalse(occupancy.is_free(3, self.cafe.pk))
+        self.assertTrue(occupancy.is_free(10, self.other_cafe.pk))
+        self.assertFalse(occupancy.is_free(4, self.cafe.pk))
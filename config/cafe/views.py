@@ -1,6 +1,9 @@
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views import View
-from menu.models import MenuItem, Category
+from django.views.decorators.http import condition
+from menu.caching import cache_menu_page, menu_etag, menu_last_modified
+from menu.snapshot import get_menu_snapshot
 
 
 class MyView(View):
@@ -10,14 +13,19 @@ class MyView(View):
 
     template_name = "index.html"
 
+    @method_decorator(
+        [
+            condition(etag_func=menu_etag, last_modified_func=menu_last_modified),
+            cache_menu_page,
+        ]
+    )
     def get(self, request):
         """
         Handles GET requests for the index page.
         """
-        menu_items = MenuItem.objects.filter(
-            is_available=True
-        )  # Only get available items
-        cat_items = Category.objects.all()
+        snapshot = get_menu_snapshot()  # Only holds available items
+        menu_items = snapshot.items
+        cat_items = snapshot.categories
         context = {"cat_item": cat_items, "menu_items": menu_items}
         return render(request, self.template_name, context)
 
@@ -3,6 +3,10 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live order board streams its events from an async view (see
+order/events.py), which needs the project to be served by an ASGI server. The
+board's pub/sub is local to the process, so serve it from a single process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -11,8 +11,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "staff.instrumentation.QueryStatsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -98,6 +101,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use a shared backend (e.g. Redis or Memcached) when running several worker
+# processes, so cache invalidation reaches every process.
+
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="cafe-shop"),
+    },
+    # Sessions of the cached_db session tier (see SESSION_TIER below)
+    "sessions": {
+        "BACKEND": config(
+            "SESSION_CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": config("SESSION_CACHE_LOCATION", default="cafe-shop-sessions"),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -158,3 +184,107 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 SESSION_COOKIE_AGE = 60 * 60  # an hour
+
+# Session tier:
+# - "db": every request with a session reads it from the database.
+# - "cached_db": sessions are read from the "sessions" cache and written
+#   through to the database. With several processes, give that cache a shared
+#   backend, or a logout in one process may not reach the others.
+# - "signed_cookies": the session lives in a signed (not encrypted) cookie and
+#   never touches the database. Suits customer-only deployments: the client
+#   can read its session and a copied cookie stays valid until it expires.
+#   Carts must then be kept out of the session (see CART_BACKEND below).
+# Purge expired database sessions periodically with "manage.py purge_sessions".
+SESSION_TIER = config("SESSION_TIER", default="cached_db")
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_TIER]
+SESSION_CACHE_ALIAS = "sessions"
+
+# SQL instrumentation (see staff/instrumentation.py): queries per request are
+# reported in a Server-Timing header and on the staff query stats page, and a
+# request running more queries than the budget of its URL name logs a warning.
+QUERY_STATS_ENABLED = config("QUERY_STATS_ENABLED", default=True, cast=bool)
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGETS = {
+    # Pages that run a constant number of queries, whatever the number of rows
+    "menu": 10,
+    "staff_checkout": 10,
+    "manager_checkout": 10,
+    "order_board": 10,
+    # Savepoints of the order transaction included
+    "submit_order": 30,
+}
+
+# Password policy (see staff/hashers.py). The first hasher hashes new passwords;
+# the others only verify older hashes, which are rehashed on the next login.
+PASSWORD_HASHER = config(
+    "PASSWORD_HASHER", default="staff.hashers.PolicyPBKDF2PasswordHasher"
+)
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher
+    for hasher in [
+        "staff.hashers.PolicyPBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+        "django.contrib.auth.hashers.Argon2PasswordHasher",
+        "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+        "django.contrib.auth.hashers.ScryptPasswordHasher",
+    ]
+    if hasher != PASSWORD_HASHER
+]
+# PBKDF2 iterations of new hashes; Django's default when unset
+STAFF_PASSWORD_ITERATIONS = config("STAFF_PASSWORD_ITERATIONS", default=0, cast=int)
+
+# Recent successful staff logins remembered in process memory, so that logging
+# in again on a shared tablet within a shift skips the password hasher
+# (see staff/backends.py); a size of 0 turns the cache off
+STAFF_AUTH_CACHE_SIZE = config("STAFF_AUTH_CACHE_SIZE", default=100, cast=int)
+STAFF_AUTH_CACHE_TIMEOUT = 60 * 60 * 8  # a shift
+
+# Server-side cart backend: "order.cart.SessionCartStore" or
+# "order.cart.LRUCartStore" (in-process, single server process only)
+CART_BACKEND = config("CART_BACKEND", default="order.cart.SessionCartStore")
+if SESSION_TIER == "signed_cookies" and CART_BACKEND == "order.cart.SessionCartStore":
+    # The cart would travel in the session cookie, and browsers silently drop
+    # cookies over 4 KB, emptying any cart of more than a few items
+    raise ImproperlyConfigured(
+        "The signed_cookies SESSION_TIER cannot keep carts in the session; "
+        'set CART_BACKEND to "order.cart.LRUCartStore".'
+    )
+CART_LRU_MAX_CARTS = config("CART_LRU_MAX_CARTS", default=1000, cast=int)
+CART_COOKIE_AGE = 60 * 60  # an hour
+
+MENU_CACHE_TIMEOUT = 60 * 60  # cached menu snapshots expire after an hour
+
+# Dashboard reports are cached for five minutes, or until completed orders
+# change (see staff/signals.py).
+REPORT_CACHE_TIMEOUT = 60 * 5
+
+# Orders per page of the checkout order lists (see staff/pagination.py)
+ORDER_PAGE_SIZE = config("ORDER_PAGE_SIZE", default=50, cast=int)
+
+# Live order board (see order/events.py). The event stream is served over ASGI
+# and its pub/sub is local to the process.
+ORDER_EVENT_HISTORY = 100  # events replayed to streams that reconnect
+ORDER_EVENT_QUEUE_SIZE = 100  # events buffered for a slow device
+ORDER_EVENT_KEEPALIVE = 15  # seconds between keepalive comments
+ORDER_EVENT_RETRY_MS = 3000  # reconnection delay asked of the browsers
+
+# Table occupancy bitmaps (see cafe/tables.py) are rebuilt after a minute even
+# when no change went through the allocation service
+TABLE_OCCUPANCY_TIMEOUT = 60
+
+# Loyalty points (see customer/points.py): how long balances stay cached and how
+# many ledger entries the compact_points command folds per transaction
+POINTS_BALANCE_CACHE_TIMEOUT = 60 * 5
+POINTS_COMPACTION_BATCH_SIZE = 1000
+
+# Background Excel exports (see staff/export_jobs.py). With 0 workers an export
+# is built inside the request that starts it.
+EXPORT_SPOOL_DIR = config(
+    "EXPORT_SPOOL_DIR", default=os.path.join(tempfile.gettempdir(), "cafe-exports")
+)
+EXPORT_MAX_WORKERS = config("EXPORT_MAX_WORKERS", default=2, cast=int)
+EXPORT_JOB_TIMEOUT = 60 * 60 * 24  # job records and spooled files last a day
@@ -24,7 +24,7 @@ class CustomerAdmin(admin.ModelAdmin):
         "updated_at",
     )
 
-    list_filter = ("is_active",)
+    list_filter = ("is_active", "gender")
 
     search_fields = (
         "first_name",
@@ -46,6 +46,8 @@ class CustomerAdmin(admin.ModelAdmin):
                     "first_name",
                     "last_name",
                     "phone_number",
+                    "gender",
+                    "date_of_birth",
                     "table_number",
                     "cafe",
                     "points",
@@ -0,0 +1,25 @@
+"""
+compact_points.py
+
+Management command that folds the loyalty points ledger into the points of the
+customers. Run it periodically (e.g. from cron) to keep the ledger short.
+"""
+
+from django.core.management.base import BaseCommand
+from customer.points import compact_points
+
+
+class Command(BaseCommand):
+    help = "Fold the loyalty points ledger into the points of the customers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of ledger entries folded per transaction "
+            "(default: POINTS_COMPACTION_BATCH_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        folded = compact_points(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Folded {folded} points entries."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0008_alter_customer_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='date_of_birth',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='gender',
+            field=models.CharField(blank=True, choices=[('female', 'Female'), ('man', 'Man'), ('Uncertain', 'Uncertain')], max_length=10, null=True),
+        ),
+    ]
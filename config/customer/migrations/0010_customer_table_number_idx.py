@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customer", "0009_customer_gender_date_of_birth"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["table_number"], name="customer_table_number_idx"
+            ),
+        ),
+    ]
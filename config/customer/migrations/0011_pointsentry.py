@@ -0,0 +1,49 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customer", "0010_customer_table_number_idx"),
+        ("order", "0011_order_order_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PointsEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("points", models.PositiveIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="points_entries",
+                        to="customer.customer",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="points_entries",
+                        to="order.order",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -2,7 +2,8 @@
 models.py
 
 This module defines the Customer model for the application,
-including attributes related to customer information and validation.
+including attributes related to customer information and validation, and the
+ledger of loyalty points accrued by customers.
 """
 
 from django.db import models
@@ -22,12 +23,22 @@ class Customer(models.Model):
         email (str): The email address of the customer (unique).
         password (str): The hashed password of the customer.
         phone_number (str): The phone number of the customer (validated).
-        points (int): Reward points associated with the customer.
+        gender (str): The gender of the customer (optional).
+        date_of_birth (date): The date of birth of the customer (optional).
+        points (int): Reward points folded in from the points ledger; the
+            balance also counts the ledger entries not folded in yet (see
+            customer/points.py).
         is_active (bool): Status indicating if the customer account is active.
         created_at (datetime): The timestamp when the customer was created.
         updated_at (datetime): The timestamp when the customer was last updated.
     """
 
+    GENDER_CHOICES = [
+        ("female", "Female"),
+        ("man", "Man"),
+        ("Uncertain", "Uncertain"),
+    ]
+
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     table_number = models.PositiveIntegerField()
@@ -36,11 +47,21 @@ class Customer(models.Model):
     phone_number = models.CharField(
         max_length=12, validators=[iran_phone_regex], unique=True, null=True, blank=True
     )
+    gender = models.CharField(
+        max_length=10, choices=GENDER_CHOICES, null=True, blank=True
+    )
+    date_of_birth = models.DateField(null=True, blank=True)
     points = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Staff checkout looks orders up by the customer's table number
+            models.Index(fields=["table_number"], name="customer_table_number_idx"),
+        ]
+
     def clean(self):
         """
         Validate the model's attributes before saving.
@@ -64,3 +85,36 @@ class Customer(models.Model):
     def __str__(self):
         """Return the full name of the customer."""
         return str(self.phone_number)
+
+
+class PointsEntry(models.Model):
+    """
+    Model representing loyalty points accrued by a customer and not yet folded
+    into the customer's points.
+
+    Entries are only ever appended, with the order that earned them, and
+    removed by the compaction that adds them to ``Customer.points``.
+
+    Attributes:
+        customer (Customer): The customer who earned the points.
+        order (Order): The order that earned the points (optional).
+        points (int): The number of points earned.
+        created_at (datetime): The timestamp when the points were earned.
+    """
+
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name="points_entries"
+    )
+    order = models.ForeignKey(
+        "order.Order",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="points_entries",
+    )
+    points = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return the number of points and the customer who earned them."""
+        return f"{self.points} points for {self.customer}"
@@ -0,0 +1,175 @@
+"""
+points.py
+
+This module accrues loyalty points to customers and reads their balances.
+
+Points earned by an order are appended to the points ledger (PointsEntry)
+in the transaction that creates the order, instead of being added to
+``Customer.points`` with a read-modify-write of the whole customer row, so
+concurrent orders of the same customer never lose each other's points.
+
+The ledger is folded into ``Customer.points`` by compact_points(), run
+periodically with the ``compact_points`` management command. A customer's
+balance is ``Customer.points`` plus the entries not folded in yet; balances
+are cached and the cached value of a customer is dropped once new points of
+theirs are committed. Compaction moves points from the ledger to the customer
+in one transaction, so it never changes a balance and leaves the cache alone.
+"""
+
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Customer, PointsEntry
+
+POINTS_BALANCE_KEY = "customer:points:{}"
+
+
+def points_balance_key(customer_id):
+    return POINTS_BALANCE_KEY.format(customer_id)
+
+
+def drop_cached_balances(customer_ids):
+    """Drop the cached points balances of the given customers."""
+    cache.delete_many([points_balance_key(pk) for pk in customer_ids])
+
+
+def pending_points():
+    """
+    Return an expression of the points of a customer not folded in yet, to be
+    used in annotations of Customer querysets.
+    """
+    entries = (
+        PointsEntry.objects.filter(customer=OuterRef("pk"))
+        .values("customer")
+        .annotate(total=Sum("points"))
+        .values("total")
+    )
+    return Coalesce(Subquery(entries), Value(0))
+
+
+def points_balance():
+    """Return an expression of the points balance of a customer."""
+    return F("points") + pending_points()
+
+
+def accrue_points(entries):
+    """
+    Append points to the ledger in a single ``bulk_create``.
+
+    Call it inside the transaction that creates the orders, so that the points
+    are only earned if the orders are.
+
+    Args:
+        entries (list): The PointsEntry instances to append; entries without
+            points are skipped.
+
+    Returns:
+        list: The appended entries.
+    """
+    entries = [entry for entry in entries if entry.points]
+    if not entries:
+        return []
+    entries = PointsEntry.objects.bulk_create(entries)
+    customer_ids = {entry.customer_id for entry in entries}
+    transaction.on_commit(lambda: drop_cached_balances(customer_ids))
+    return entries
+
+
+def compact_points(batch_size=None):
+    """
+    Fold the points ledger into ``Customer.points``.
+
+    Entries are folded oldest first, ``POINTS_COMPACTION_BATCH_SIZE`` at a time,
+    each batch in its own transaction: its entries are locked (on databases
+    that can lock rows, skipping those another compaction holds), added to
+    their customers with one ``F()`` update per distinct total and deleted.
+
+    Args:
+        batch_size (int): The number of entries folded per transaction.
+
+    Returns:
+        int: The number of entries folded in.
+    """
+    batch_size = batch_size or settings.POINTS_COMPACTION_BATCH_SIZE
+    folded = 0
+    while True:
+        with transaction.atomic():
+            entries = list(
+                PointsEntry.objects.select_for_update(skip_locked=True)
+                .order_by("pk")
+                .values_list("pk", "customer_id", "points")[:batch_size]
+            )
+            if not entries:
+                break
+
+            totals = defaultdict(int)
+            for _, customer_id, points in entries:
+                totals[customer_id] += points
+            customers_by_total = defaultdict(list)
+            for customer_id, total in totals.items():
+                customers_by_total[total].append(customer_id)
+
+            for total, customer_ids in customers_by_total.items():
+                Customer.objects.filter(pk__in=customer_ids).update(
+                    points=F("points") + total
+                )
+            PointsEntry.objects.filter(pk__in=[entry[0] for entry in entries]).delete()
+
+        folded += len(entries)
+        if len(entries) < batch_size:
+            break
+    return folded
+
+
+def get_points_balances(customer_ids):
+    """
+    Return the points balances of several customers.
+
+    Cached balances are read in one round trip and the others with a single
+    query, then cached for ``POINTS_BALANCE_CACHE_TIMEOUT`` seconds.
+
+    Args:
+        customer_ids (list): The IDs of the customers.
+
+    Returns:
+        dict: Maps the IDs of the existing customers to their balances.
+    """
+    customer_ids = list(customer_ids)
+    cached = cache.get_many([points_balance_key(pk) for pk in customer_ids])
+    balances = {}
+    missing = []
+    for pk in customer_ids:
+        balance = cached.get(points_balance_key(pk))
+        if balance is None:
+            missing.append(pk)
+        else:
+            balances[pk] = balance
+
+    if missing:
+        fresh = dict(
+            Customer.objects.filter(pk__in=missing)
+            .annotate(balance=points_balance())
+            .values_list("pk", "balance")
+        )
+        cache.set_many(
+            {points_balance_key(pk): balance for pk, balance in fresh.items()},
+            settings.POINTS_BALANCE_CACHE_TIMEOUT,
+        )
+        balances.update(fresh)
+    return balances
+
+
+def get_points_balance(customer):
+    """
+    Return the points balance of a customer.
+
+    Args:
+        customer (Customer): The customer.
+
+    Returns:
+        int: The customer's points, including those not folded in yet.
+    """
+    return get_points_balances([customer.pk]).get(customer.pk, 0)
@@ -0,0 +1,23 @@
+"""
+signals.py
+
+This module drops the cached points balance of a customer whose points were
+changed directly, e.g. from the admin.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Customer
+from .points import drop_cached_balances
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def drop_cached_balance(sender, instance, **kwargs):
+    """
+    Drops the cached points balance of a saved or deleted customer once the
+    change is committed.
+    """
+    customer_id = instance.pk
+    transaction.on_commit(lambda: drop_cached_balances([customer_id]))
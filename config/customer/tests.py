@@ -1,10 +1,14 @@
-from django.test import TestCase
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.urls import reverse
 from cafe.models import Cafe
 from order.models import Order
 from staff.models import Staff
-from .models import Customer
+from .models import Customer, PointsEntry
+from .points import accrue_points, compact_points, get_points_balance
 
 
 class CustomerModelTests(TestCase):
@@ -243,3 +247,66 @@ class CustomerViewTests(TestCase):
             is_active=False,
         )
         self.assertFalse(customer.is_active)  # Should correctly set inactive status
+
+
+class PointsLedgerTests(TestCase):
+    def setUp(self):
+        """Create two customers with some points already folded in."""
+        cache.clear()
+        self.cafe = Cafe.objects.create(
+            name="Test Cafe",
+            address="123 Test Street",
+            opening_time="08:00",
+            closing_time="20:00",
+        )
+        self.alice = Customer.objects.create(
+            phone_number="09120000001", table_number=1, cafe=self.cafe, points=10
+        )
+        self.bob = Customer.objects.create(
+            phone_number="09120000002", table_number=2, cafe=self.cafe
+        )
+
+    def accrue(self, *points):
+        """Append entries for Alice and Bob in turn, committing them."""
+        customers = [self.alice, self.bob]
+        with self.captureOnCommitCallbacks(execute=True):
+            accrue_points(
+                [
+                    PointsEntry(customer=customers[index % 2], points=value)
+                    for index, value in enumerate(points)
+                ]
+            )
+
+    def test_accrual_is_one_insert_and_balances_are_cached(self):
+        """Test that points are appended at once and balances read from cache."""
+        self.assertEqual(get_points_balance(self.alice), 10)
+        with self.assertNumQueries(1):
+            self.accrue(3, 4, 5, 0)
+        self.assertEqual(PointsEntry.objects.count(), 3)
+        self.assertEqual(Customer.objects.get(pk=self.alice.pk).points, 10)
+
+        self.assertEqual(get_points_balance(self.alice), 18)
+        self.assertEqual(get_points_balance(self.bob), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_points_balance(self.alice), 18)
+            self.assertEqual(get_points_balance(self.bob), 4)
+
+    def test_compaction_folds_the_ledger_in_batches(self):
+        """Test that compaction moves the points without changing the balances."""
+        self.accrue(3, 4, 5, 4)
+        self.assertEqual(compact_points(batch_size=3), 4)
+        self.assertFalse(PointsEntry.objects.exists())
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.points, self.bob.points), (18, 8))
+        self.assertEqual(get_points_balance(self.alice), 18)
+        self.assertEqual(compact_points(), 0)
+
+    @override_settings(POINTS_COMPACTION_BATCH_SIZE=2)
+    def test_compact_points_command(self):
+        """Test that the management command folds every entry."""
+        self.accrue(1, 2, 3)
+        out = StringIO()
+        call_command("compact_points", stdout=out)
+        self.assertIn("Folded 3 points entries.", out.getvalue())
+        self.assertEqual(Customer.objects.get(pk=self.alice.pk).points, 14)
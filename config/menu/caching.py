@@ -0,0 +1,244 @@
+"""
+caching.py
+
+This module provides HTTP-level caching for the public menu pages.
+
+- cache_menu_page stores the rendered HTML of anonymous GET requests, keyed on
+  the menu version and the request path (and so on the category or product ID).
+- The *_etag and *_last_modified functions feed Django's ``condition``
+  decorator so that repeat visitors get a 304 Not Modified instead of the page.
+
+Pages viewed by logged-in staff or carrying pending flash messages are never
+cached, because their HTML depends on the visitor.
+
+The async views use the ``a``-prefixed counterparts, with ``acondition`` in
+place of Django's ``condition``, whose ETag and Last-Modified functions cannot
+be coroutines.
+"""
+
+from functools import wraps
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from .models import MenuItem
+from .snapshot import (
+    aget_menu_snapshot,
+    aget_menu_version,
+    get_menu_snapshot,
+    get_menu_version,
+)
+
+MENU_PAGE_KEY = "menu:page:{version}:{path}"
+
+
+def is_cacheable(request):
+    """
+    Return True if the response to ``request`` is the same for every visitor.
+    """
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+async def ais_cacheable(request):
+    """Async version of is_cacheable(), loading the user without blocking."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    user = await request.auser()
+    return not user.is_authenticated and not len(get_messages(request))
+
+
+def get_product(pk):
+    """
+    Return a menu item with its category, from the snapshot when it is available.
+
+    Returns:
+        MenuItem or None: The menu item, or None if it does not exist.
+    """
+    product = get_menu_snapshot().items_by_id.get(pk)
+    if product is None:
+        product = MenuItem.objects.select_related("category").filter(pk=pk).first()
+    return product
+
+
+async def aget_product(pk):
+    """Async version of get_product()."""
+    product = (await aget_menu_snapshot()).items_by_id.get(pk)
+    if product is None:
+        product = (
+            await MenuItem.objects.select_related("category").filter(pk=pk).afirst()
+        )
+    return product
+
+
+def menu_etag(request, *args, **kwargs):
+    """Return the ETag of a menu page, which changes with the menu version."""
+    if not is_cacheable(request):
+        return None
+    return f"menu-{get_menu_snapshot().version}"
+
+
+def menu_last_modified(request, *args, **kwargs):
+    """Return the time the menu was last modified."""
+    if not is_cacheable(request):
+        return None
+    return get_menu_snapshot().last_modified
+
+
+def product_last_modified(request, pk):
+    """Return the time a product or its category was last modified."""
+    if not is_cacheable(request):
+        return None
+    product = get_product(pk)
+    if product is None:
+        return None
+    return max(product.updated_at, product.category.updated_at)
+
+
+def product_etag(request, pk):
+    """Return the ETag of a product page, built from its modification time."""
+    last_modified = product_last_modified(request, pk)
+    if last_modified is None:
+        return None
+    return f"product-{pk}-{last_modified.timestamp()}"
+
+
+async def amenu_etag(request, *args, **kwargs):
+    """Async version of menu_etag()."""
+    if not await ais_cacheable(request):
+        return None
+    return f"menu-{(await aget_menu_snapshot()).version}"
+
+
+async def amenu_last_modified(request, *args, **kwargs):
+    """Async version of menu_last_modified()."""
+    if not await ais_cacheable(request):
+        return None
+    return (await aget_menu_snapshot()).last_modified
+
+
+async def aproduct_last_modified(request, pk):
+    """Async version of product_last_modified()."""
+    if not await ais_cacheable(request):
+        return None
+    product = await aget_product(pk)
+    if product is None:
+        return None
+    return max(product.updated_at, product.category.updated_at)
+
+
+async def aproduct_etag(request, pk):
+    """Async version of product_etag()."""
+    last_modified = await aproduct_last_modified(request, pk)
+    if last_modified is None:
+        return None
+    return f"product-{pk}-{last_modified.timestamp()}"
+
+
+def acondition(etag_func=None, last_modified_func=None):
+    """
+    Async version of Django's ``condition`` decorator, for async views whose
+    ETag and Last-Modified functions are coroutine functions.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            last_modified = None
+            if last_modified_func:
+                if dt := await last_modified_func(request, *args, **kwargs):
+                    last_modified = int(dt.timestamp())
+            etag = await etag_func(request, *args, **kwargs) if etag_func else None
+            etag = quote_etag(etag) if etag is not None else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def async_method_decorator(decorators):
+    """
+    Like ``method_decorator``, for async methods. The wrapper returned by
+    ``method_decorator`` is a plain function, which would make the view look
+    synchronous to Django, so it is marked as a coroutine function.
+    """
+
+    def decorator(method):
+        return markcoroutinefunction(method_decorator(decorators)(method))
+
+    return decorator
+
+
+def cache_menu_page(view_func):
+    """
+    Cache the rendered content of cacheable responses per menu version and path.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not is_cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        key = MENU_PAGE_KEY.format(version=get_menu_version(), path=request.path)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(
+                key,
+                (response.content, response["Content-Type"]),
+                getattr(settings, "MENU_CACHE_TIMEOUT", 60 * 60),
+            )
+        return response
+
+    return wrapper
+
+
+def acache_menu_page(view_func):
+    """Async version of cache_menu_page, for async views."""
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if not await ais_cacheable(request):
+            return await view_func(request, *args, **kwargs)
+
+        version = await aget_menu_version()
+        key = MENU_PAGE_KEY.format(version=version, path=request.path)
+        cached = await cache.aget(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = await view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            await cache.aset(
+                key,
+                (response.content, response["Content-Type"]),
+                getattr(settings, "MENU_CACHE_TIMEOUT", 60 * 60),
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,226 @@
+"""
+search.py
+
+This module provides an in-memory inverted index over the available menu items.
+
+Every menu item is indexed by the words of its name, description and category
+name, with name matches ranking highest. Text is normalised so that Persian and
+Arabic letter variants, Persian digits, diacritics and zero-width non-joiners
+do not prevent a match, and every query word also matches longer words it is a
+prefix of, which makes the index suitable for search-as-you-type.
+
+The index is tied to the menu version (see menu/snapshot.py): menu signals
+update it incrementally in the process that made the change, and any other
+process rebuilds it from the cached menu snapshot when the version moves on.
+The index keeps the indexed menu items itself, so a search only reads the
+small menu version key from the cache, never the whole snapshot.
+"""
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from .snapshot import get_menu_snapshot, get_menu_version
+
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1}
+EXACT_MATCH_BONUS = 2
+
+_CHARACTER_MAP = str.maketrans(
+    {
+        "ي": "ی",
+        "ى": "ی",
+        "ك": "ک",
+        "ة": "ه",
+        "ۀ": "ه",
+        "\u200c": " ",  # zero-width non-joiner
+        "\u0640": None,  # tatweel
+        **{chr(0x06F0 + digit): str(digit) for digit in range(10)},  # Persian digits
+        **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic digits
+    }
+)
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    """
+    Normalise text for indexing and searching.
+
+    Returns:
+        str: The case-folded text without diacritics, with Persian and Arabic
+        variants mapped to a single form.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return text.translate(_CHARACTER_MAP).casefold()
+
+
+def tokenize(text):
+    """Split text into normalised words."""
+    return _WORD_RE.findall(normalize(text))
+
+
+class MenuSearchIndex:
+    """
+    Inverted index mapping words to the menu items that contain them.
+
+    Attributes:
+        version (int): The menu version the index reflects, or None if it has to
+            be rebuilt before use.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._postings = {}  # word -> {item ID: weight}
+        self._words = []  # sorted list of indexed words, for prefix lookups
+        self._documents = {}  # item ID -> words indexed for the item
+        self._names = {}  # item ID -> normalised name, to order equal scores
+        self._items = {}  # item ID -> indexed MenuItem
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _item_words(self, item):
+        """Return the words of a menu item with their field weights."""
+        fields = {
+            "name": item.name,
+            "category": item.category.name,
+            "description": item.description,
+        }
+        words = {}
+        for field, text in fields.items():
+            for word in tokenize(text):
+                words[word] = max(words.get(word, 0), FIELD_WEIGHTS[field])
+        return words
+
+    def add(self, item):
+        """Index a menu item, replacing any previous entry for it."""
+        with self._lock:
+            self.remove(item.pk)
+            words = self._item_words(item)
+            for word, weight in words.items():
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = {}
+                    insort(self._words, word)
+                postings[item.pk] = weight
+            self._documents[item.pk] = tuple(words)
+            self._names[item.pk] = normalize(item.name)
+            self._items[item.pk] = item
+
+    def remove(self, item_id):
+        """Remove a menu item from the index, if it is indexed."""
+        with self._lock:
+            for word in self._documents.pop(item_id, ()):
+                postings = self._postings[word]
+                postings.pop(item_id, None)
+                if not postings:
+                    del self._postings[word]
+                    del self._words[bisect_left(self._words, word)]
+            self._names.pop(item_id, None)
+            self._items.pop(item_id, None)
+
+    def rebuild(self, items, version):
+        """Replace the whole index with ``items`` at the given menu version."""
+        with self._lock:
+            self._postings = {}
+            self._words = []
+            self._documents = {}
+            self._names = {}
+            self._items = {}
+            for item in items:
+                self.add(item)
+            self.version = version
+
+    def invalidate(self):
+        """Mark the index for a full rebuild before its next use."""
+        with self._lock:
+            self.version = None
+
+    def advance(self, previous_version, version, update=None):
+        """
+        Move the index to a new menu version.
+
+        ``update`` is applied only if the index reflected ``previous_version``;
+        otherwise the index is already stale and will be rebuilt on next use.
+        """
+        with self._lock:
+            if self.version is None or self.version != previous_version:
+                return
+            if update is not None:
+                update(self)
+            self.version = version
+
+    def _expand(self, prefix):
+        """Yield the indexed words starting with ``prefix``."""
+        position = bisect_left(self._words, prefix)
+        while position < len(self._words) and self._words[position].startswith(prefix):
+            yield self._words[position]
+            position += 1
+
+    def search(self, query, limit=None):
+        """
+        Find the menu items matching every word of the query.
+
+        Returns:
+            list: Matching item IDs, best match first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for word in self._expand(term):
+                    bonus = EXACT_MATCH_BONUS if word == term else 1
+                    for item_id, weight in self._postings[word].items():
+                        term_scores[item_id] = max(
+                            term_scores.get(item_id, 0), weight * bonus
+                        )
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        item_id: scores[item_id] + score
+                        for item_id, score in term_scores.items()
+                        if item_id in scores
+                    }
+                if not scores:
+                    return []
+
+            ranked = sorted(
+                scores, key=lambda item_id: (-scores[item_id], self._names[item_id])
+            )
+        return ranked[:limit] if limit else ranked
+
+    def search_items(self, query, limit=None):
+        """
+        Find the menu items matching every word of the query.
+
+        Returns:
+            list: Matching MenuItem instances, best match first.
+        """
+        with self._lock:
+            return [self._items[item_id] for item_id in self.search(query, limit)]
+
+
+menu_search_index = MenuSearchIndex()
+
+
+def search_menu(query, limit=None):
+    """
+    Search the available menu items, rebuilding the index if the menu changed.
+
+    Args:
+        query (str): The words (or word prefixes) to search for.
+        limit (int): The maximum number of results, or None for all of them.
+
+    Returns:
+        list: The matching MenuItem instances, best match first.
+    """
+    if menu_search_index.version != get_menu_version():
+        snapshot = get_menu_snapshot()
+        menu_search_index.rebuild(snapshot.items, snapshot.version)
+    return menu_search_index.search_items(query, limit)
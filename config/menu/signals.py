@@ -0,0 +1,63 @@
+"""
+signals.py
+
+This module invalidates the cached menu snapshot whenever a menu item or a
+category is saved or deleted, whether from the staff panel or the admin, and
+keeps the local menu search index in step with the change once it commits.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Category, MenuItem
+from .search import menu_search_index
+from .snapshot import bump_menu_version, get_menu_version
+
+
+def menu_changed(update_index=None):
+    """
+    Bumps the menu version so the next public request rebuilds the snapshot.
+
+    ``update_index`` is applied to the search index of this process, which then
+    moves to the new version without a full rebuild.
+    """
+    previous_version = get_menu_version()
+    version = bump_menu_version()
+    menu_search_index.advance(previous_version, version, update_index)
+
+
+def on_commit_menu_changed(update_index=None):
+    """
+    Bumps the version now, and again once the transaction commits, so a
+    snapshot rebuilt by another request before the commit is not kept.
+
+    ``update_index`` is only applied at commit, so the search index never
+    holds a change that is rolled back.
+    """
+    menu_changed()
+    transaction.on_commit(lambda: menu_changed(update_index))
+
+
+@receiver(post_save, sender=MenuItem)
+def menu_item_saved(sender, instance, **kwargs):
+    """Re-indexes a saved menu item, or drops it if it is no longer available."""
+    item_id = instance.pk
+    if instance.is_available:
+        on_commit_menu_changed(lambda index: index.add(instance))
+    else:
+        on_commit_menu_changed(lambda index: index.remove(item_id))
+
+
+@receiver(post_delete, sender=MenuItem)
+def menu_item_deleted(sender, instance, **kwargs):
+    """Drops a deleted menu item from the search index."""
+    item_id = instance.pk  # cleared by the deletion before the commit
+    on_commit_menu_changed(lambda index: index.remove(item_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    """Rebuilds the search index once committed, since category names are indexed."""
+    on_commit_menu_changed()
+    transaction.on_commit(menu_search_index.invalidate)
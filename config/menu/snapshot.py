@@ -0,0 +1,149 @@
+"""
+snapshot.py
+
+This module provides a cached, versioned snapshot of the public menu.
+
+The snapshot holds every category and every available menu item grouped by
+category. It is stored in the Django cache under a key that includes the menu
+version; saving or deleting a MenuItem or Category bumps the version (see
+menu/signals.py), so public menu pages need no database queries until the
+menu actually changes.
+
+Every function has an ``a``-prefixed async counterpart for the async views,
+which reads the cache and the database without blocking the event loop.
+"""
+
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from .models import Category, MenuItem
+
+MENU_VERSION_KEY = "menu:version"
+MENU_SNAPSHOT_KEY = "menu:snapshot:{version}"
+
+
+class MenuSnapshot:
+    """
+    An immutable view of the menu at a given version.
+
+    Attributes:
+        version (int): The menu version the snapshot was built for.
+        categories (list): All categories.
+        items (list): All available menu items, with their category loaded.
+        items_by_category (dict): Maps category IDs to their available menu items.
+        items_by_id (dict): Maps menu item IDs to the available menu items.
+        last_modified (datetime): The latest ``updated_at`` of any category or
+            menu item, or None if the menu is empty.
+    """
+
+    def __init__(self, version, categories, items, last_modified=None):
+        self.version = version
+        self.categories = categories
+        self.items = items
+        self.last_modified = last_modified
+        items_by_category = defaultdict(list)
+        for item in items:
+            items_by_category[item.category_id].append(item)
+        self.items_by_category = dict(items_by_category)
+        self.items_by_id = {item.pk: item for item in items}
+
+    def items_in_category(self, category_id):
+        """Return the available menu items of a category."""
+        return self.items_by_category.get(category_id, [])
+
+
+def get_menu_version():
+    """
+    Return the current menu version, starting a new one if none is cached.
+    """
+    return cache.get_or_set(MENU_VERSION_KEY, time.time_ns, timeout=None)
+
+
+async def aget_menu_version():
+    """Async version of get_menu_version()."""
+    return await cache.aget_or_set(MENU_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_menu_version():
+    """
+    Start a new menu version so that cached snapshots are no longer used.
+
+    Returns:
+        int: The new menu version.
+    """
+    version = time.time_ns()
+    cache.set(MENU_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def available_items():
+    """Return the queryset of the menu items listed on the menu."""
+    return MenuItem.objects.filter(is_available=True).select_related("category")
+
+
+def assemble_menu_snapshot(version, categories, items, items_last_modified):
+    """
+    Build a snapshot from the rows read by build_menu_snapshot().
+
+    ``items_last_modified`` is the latest ``updated_at`` of every menu item:
+    unavailable items count too, since hiding one changes the menu pages.
+    """
+    timestamps = [category.updated_at for category in categories]
+    timestamps.append(items_last_modified)
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    last_modified = max(timestamps, default=None)
+    return MenuSnapshot(version, categories, items, last_modified)
+
+
+def build_menu_snapshot(version):
+    """
+    Build a snapshot of the menu from the database.
+    """
+    return assemble_menu_snapshot(
+        version,
+        list(Category.objects.all()),
+        list(available_items()),
+        MenuItem.objects.aggregate(Max("updated_at"))["updated_at__max"],
+    )
+
+
+async def abuild_menu_snapshot(version):
+    """Async version of build_menu_snapshot()."""
+    items_last_modified = await MenuItem.objects.aaggregate(Max("updated_at"))
+    return assemble_menu_snapshot(
+        version,
+        [category async for category in Category.objects.all()],
+        [item async for item in available_items()],
+        items_last_modified["updated_at__max"],
+    )
+
+
+def get_menu_snapshot():
+    """
+    Return the snapshot for the current menu version, building it on a miss.
+
+    Returns:
+        MenuSnapshot: The cached menu snapshot.
+    """
+    version = get_menu_version()
+    key = MENU_SNAPSHOT_KEY.format(version=version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_menu_snapshot(version)
+        cache.set(key, snapshot, getattr(settings, "MENU_CACHE_TIMEOUT", 60 * 60))
+    return snapshot
+
+
+async def aget_menu_snapshot():
+    """Async version of get_menu_snapshot()."""
+    version = await aget_menu_version()
+    key = MENU_SNAPSHOT_KEY.format(version=version)
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        snapshot = await abuild_menu_snapshot(version)
+        await cache.aset(
+            key, snapshot, getattr(settings, "MENU_CACHE_TIMEOUT", 60 * 60)
+        )
+    return snapshot
@@ -1,8 +1,14 @@
 from datetime import timedelta
 import time
+from unittest import mock
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
 from django.test import TestCase
 from django.urls import reverse
+from staff.models import Staff
 from .models import MenuItem, Category
+from .search import MenuSearchIndex, menu_search_index, normalize, search_menu
+from .snapshot import MENU_VERSION_KEY, MenuSnapshot
 
 
 class CafeMenuViewTests(TestCase):
@@ -41,10 +47,125 @@ class CafeMenuViewTests(TestCase):
             len(response.context["menu_items"]), 2
         )  # Two items in this category
         self.assertEqual(
-            response.context["cat_item"].first(), self.category
+            response.context["cat_item"][0], self.category
         )  # Ensure category is passed
 
 
+class MenuSnapshotTests(TestCase):
+    def setUp(self):
+        """Create a category and menu items, starting from an empty cache."""
+        cache.clear()
+        self.category = Category.objects.create(name="Beverages")
+        self.coffee = MenuItem.objects.create(
+            name="Coffee", price=2.5, category=self.category, is_available=True
+        )
+        MenuItem.objects.create(
+            name="Cake", price=3.0, category=self.category, is_available=False
+        )
+
+    def test_menu_pages_use_no_queries_once_cached(self):
+        """Test that repeated menu requests are served from the snapshot."""
+        self.client.get(reverse("menu"))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("menu"))
+            self.client.get(reverse("search"), {"q": "coffee"})
+            self.client.get(reverse("home"))
+
+    def test_unavailable_items_are_hidden(self):
+        """Test that only available items are listed on the menu."""
+        response = self.client.get(reverse("menu"))
+        self.assertEqual(response.context["menu_items"], [self.coffee])
+
+    def test_menu_changes_invalidate_the_snapshot(self):
+        """Test that saving or deleting menu data is visible immediately."""
+        self.client.get(reverse("menu"))
+        tea = MenuItem.objects.create(
+            name="Tea", price=2.0, category=self.category, is_available=True
+        )
+        response = self.client.get(reverse("menu"))
+        self.assertIn(tea, response.context["menu_items"])
+
+        tea.delete()
+        Category.objects.create(name="Desserts")
+        response = self.client.get(reverse("menu"))
+        self.assertNotIn(tea, response.context["menu_items"])
+        self.assertEqual(len(response.context["cat_item"]), 2)
+
+
+class MenuPageCachingTests(TestCase):
+    def setUp(self):
+        """Create a category and a product, starting from an empty cache."""
+        cache.clear()
+        self.category = Category.objects.create(name="Beverages")
+        self.product = MenuItem.objects.create(
+            name="Coffee", price=2.5, category=self.category, is_available=True
+        )
+
+    def test_conditional_get_returns_not_modified(self):
+        """Test that ETag and Last-Modified lead to 304 responses."""
+        for url in (
+            reverse("menu"),
+            reverse("menu_by_category", kwargs={"category_id": self.category.id}),
+            reverse("product", kwargs={"pk": self.product.pk}),
+            reverse("home"),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Last-Modified", response)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_the_menu(self):
+        """Test that editing the product invalidates the cached page."""
+        url = reverse("product", kwargs={"pk": self.product.pk})
+        etag = self.client.get(url)["ETag"]
+        time.sleep(0.01)
+        self.product.name = "Espresso"
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Espresso")
+
+    async def test_menu_pages_over_asgi(self):
+        """Test the async menu and product views through the ASGI handler."""
+        for url in (
+            reverse("menu"),
+            reverse("product", kwargs={"pk": self.product.pk}),
+        ):
+            response = await self.async_client.get(url)
+            self.assertContains(response, "Coffee")
+            response = await self.async_client.get(
+                url, headers={"if-none-match": response["ETag"]}
+            )
+            self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse("product", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_staff_header_on_menu_pages(self):
+        """Test that logged-in staff get their header on the async menu pages."""
+        staff_member = Staff.objects.create_user(
+            phone_number="09120000000", password="testpassword"
+        )
+        staff_member.first_name = "Sara"
+        staff_member.save()
+        self.client.force_login(staff_member)
+        for url in (
+            reverse("menu_by_category", kwargs={"category_id": self.category.id}),
+            reverse("product", kwargs={"pk": self.product.pk}),
+        ):
+            response = self.client.get(url)
+            self.assertContains(response, "Welcome Sara")
+            self.assertContains(response, reverse("staff_checkout"))
+
+    def test_rendered_page_is_reused(self):
+        """Test that a repeated request does not render the template again."""
+        self.client.get(reverse("menu"))
+        response = self.client.get(reverse("menu"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context)
+        self.assertContains(response, "Coffee")
+
+
 class ProductDetailViewTests(TestCase):
     def setUp(self):
         """Create a category and a product for testing."""
@@ -108,6 +229,110 @@ class SearchViewTests(TestCase):
         )  # Should still find the item
 
 
+class MenuSearchIndexTests(TestCase):
+    def setUp(self):
+        """Create menu items in Latin and Persian script for testing."""
+        cache.clear()
+        self.beverages = Category.objects.create(name="Beverages")
+        self.cakes = Category.objects.create(name="کیک")
+        self.latte = MenuItem.objects.create(
+            name="Caffe Latte", price=3.0, category=self.beverages
+        )
+        self.mocha = MenuItem.objects.create(
+            name="Mocha",
+            description="Espresso with chocolate and milk",
+            price=3.5,
+            category=self.beverages,
+        )
+        self.cheesecake = MenuItem.objects.create(
+            name="چیزکیک شکلاتی", price=4.0, category=self.cakes
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse("search"), {"q": query})
+        return response.context["menu_items"]
+
+    def test_prefix_and_multi_word_search(self):
+        """Test that every query word may be a prefix of an indexed word."""
+        self.assertEqual(self.search("caf"), [self.latte])
+        self.assertEqual(self.search("latte caf"), [self.latte])
+        self.assertEqual(self.search("latte mocha"), [])
+
+    def test_description_and_category_are_searched(self):
+        """Test that description and category words match, ranked below names."""
+        self.assertEqual(self.search("chocolate"), [self.mocha])
+        self.assertEqual(self.search("bev"), [self.latte, self.mocha])
+        self.assertEqual(self.search("کیک"), [self.cheesecake])
+
+    def test_persian_text_is_normalized(self):
+        """Test that Arabic letter variants match their Persian forms."""
+        self.assertEqual(normalize("كيك"), normalize("کیک"))
+        self.assertEqual(self.search("شكلات"), [self.cheesecake])
+
+    def test_index_is_updated_incrementally(self):
+        """Test that saving and deleting items updates the index in place."""
+        self.search("latte")  # Build the index
+        self.latte.name = "Flat White"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.latte.save()
+        self.assertEqual(len(menu_search_index), 3)
+        self.assertEqual(menu_search_index.search("flat"), [self.latte.pk])
+        self.assertEqual(menu_search_index.search("latte"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mocha.delete()
+        self.assertEqual(menu_search_index.search("mocha"), [])
+        self.assertEqual(self.search("flat"), [self.latte])
+
+    def test_rolled_back_changes_stay_out_of_the_index(self):
+        """Test that the index only takes the changes that commit."""
+        self.search("latte")  # Build the index
+        mocha_id = self.mocha.pk
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                MenuItem.objects.create(
+                    name="Phantom Tea", price=2.0, category=self.beverages
+                )
+                self.latte.name = "Flat White"
+                self.latte.save()
+                self.mocha.delete()
+                raise DatabaseError("rolled back")
+        self.assertEqual(self.search("phantom"), [])
+        self.assertEqual(self.search("flat"), [])
+        self.assertEqual(menu_search_index.search("latte"), [self.latte.pk])
+        self.assertEqual(menu_search_index.search("mocha"), [mocha_id])
+
+    def test_search_reads_the_snapshot_only_when_the_menu_changed(self):
+        """Test that searching an up-to-date index only reads the menu version."""
+        self.search("latte")  # Build the index
+        with mock.patch("menu.search.get_menu_snapshot") as get_snapshot:
+            with self.assertNumQueries(0):
+                self.assertEqual(search_menu("moc"), [self.mocha])
+            get_snapshot.assert_not_called()
+
+            cache.set(MENU_VERSION_KEY, 1, timeout=None)  # Changed by another process
+            get_snapshot.return_value = MenuSnapshot(1, [], [self.latte])
+            self.assertEqual(search_menu("caf"), [self.latte])
+            self.assertEqual(search_menu("moc"), [])
+            get_snapshot.assert_called_once()
+
+    def test_suggestions_are_returned_as_json(self):
+        """Test the search-as-you-type endpoint."""
+        response = self.client.get(reverse("search_suggest"), {"q": "moc"})
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": self.mocha.pk, "name": "Mocha", "price": "3.50"}],
+        )
+
+    def test_ranking_prefers_exact_name_matches(self):
+        """Test that an exact name word outranks a prefix match."""
+        index = MenuSearchIndex()
+        tea = MenuItem(pk=100, name="Tea", category=self.beverages)
+        teapot = MenuItem(pk=101, name="Teapot cake", category=self.beverages)
+        index.rebuild([teapot, tea], version=1)
+        self.assertEqual(index.search("tea"), [100, 101])
+
+
 class CategoryModelTests(TestCase):
     def setUp(self):
         """Create a category instance for testing."""
@@ -1,6 +1,20 @@
-from django.shortcuts import render, get_object_or_404
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
 from django.views import View
-from .models import MenuItem, Category
+from .caching import (
+    async_method_decorator,
+    acache_menu_page,
+    acondition,
+    aget_product,
+    amenu_etag,
+    amenu_last_modified,
+    aproduct_etag,
+    aproduct_last_modified,
+)
+from .search import search_menu
+from .snapshot import aget_menu_snapshot
+
+SEARCH_SUGGESTION_LIMIT = 10
 
 
 class CafeMenuView(View):
@@ -9,18 +23,30 @@ class CafeMenuView(View):
 
     If a category_id is provided, only the menu items belonging to that category will be shown.
     Otherwise, all available menu items will be displayed.
+    The items come from the cached menu snapshot, and anonymous responses are
+    cached and support conditional GET. The view is async, so under ASGI it
+    never holds a thread while waiting on the cache or the database.
     """
 
-    def get(self, request, category_id=None):
+    @async_method_decorator(
+        [
+            acondition(etag_func=amenu_etag, last_modified_func=amenu_last_modified),
+            acache_menu_page,
+        ]
+    )
+    async def get(self, request, category_id=None):
         """
         Handles GET requests to fetch and display menu items.
         """
+        # The base template reads the user, which cannot be loaded lazily here
+        request.user = await request.auser()
+        snapshot = await aget_menu_snapshot()
         if category_id:
-            menu_items = MenuItem.objects.filter(category_id=category_id)
+            menu_items = snapshot.items_in_category(category_id)
         else:
-            menu_items = MenuItem.objects.all()
+            menu_items = snapshot.items
 
-        cat_item = Category.objects.all()
+        cat_item = snapshot.categories
         return render(
             request, "menu.html", {"menu_items": menu_items, "cat_item": cat_item}
         )
@@ -29,15 +55,28 @@ class CafeMenuView(View):
 class ProductDetailView(View):
     """
     View to display the details of a specific product (menu item).
+
+    Like CafeMenuView, the view is async.
     """
 
     template_name = "product.html"
 
-    def get(self, request, pk):
+    @async_method_decorator(
+        [
+            acondition(
+                etag_func=aproduct_etag, last_modified_func=aproduct_last_modified
+            ),
+            acache_menu_page,
+        ]
+    )
+    async def get(self, request, pk):
         """
         Handles GET requests to fetch and display the details
         """
-        product = get_object_or_404(MenuItem, pk=pk)
+        product = await aget_product(pk)
+        if product is None:
+            raise Http404("No MenuItem matches the given query.")
+        request.user = await request.auser()  # read by the base template
         context = {"product": product}
         return render(request, self.template_name, context)
 
@@ -46,7 +85,9 @@ class SearchView(View):
     """
     View to handle searching for menu items based on a query string.
 
-    This view retrieves menu items whose names contain the search query.
+    This view retrieves available menu items whose name, description or
+    category matches the search query, best match first, using the in-memory
+    menu search index.
     """
 
     def get(self, request):
@@ -55,7 +96,24 @@ class SearchView(View):
         """
         query = request.GET.get("q")
         if query:
-            menu_items = MenuItem.objects.filter(name__icontains=query)
+            menu_items = search_menu(query)
         else:
-            menu_items = MenuItem.objects.none()
+            menu_items = []
         return render(request, "search.html", {"menu_items": menu_items})
+
+
+class SearchSuggestView(View):
+    """
+    View returning search-as-you-type suggestions as JSON.
+    """
+
+    def get(self, request):
+        """
+        Handles GET requests with the partial query in the ``q`` parameter.
+        """
+        query = request.GET.get("q", "")
+        results = [
+            {"id": item.pk, "name": item.name, "price": str(item.price)}
+            for item in search_menu(query, limit=SEARCH_SUGGESTION_LIMIT)
+        ]
+        return JsonResponse({"results": results})
@@ -0,0 +1,232 @@
+"""
+cart.py
+
+This module provides the server-side shopping cart used by the order views.
+
+Only a small identifier travels with each request (the session cookie, or a
+dedicated cart cookie); the cart lines themselves live in a pluggable backend
+selected by the CART_BACKEND setting:
+- SessionCartStore: keeps the cart in the Django session.
+- LRUCartStore: keeps the carts of recent visitors in process memory and evicts
+  the least recently used ones. It is only suitable for single-process servers.
+
+The async views use ``aget_cart`` and ``Cart.asave``, which never block on the
+session backend.
+"""
+
+import copy
+import threading
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+CART_SESSION_KEY = "cart"
+CART_COOKIE_NAME = "cart_id"
+
+
+class Cart:
+    """
+    A customer's cart.
+
+    Every line keeps its own total and the cart keeps a running grand total, so
+    adding, removing and totalling cost O(1) per line.
+
+    Attributes:
+        store (BaseCartStore): The backend the cart is loaded from and saved to.
+        lines (dict): Maps menu item IDs (as strings) to dicts holding the item
+            name, unit price, quantity and line total.
+    """
+
+    def __init__(self, store, data=None):
+        data = data or {}
+        self.store = store
+        self.lines = data.get("lines", {})
+        self._total = Decimal(data.get("total", "0"))
+
+    def __len__(self):
+        return len(self.lines)
+
+    def add(self, menu_item, quantity):
+        """
+        Adds ``quantity`` units of a menu item, merging with an existing line.
+        """
+        line = self.lines.get(str(menu_item.pk))
+        if line is None:
+            line = {
+                "name": menu_item.name,
+                "price": str(menu_item.price),
+                "quantity": 0,
+                "total": "0",
+            }
+            self.lines[str(menu_item.pk)] = line
+
+        added = Decimal(line["price"]) * quantity
+        line["quantity"] += quantity
+        line["total"] = str(Decimal(line["total"]) + added)
+        self._total += added
+
+    def remove(self, item_id):
+        """
+        Removes a line from the cart.
+
+        Returns:
+            bool: True if the line was in the cart, False otherwise.
+        """
+        line = self.lines.pop(str(item_id), None)
+        if line is None:
+            return False
+        self._total -= Decimal(line["total"])
+        return True
+
+    def total(self):
+        """Return the grand total of the cart."""
+        return self._total
+
+    def clear(self):
+        """Remove every line from the cart."""
+        self.lines = {}
+        self._total = Decimal("0")
+
+    def to_dict(self):
+        """Return a JSON-serialisable representation of the cart."""
+        return {"lines": self.lines, "total": str(self._total)}
+
+    def save(self, response):
+        """Persist the cart through its store."""
+        self.store.save(self, response)
+
+    async def asave(self, response):
+        """Async version of save()."""
+        await self.store.asave(self, response)
+
+
+class BaseCartStore:
+    """
+    Interface implemented by every cart backend.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self):
+        """Return the Cart of the current visitor."""
+        raise NotImplementedError
+
+    def save(self, cart, response):
+        """Persist ``cart``, setting any cookie it needs on ``response``."""
+        raise NotImplementedError
+
+    async def aload(self):
+        """Async version of load(), for stores that do no I/O by default."""
+        return self.load()
+
+    async def asave(self, cart, response):
+        """Async version of save(), for stores that do no I/O by default."""
+        self.save(cart, response)
+
+
+class SessionCartStore(BaseCartStore):
+    """
+    Keeps the cart in the visitor's Django session.
+
+    Not for signed cookie sessions, where the cart would have to fit in the
+    session cookie; the settings reject that combination.
+    """
+
+    def load(self):
+        return Cart(self, self.request.session.get(CART_SESSION_KEY))
+
+    def save(self, cart, response):
+        if cart.lines:
+            self.request.session[CART_SESSION_KEY] = cart.to_dict()
+        else:
+            self.request.session.pop(CART_SESSION_KEY, None)
+
+    async def aload(self):
+        return Cart(self, await self.request.session.aget(CART_SESSION_KEY))
+
+    async def asave(self, cart, response):
+        if cart.lines:
+            await self.request.session.aset(CART_SESSION_KEY, cart.to_dict())
+        else:
+            await self.request.session.apop(CART_SESSION_KEY, None)
+
+
+class LRUCartStore(BaseCartStore):
+    """
+    Keeps carts in process memory, keyed by a random ID stored in a cookie.
+
+    At most CART_LRU_MAX_CARTS carts are kept; the least recently used cart is
+    evicted when the limit is reached. Carts are copied in and out of the store
+    under its lock, so concurrent requests for the same cart never share its
+    lines and a cart only changes in the store when it is saved.
+    """
+
+    _carts = OrderedDict()
+    _lock = threading.Lock()
+
+    def load(self):
+        cart_id = self.request.COOKIES.get(CART_COOKIE_NAME)
+        with self._lock:
+            data = self._carts.get(cart_id)
+            if data is not None:
+                self._carts.move_to_end(cart_id)
+                data = copy.deepcopy(data)
+        self.cart_id = cart_id if data is not None else None
+        return Cart(self, data)
+
+    def save(self, cart, response):
+        if not cart.lines:
+            with self._lock:
+                self._carts.pop(self.cart_id, None)
+            response.delete_cookie(CART_COOKIE_NAME)
+            return
+
+        cart_id = self.cart_id or uuid.uuid4().hex
+        max_carts = getattr(settings, "CART_LRU_MAX_CARTS", 1000)
+        with self._lock:
+            self._carts[cart_id] = copy.deepcopy(cart.to_dict())
+            self._carts.move_to_end(cart_id)
+            while len(self._carts) > max_carts:
+                self._carts.popitem(last=False)
+        response.set_cookie(
+            CART_COOKIE_NAME,
+            cart_id,
+            max_age=getattr(settings, "CART_COOKIE_AGE", 60 * 60),
+            httponly=True,
+            samesite="Lax",
+        )
+
+    @classmethod
+    def clear_all(cls):
+        """Drop every stored cart."""
+        with cls._lock:
+            cls._carts.clear()
+
+
+def get_cart_store(request):
+    """Return the configured cart backend for a request."""
+    store_class = import_string(
+        getattr(settings, "CART_BACKEND", "order.cart.SessionCartStore")
+    )
+    return store_class(request)
+
+
+def get_cart(request):
+    """
+    Load the cart of the current visitor from the configured backend.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        Cart: The visitor's cart, empty if they have none yet.
+    """
+    return get_cart_store(request).load()
+
+
+async def aget_cart(request):
+    """Async version of get_cart()."""
+    return await get_cart_store(request).aload()
@@ -0,0 +1,161 @@
+"""
+events.py
+
+This module publishes order board events to the staff devices listening for
+them, through a local in-process pub/sub.
+
+When an order is created or its status changes (see order/signals.py), the
+order is read once with its customer and staff member and the resulting event
+is handed to every subscriber, so the board costs one query per change instead
+of one filter query per device every few seconds. Subscribers are the server
+sent event streams of the staff order board, each running in the event loop of
+an ASGI worker.
+
+The pub/sub lives in the memory of one process: every subscriber sees the
+changes made by that process only, so the board must be served by a single
+ASGI process, or by workers that also handle every order change.
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+ORDER_CREATED = "order_created"
+STATUS_CHANGED = "status_changed"
+
+
+def order_event_data(order):
+    """Return the order board row of an order, as sent with its events."""
+    customer = order.customer
+    staff = order.staff
+    return {
+        "id": order.pk,
+        "created_at": order.created_at,
+        "updated_at": order.updated_at,
+        "table_number": order.table_number,
+        "phone_number": customer.phone_number if customer else None,
+        "status": order.status,
+        "staff": f"{staff.first_name} {staff.last_name}" if staff else None,
+    }
+
+
+def format_event(event_id, event_type, data):
+    """Encode an event in the server-sent events wire format."""
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """
+    The queue of events of one subscriber, filled from any thread and read
+    from the event loop the subscriber was created in.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, event):
+        # Runs in the subscriber's loop; a subscriber that falls behind loses
+        # its oldest events rather than holding on to memory
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """Return the next event, or None if none arrives within ``timeout``."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class OrderEventBroker:
+    """
+    Fans order board events out to the subscribers of this process.
+
+    The last ``ORDER_EVENT_HISTORY`` events are kept, so that a stream that
+    reconnects with a ``Last-Event-ID`` gets the events it missed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=settings.ORDER_EVENT_HISTORY)
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def last_event_id(self):
+        """Return the ID of the newest event, or 0 if none was published yet."""
+        with self._lock:
+            return self._history[-1][0] if self._history else 0
+
+    def subscribe(self, last_event_id=None):
+        """
+        Subscribe the running event loop to the events.
+
+        Args:
+            last_event_id (int): The ID of the last event the subscriber got;
+            the later events still in the history are queued right away.
+
+        Returns:
+            Subscription: The subscription, to be passed to unsubscribe().
+        """
+        subscription = Subscription(
+            asyncio.get_running_loop(), settings.ORDER_EVENT_QUEUE_SIZE
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if last_event_id is not None:
+                for event in self._history:
+                    if event[0] > last_event_id:
+                        subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type, data):
+        """
+        Send an event to every subscriber. Safe to call from any thread.
+
+        Returns:
+            int: The ID of the event.
+        """
+        with self._lock:
+            event = (next(self._ids), event_type, data)
+            self._history.append(event)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:  # the subscriber's loop was closed
+                self.unsubscribe(subscription)
+        return event[0]
+
+    async def stream(self, last_event_id=None):
+        """
+        Yield the events as server-sent events until the client disconnects.
+
+        A comment is sent whenever no event arrived for
+        ``ORDER_EVENT_KEEPALIVE`` seconds, so that proxies keep the
+        connection open.
+        """
+        subscription = self.subscribe(last_event_id)
+        try:
+            yield f"retry: {settings.ORDER_EVENT_RETRY_MS}\n\n"
+            while True:
+                event = await subscription.get(settings.ORDER_EVENT_KEEPALIVE)
+                yield ": keepalive\n\n" if event is None else format_event(*event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+order_events = OrderEventBroker()
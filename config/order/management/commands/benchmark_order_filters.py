@@ -0,0 +1,245 @@
+"""
+benchmark_order_filters.py
+
+Management command that measures the order filters of the checkout screens and
+the reports with and without the indexes added for them.
+
+It seeds a large number of orders, then for every filter prints the query plan
+and the best of several timings, first with the filter indexes dropped and then
+with them in place. Everything runs in one transaction that is rolled back, so
+the database is left as it was, but the tables stay locked meanwhile: run it
+against a development copy of the database, never in production.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from customer.models import Customer
+from menu.models import Category, MenuItem
+from order.models import Order, OrderItem
+from staff.models import Staff
+
+# The indexes added for the filters below by the order and customer migrations
+FILTER_INDEXES = [
+    (Customer, "customer_table_number_idx"),
+    (Order, "order_status_order_date_idx"),
+    (Order, "order_order_date_id_idx"),
+    (Order, "order_staff_order_date_idx"),
+    (Order, "order_customer_order_date_idx"),
+    (OrderItem, "orderitem_created_at_item_idx"),
+]
+
+SEED_BATCH_SIZE = 10000
+SEED_DAYS = 365
+SEED_STAFF = 10
+SEED_TABLES = 20
+SEED_CUSTOMERS = 2000
+SEED_MENU_ITEMS = 50
+STATUSES = ["Pending", "Processing", "Completed", "Completed", "Cancelled"]
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Lets bulk_create keep the given auto_now_add dates instead of now."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def filter_queries(now):
+    """Return the benchmarked querysets, keyed by a short description."""
+    day_start = (now - timedelta(days=7)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    staff = Staff.objects.filter(phone_number__startswith="0999").first()
+    return {
+        "orders by status": Order.objects.filter(status="Pending").order_by(
+            "-order_date"
+        )[:50],
+        "orders of a day": Order.objects.filter(
+            order_date__gte=day_start, order_date__lt=day_start + timedelta(days=1)
+        ),
+        "orders of a staff member": Order.objects.filter(staff=staff).order_by(
+            "-order_date"
+        )[:50],
+        "orders of a table": Order.objects.filter(
+            customer__table_number=SEED_TABLES // 2
+        ).order_by("-order_date")[:50],
+        "top products of the month": OrderItem.objects.filter(
+            created_at__gte=now - timedelta(days=30)
+        )
+        .values("item")
+        .annotate(total_orders=Sum("quantity"))
+        .order_by("-total_orders")[:5],
+        "completed sales of the month": OrderItem.objects.filter(
+            order__status="Completed", created_at__gte=now - timedelta(days=30)
+        )
+        .values("order__status")
+        .annotate(total=Sum("subtotal")),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed orders and compare the plans and timings of the order filters with "
+        "and without their indexes. All changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--orders",
+            type=int,
+            default=1000000,
+            help="Number of orders to seed (default: 1000000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of runs per query; the best time is reported.",
+        )
+
+    def handle(self, *args, **options):
+        # SQLite can only change the schema inside a transaction when foreign
+        # key checks were turned off before it started
+        connection.disable_constraint_checking()
+        try:
+            with transaction.atomic():
+                self.seed(options["orders"])
+                queries = filter_queries(timezone.now())
+
+                self.drop_indexes()
+                before = self.measure("without indexes", queries, options["repeat"])
+                self.create_indexes()
+                after = self.measure("with indexes", queries, options["repeat"])
+
+                self.stdout.write(self.style.MIGRATE_HEADING("Timings (best, ms)"))
+                for name in queries:
+                    self.stdout.write(
+                        f"  {name:<30} {before[name]:>10.2f} {after[name]:>10.2f}"
+                    )
+                transaction.set_rollback(True)
+        finally:
+            connection.enable_constraint_checking()
+
+    def seed(self, count):
+        """Insert the staff, customers, menu items, orders and order items."""
+        rng = random.Random(0)
+        now = timezone.now()
+        self.stdout.write(f"Seeding {count} orders...")
+
+        category = Category.objects.create(name="Benchmark")
+        items = MenuItem.objects.bulk_create(
+            MenuItem(
+                name=f"Item {number}",
+                price=Decimal(rng.randint(10, 200)),
+                category=category,
+            )
+            for number in range(SEED_MENU_ITEMS)
+        )
+        staff = Staff.objects.bulk_create(
+            Staff(
+                first_name="Staff",
+                last_name=str(number),
+                phone_number=f"0999{number:07d}",
+                role="S",
+            )
+            for number in range(SEED_STAFF)
+        )
+        customers = Customer.objects.bulk_create(
+            Customer(
+                first_name="Customer",
+                last_name=str(number),
+                table_number=number % SEED_TABLES + 1,
+            )
+            for number in range(SEED_CUSTOMERS)
+        )
+
+        created = 0
+        with explicit_dates(
+            Order._meta.get_field("order_date"),
+            Order._meta.get_field("created_at"),
+            OrderItem._meta.get_field("created_at"),
+        ):
+            while created < count:
+                batch = min(SEED_BATCH_SIZE, count - created)
+                orders = []
+                for _ in range(batch):
+                    placed_at = now - timedelta(
+                        seconds=rng.randrange(SEED_DAYS * 86400)
+                    )
+                    orders.append(
+                        Order(
+                            customer=rng.choice(customers),
+                            staff=rng.choice(staff),
+                            status=rng.choice(STATUSES),
+                            table_number=str(rng.randint(1, SEED_TABLES)),
+                            order_date=placed_at,
+                            created_at=placed_at,
+                        )
+                    )
+                orders = Order.objects.bulk_create(orders)
+                order_items = []
+                for order in orders:
+                    item = rng.choice(items)
+                    quantity = rng.randint(1, 3)
+                    order_items.append(
+                        OrderItem(
+                            order=order,
+                            item=item,
+                            quantity=quantity,
+                            subtotal=item.price * quantity,
+                            created_at=order.created_at,
+                        )
+                    )
+                OrderItem.objects.bulk_create(order_items)
+                created += batch
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for model, name in FILTER_INDEXES:
+                schema_editor.remove_index(model, self.get_index(model, name))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def create_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for model, name in FILTER_INDEXES:
+                schema_editor.add_index(model, self.get_index(model, name))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def get_index(self, model, name):
+        return next(index for index in model._meta.indexes if index.name == name)
+
+    def measure(self, heading, queries, repeat):
+        """
+        Print the plan of each query and return its best time in milliseconds.
+        """
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Query plans {heading}"))
+        timings = {}
+        for name, queryset in queries.items():
+            self.stdout.write(f"{name}:")
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"    {line}")
+            best = None
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                list(queryset.all())
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+        return timings
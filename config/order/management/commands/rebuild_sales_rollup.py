@@ -0,0 +1,17 @@
+"""
+rebuild_sales_rollup.py
+
+Management command that recomputes the daily sales rollup from scratch, e.g.
+after order items were changed outside the ORM.
+"""
+
+from django.core.management.base import BaseCommand
+from order.models import DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollup from the items of completed orders."
+
+    def handle(self, *args, **options):
+        rows = DailySalesRollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} daily sales rollup rows."))
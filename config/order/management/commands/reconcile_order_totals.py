@@ -0,0 +1,43 @@
+"""
+reconcile_order_totals.py
+
+Management command that repairs order totals which drifted away from the sum
+of their order items, e.g. after bulk edits made outside the ORM.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from order.models import Order, items_total
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the total price of orders whose total no longer matches their items."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many orders have drifted, without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        actual_total = items_total()
+
+        with transaction.atomic():
+            drifted = Order.objects.annotate(actual_total=actual_total).exclude(
+                total_price=F("actual_total")
+            )
+            if options["dry_run"]:
+                self.stdout.write(f"{drifted.count()} order totals have drifted.")
+                return
+
+            # A single UPDATE ... SET total_price = (SELECT SUM(...)) for all of them
+            reconciled = drifted.update(
+                total_price=actual_total, updated_at=timezone.now()
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {reconciled} order totals."))
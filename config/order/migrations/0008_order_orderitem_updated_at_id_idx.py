@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0007_delete_orderhistory"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["updated_at", "id"], name="order_updated_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["updated_at", "id"], name="orderitem_updated_at_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_sales_rollup(apps, schema_editor):
+    """Fill the rollup from the order items of the orders completed so far."""
+    OrderItem = apps.get_model("order", "OrderItem")
+    DailySalesRollup = apps.get_model("order", "DailySalesRollup")
+    lines = (
+        OrderItem.objects.filter(order__status="Completed")
+        .annotate(date=TruncDate("order__created_at"))
+        .values("date", "item")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("subtotal"))
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create(
+        [
+            DailySalesRollup(
+                date=line["date"],
+                item_id=line["item"],
+                quantity=line["quantity"],
+                revenue=line["revenue"],
+            )
+            for line in lines
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("menu", "0001_initial"),
+        ("order", "0008_order_orderitem_updated_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("quantity", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="menu.menuitem"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "item"), name="unique_daily_sales_rollup"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            backfill_daily_sales_rollup, reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customer", "0010_customer_table_number_idx"),
+        ("menu", "0001_initial"),
+        ("order", "0009_dailysalesrollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "order_date"], name="order_status_order_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["order_date"], name="order_order_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["staff", "order_date"], name="order_staff_order_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["customer", "order_date"], name="order_customer_order_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["created_at", "item"], name="orderitem_created_at_item_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customer", "0010_customer_table_number_idx"),
+        ("order", "0010_order_filter_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="order",
+            name="order_order_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["order_date", "id"], name="order_order_date_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_order_cafe(apps, schema_editor):
+    """Give the orders placed so far the cafe of their customer."""
+    Order = apps.get_model("order", "Order")
+    Customer = apps.get_model("customer", "Customer")
+    Order.objects.filter(customer__cafe__isnull=False).update(
+        cafe=Subquery(
+            Customer.objects.filter(pk=OuterRef("customer_id")).values("cafe")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cafe", "0008_table_number_range"),
+        ("customer", "0010_customer_table_number_idx"),
+        ("order", "0011_order_order_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="cafe",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="cafe.cafe",
+            ),
+        ),
+        migrations.RunPython(
+            backfill_order_cafe, reverse_code=migrations.RunPython.noop
+        ),
+    ]
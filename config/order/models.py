@@ -5,12 +5,38 @@ This module defines the Order and OrderItem models for the staff application,
 including attributes related to customer orders and their items.
 """
 
-from django.db import models
+from decimal import Decimal
+from django.db import IntegrityError, models, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from cafe.models import Cafe
 from staff.models import Staff
 from customer.models import Customer
 from menu.models import MenuItem
 from django.core.exceptions import ValidationError
 
+# Order fields exported with every order item (see staff/export.py)
+ORDER_ITEM_EXPORT_FIELDS = ("customer", "order_date", "table_number")
+
+
+def items_total():
+    """
+    Return an expression for the sum of the subtotals of an order's items,
+    to be used in a query over orders.
+    """
+    subtotals = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum("subtotal"))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(subtotals),
+        Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
 
 class Order(models.Model):
     """
@@ -19,6 +45,7 @@ class Order(models.Model):
     Attributes:
         customer (Customer): The customer associated with the order.
         staff (Staff): The staff member handling the order.
+        cafe (Cafe): The cafe the order was placed in, whose table it takes.
         order_date (DateTimeField): The date and time when the order was placed.
         status (str): The current status of the order (Pending, Completed, Canceled).
         total_price (Decimal): The total price of the order, calculated automatically.
@@ -30,6 +57,7 @@ class Order(models.Model):
         Customer, on_delete=models.SET_NULL, null=True, blank=True
     )
     staff = models.ForeignKey(Staff, on_delete=models.CASCADE, null=True, blank=True)
+    cafe = models.ForeignKey(Cafe, on_delete=models.SET_NULL, null=True, blank=True)
     order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=20,
@@ -48,6 +76,26 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of incremental exports (staff/export.py)
+            models.Index(fields=["updated_at", "id"], name="order_updated_at_id_idx"),
+            # Checkout filters by status, day, staff member and customer table,
+            # newest first, and the reports join completed orders by status
+            models.Index(
+                fields=["status", "order_date"], name="order_status_order_date_idx"
+            ),
+            # Keyset pagination of the checkout order lists (staff/pagination.py)
+            models.Index(fields=["order_date", "id"], name="order_order_date_id_idx"),
+            models.Index(
+                fields=["staff", "order_date"], name="order_staff_order_date_idx"
+            ),
+            models.Index(
+                fields=["customer", "order_date"],
+                name="order_customer_order_date_idx",
+            ),
+        ]
+
     def __str__(self):
         """
         Returns a string representation of the Order.
@@ -57,29 +105,160 @@ class Order(models.Model):
         """
         return f"Order {self.id} by {self.customer.phone_number if self.customer else 'Guest'}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the status loaded from the database so that a later save can
+        tell when the order enters or leaves the Completed status, and the
+        fields exported with its items, so that it can tell when they change.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        instance._loaded_export_fields = instance.export_field_values()
+        return instance
+
+    def export_field_values(self):
+        """Return the values of the fields exported with the order's items."""
+        return {
+            name: self.__dict__.get(self._meta.get_field(name).attname)
+            for name in ORDER_ITEM_EXPORT_FIELDS
+        }
+
     def calculate_total_price(self):
         """
-        Calculates the total price of the order based on the subtotal of all order items.
+        Recomputes the stored total price from the subtotals of the order items.
+
+        The total is normally kept up to date by the order items themselves (see
+        apply_total_delta), so this is only needed to repair a drifted total. It
+        is written with a single UPDATE summing the items in the database, then
+        read back into the total_price attribute.
+        """
+        updated_at = timezone.now()
+        Order.objects.filter(pk=self.pk).update(
+            total_price=items_total(), updated_at=updated_at
+        )
+        self.refresh_from_db(fields=["total_price"])
+        self.updated_at = updated_at
+
+    def add_items_from_cart(self, cart):
+        """
+        Adds every line of a cart to the order in a constant number of queries.
 
-        This method sums the subtotals of all associated OrderItem instances and updates
-        the total_price attribute of the Order instance.
+        The menu items are fetched with a single ``id__in`` lookup, the order items
+        are inserted with one ``bulk_create`` and the order total is written with a
+        single update, so the cost does not grow with the size of the cart.
+
+        Args:
+            cart (dict): Mapping of menu item IDs to dicts holding a "quantity" key.
+
+        Returns:
+            tuple: The loyalty points earned by the order and the list of cart item
+            IDs that no longer exist on the menu.
+        """
+        menu_items = MenuItem.objects.in_bulk([int(item_id) for item_id in cart.keys()])
+        order_items = []
+        missing_ids = []
+        earned_points = 0
+        total = 0
+
+        for item_id, line in cart.items():
+            menu_item = menu_items.get(int(item_id))
+            if menu_item is None:
+                missing_ids.append(item_id)
+                continue
+            quantity = int(line["quantity"])
+            subtotal = menu_item.price * quantity
+            order_items.append(
+                OrderItem(
+                    order=self, item=menu_item, quantity=quantity, subtotal=subtotal
+                )
+            )
+            earned_points += menu_item.points * quantity
+            total += subtotal
+
+        with transaction.atomic():
+            OrderItem.objects.bulk_create(order_items)
+            self.apply_total_delta(total)
+
+        return earned_points, missing_ids
+
+    def apply_total_delta(self, delta):
+        """
+        Shifts the stored total price by ``delta`` without reading the order first.
+
+        The change is applied in the database with an ``F()`` expression, so two
+        staff members editing the same order never overwrite each other's totals.
+        ``updated_at`` is moved on as well, so incremental exports pick it up.
+
+        Args:
+            delta (Decimal): The amount to add to (or, if negative, subtract from)
+            the total price.
         """
-        total = sum(item.subtotal for item in self.order_items.all())
-        self.total_price = total
+        if not delta:
+            return
+        updated_at = timezone.now()
+        Order.objects.filter(pk=self.pk).update(
+            total_price=F("total_price") + delta, updated_at=updated_at
+        )
+        total_price = self._meta.get_field("total_price").to_python(self.total_price)
+        self.total_price = total_price + delta
+        self.updated_at = updated_at
 
     def save(self, *args, **kwargs):
         """
-        Overrides the save method to calculate the total price before saving.
+        Overrides the save method so updates never overwrite the total price.
+
+        The total price of an existing order is maintained incrementally by its
+        order items, so it is left out of the columns written on update.
+
+        When a field exported with the order's items changes, the items'
+        ``updated_at`` is moved on in the same UPDATE for all of them, so that
+        incremental exports keep paging on the indexed ``(updated_at, id)``.
 
         Args:
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
         """
-        # First save the Order instance to the database
-        super().save(*args, **kwargs)
-
-        # Now that the Order is saved, you can access the order_items
-        self.calculate_total_price()
+        if (
+            self.pk is not None
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "total_price"
+            ]
+        adding = self._state.adding
+        previous_status = getattr(self, "_loaded_status", None)
+        previous_export_fields = getattr(self, "_loaded_export_fields", {})
+        update_fields = kwargs.get("update_fields")
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            saved_export_fields = {
+                name: value
+                for name, value in self.export_field_values().items()
+                if update_fields is None or name in update_fields
+            }
+            if not adding and any(
+                name not in previous_export_fields
+                or value != previous_export_fields[name]
+                for name, value in saved_export_fields.items()
+            ):
+                # Order item exports carry these fields (staff/export.py)
+                self.order_items.update(updated_at=timezone.now())
+            completed = self.status == "Completed"
+            status_saved = update_fields is None or "status" in update_fields
+            if (
+                not adding
+                and status_saved
+                and completed != (previous_status == "Completed")
+            ):
+                # The order's items enter or leave the daily sales rollup
+                DailySalesRollup.add_order(self, 1 if completed else -1)
+        if status_saved:
+            self._loaded_status = self.status
+        self._loaded_export_fields = {**previous_export_fields, **saved_export_fields}
 
     def clean(self):
         if self.total_price < 0:
@@ -111,10 +290,40 @@ class OrderItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of incremental exports (staff/export.py)
+            models.Index(
+                fields=["updated_at", "id"], name="orderitem_updated_at_id_idx"
+            ),
+            # Top products and other reports filter items by creation time
+            models.Index(
+                fields=["created_at", "item"], name="orderitem_created_at_item_idx"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the subtotal loaded from the database so that a later save can
+        apply only the difference to the order total.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_subtotal = instance.__dict__.get("subtotal")
+        instance._loaded_quantity = instance.__dict__.get("quantity")
+        instance._loaded_item_id = instance.__dict__.get("item_id")
+        return instance
+
     def save(self, *args, **kwargs):
         """
         Overrides the save method to calculate the subtotal before saving.
 
+        The order total is then shifted by the change in subtotal instead of being
+        recomputed from every item of the order. On update the item row is locked
+        and the change is measured against its stored subtotal, so that two
+        concurrent edits of the same item cannot both apply a delta against the
+        same old subtotal.
+
         Args:
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
@@ -123,10 +332,46 @@ class OrderItem(models.Model):
         self.subtotal = (
             self.item.price * self.quantity
         )  # Assuming item has a price attribute
-        super().save(*args, **kwargs)
-        if self.order:
-            self.order.calculate_total_price()
-            self.order.save()
+        with transaction.atomic():
+            if self.pk is not None and not self._state.adding:
+                stored = (
+                    OrderItem.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("subtotal", "quantity", "item_id")
+                    .first()
+                )
+                if stored is not None:
+                    (
+                        self._loaded_subtotal,
+                        self._loaded_quantity,
+                        self._loaded_item_id,
+                    ) = stored
+            previous_subtotal = getattr(self, "_loaded_subtotal", None) or 0
+            super().save(*args, **kwargs)
+            if self.order:
+                self.order.apply_total_delta(self.subtotal - previous_subtotal)
+                if self.order.status == "Completed":
+                    self.update_sales_rollup(previous_subtotal)
+        self._loaded_subtotal = self.subtotal
+        self._loaded_quantity = self.quantity
+        self._loaded_item_id = self.item_id
+
+    def update_sales_rollup(self, previous_subtotal):
+        """Moves the change made to an item of a completed order into the rollup."""
+        date = timezone.localdate(self.order.created_at)
+        previous_item_id = getattr(self, "_loaded_item_id", None)
+        previous_quantity = getattr(self, "_loaded_quantity", None) or 0
+        if previous_item_id is not None and previous_item_id != self.item_id:
+            DailySalesRollup.add(
+                date, previous_item_id, -previous_quantity, -previous_subtotal
+            )
+            previous_quantity = previous_subtotal = 0
+        DailySalesRollup.add(
+            date,
+            self.item_id,
+            self.quantity - previous_quantity,
+            self.subtotal - previous_subtotal,
+        )
 
     def __str__(self):
         """
@@ -136,3 +381,108 @@ class OrderItem(models.Model):
             str: A string indicating the quantity and item name in the corresponding order.
         """
         return f"{self.quantity} x {self.item.name} in Order {self.order.id}"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-aggregated sales of a menu item on a day, counting completed orders only.
+
+    Rows are updated incrementally whenever an order enters or leaves the
+    Completed status and whenever the items of a completed order change, so
+    sales reports read one row per day and menu item instead of every order item.
+
+    Attributes:
+        date (DateField): The day the orders were placed.
+        item (MenuItem): The menu item sold.
+        quantity (int): The number of units sold.
+        revenue (Decimal): The sum of the subtotals of the units sold.
+    """
+
+    date = models.DateField()
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "item"], name="unique_daily_sales_rollup"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.item_id} on {self.date}"
+
+    @classmethod
+    def add(cls, date, item_id, quantity, revenue):
+        """
+        Adds sales to the row of a day and menu item, creating it if needed.
+
+        Args:
+            date (date): The day of the sales.
+            item_id (int): The menu item sold.
+            quantity (int): The units to add (negative to remove them).
+            revenue (Decimal): The revenue to add (negative to remove it).
+        """
+        if not quantity and not revenue:
+            return
+        row = cls.objects.filter(date=date, item_id=item_id)
+        changes = {
+            "quantity": F("quantity") + quantity,
+            "revenue": F("revenue") + revenue,
+        }
+        if row.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    date=date, item_id=item_id, quantity=quantity, revenue=revenue
+                )
+        except IntegrityError:
+            # Another request created the row in the meantime
+            row.update(**changes)
+
+    @classmethod
+    def add_order(cls, order, sign=1):
+        """
+        Adds the items of an order to the rollup, or removes them if ``sign`` is -1.
+        """
+        date = timezone.localdate(order.created_at)
+        lines = order.order_items.values("item_id").annotate(
+            quantity=Sum("quantity"), revenue=Sum("subtotal")
+        )
+        for line in lines:
+            cls.add(
+                date, line["item_id"], sign * line["quantity"], sign * line["revenue"]
+            )
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recomputes the whole rollup from the order items of completed orders.
+
+        Returns:
+            int: The number of rollup rows written.
+        """
+        lines = (
+            OrderItem.objects.filter(order__status="Completed")
+            .annotate(date=TruncDate("order__created_at"))
+            .values("date", "item")
+            .annotate(quantity=Sum("quantity"), revenue=Sum("subtotal"))
+            .order_by()
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            rows = cls.objects.bulk_create(
+                [
+                    cls(
+                        date=line["date"],
+                        item_id=line["item"],
+                        quantity=line["quantity"],
+                        revenue=line["revenue"],
+                    )
+                    for line in lines
+                ],
+                batch_size=1000,
+            )
+        return len(rows)
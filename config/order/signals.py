@@ -0,0 +1,80 @@
+"""
+signals.py
+
+This module keeps order totals and the daily sales rollup in step with their
+items when order items are deleted, including deletes cascaded from orders or
+menu items and queryset deletes, and publishes the order board events.
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .events import ORDER_CREATED, STATUS_CHANGED, order_event_data, order_events
+from .models import DailySalesRollup, Order, OrderItem
+
+
+@receiver(post_delete, sender=OrderItem)
+def subtract_deleted_item_from_total(sender, instance, **kwargs):
+    """
+    Removes the subtotal of a deleted order item from its order's total price.
+    """
+    if OrderItem.order.is_cached(instance):
+        instance.order.apply_total_delta(-instance.subtotal)
+    else:
+        Order.objects.filter(pk=instance.order_id).update(
+            total_price=F("total_price") - instance.subtotal,
+            updated_at=timezone.now(),
+        )
+
+
+@receiver(post_delete, sender=OrderItem)
+def subtract_deleted_item_from_sales_rollup(sender, instance, **kwargs):
+    """
+    Removes a deleted item of a completed order from the daily sales rollup.
+    """
+    if OrderItem.order.is_cached(instance):
+        order = instance.order
+        created_at = order.created_at if order.status == "Completed" else None
+    else:
+        created_at = (
+            Order.objects.filter(pk=instance.order_id, status="Completed")
+            .values_list("created_at", flat=True)
+            .first()
+        )
+    if created_at is not None:
+        DailySalesRollup.add(
+            timezone.localdate(created_at),
+            instance.item_id,
+            -instance.quantity,
+            -instance.subtotal,
+        )
+
+
+@receiver(post_save, sender=Order)
+def publish_order_event(sender, instance, created, **kwargs):
+    """
+    Publishes an order board event once an order is created or its status
+    changes, reading the order a single time for all the listening devices.
+
+    Events are published even when no device is listening, so that they are in
+    the history for the boards that reconnect.
+    """
+    if created:
+        event_type = ORDER_CREATED
+    elif instance.status != getattr(instance, "_loaded_status", None):
+        event_type = STATUS_CHANGED
+    else:
+        return
+
+    def publish():
+        order = (
+            Order.objects.select_related("customer", "staff")
+            .filter(pk=instance.pk)
+            .first()
+        )
+        if order is not None:
+            order_events.publish(event_type, order_event_data(order))
+
+    transaction.on_commit(publish)
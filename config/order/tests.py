@@ -1,12 +1,21 @@
-import json
 from decimal import Decimal
-from django.test import TestCase
+from io import StringIO
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.exceptions import ValidationError
+from cafe.models import Cafe, Table
 from customer.models import Customer
+from customer.points import get_points_balance
 from menu.models import MenuItem, Category
 from staff.models import Staff
-from .models import Order, OrderItem
+from .cart import LRUCartStore
+from .models import DailySalesRollup, Order, OrderItem
 
 
 class OrderViewTests(TestCase):
@@ -32,7 +41,8 @@ class OrderViewTests(TestCase):
             reverse("add_to_cart", args=[self.menu_item.id]), {"quantity": 2}
         )
         self.assertEqual(response.status_code, 302)  # Update to match view response
-        cart = json.loads(response.cookies["cart"].value)
+        self.assertNotIn("cart", response.cookies)  # Only the session ID is sent
+        cart = self.client.session["cart"]["lines"]
         self.assertIn(str(self.menu_item.id), cart)
         self.assertEqual(cart[str(self.menu_item.id)]["quantity"], 2)
 
@@ -81,10 +91,14 @@ class OrderViewTests(TestCase):
         # چک کردن وضعیت پاسخ
         self.assertEqual(response.status_code, 302)
 
-        # بررسی ذخیره‌سازی سبد خرید در کوکی‌ها
-        cart = json.loads(response.cookies["cart"].value)
-        self.assertIn(str(self.menu_item.id), cart)
-        self.assertEqual(cart[str(self.menu_item.id)]["quantity"], 3)
+        # بررسی ذخیره‌سازی سبد خرید در سشن
+        self.client.get(
+            reverse("add_to_cart", args=[self.menu_item.id]), {"quantity": 1}
+        )
+        response = self.client.get(reverse("cart"))
+        cart = response.context["cart"]
+        self.assertEqual(cart[str(self.menu_item.id)]["quantity"], 4)
+        self.assertEqual(response.context["total_price"], Decimal("10.00"))
 
     def test_order_item_subtotal_calculation(self):
         """Test if subtotal for an order item is calculated correctly."""
@@ -137,3 +151,308 @@ class OrderViewTests(TestCase):
         self.menu_item.delete()
         self.category.delete()
         Order.objects.all().delete()
+
+
+class SubmitOrderTests(TestCase):
+    def setUp(self):
+        """Create a cafe, a free table and a few menu items for testing."""
+        cache.clear()
+        self.cafe = Cafe.objects.create(
+            name="Test Cafe",
+            address="123 Test Street",
+            opening_time="08:00",
+            closing_time="20:00",
+        )
+        Table.objects.create(cafe=self.cafe, number=1, status="A")
+        self.category = Category.objects.create(name="Beverages")
+        self.menu_items = [
+            MenuItem.objects.create(
+                name=f"Item {i}",
+                price=Decimal("2.50"),
+                points=2,
+                category=self.category,
+            )
+            for i in range(10)
+        ]
+
+    def submit(self, items, phone_number="09123456780"):
+        """Submit an order for the given menu items, two of each."""
+        for item in items:
+            self.client.get(reverse("add_to_cart", args=[item.id]), {"quantity": 2})
+        Table.objects.filter(number=1).update(status="A")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("submit_order"),
+                {"table_number": "1", "phone_number": phone_number},
+            )
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_submit_order_creates_items_and_totals(self):
+        """Test that the order, its items, total and points are all stored."""
+        self.submit(self.menu_items[:3])
+        order = Order.objects.get()
+        self.assertEqual(order.cafe, self.cafe)
+        self.assertEqual(order.order_items.count(), 3)
+        self.assertEqual(order.total_price, Decimal("15.00"))  # 3 * 2 * 2.50
+        self.assertEqual(order.points_entries.get().points, 12)  # 3 * 2 * 2 points
+        self.assertEqual(get_points_balance(order.customer), 12)
+
+    def test_submit_order_query_count_is_constant(self):
+        """Test that a bigger cart does not cost more queries."""
+        small_cart = self.submit(self.menu_items[:1], phone_number="09123456781")
+        large_cart = self.submit(self.menu_items, phone_number="09123456782")
+        self.assertEqual(small_cart, large_cart)
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies",
+        CART_BACKEND="order.cart.LRUCartStore",
+    )
+    def test_customer_path_with_signed_cookie_sessions(self):
+        """Test that the customer path never touches the sessions table."""
+        with CaptureQueriesContext(connection) as queries:
+            self.submit(self.menu_items[:2], phone_number="09123456784")
+            response = self.client.get(reverse("cart"))
+        self.assertEqual(response.context["total_price"], 0)
+        self.assertEqual(Order.objects.get().total_price, Decimal("10.00"))
+        self.assertEqual(self.client.session["customer_phone_number"], "09123456784")
+        self.assertFalse(
+            any("django_session" in query["sql"] for query in queries.captured_queries)
+        )
+
+    async def test_customer_path_over_asgi(self):
+        """Test adding to the cart, the cart and submitting through ASGI."""
+        for item in self.menu_items[:2]:
+            response = await self.async_client.get(
+                reverse("add_to_cart", args=[item.id]), {"quantity": 2}
+            )
+            self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(reverse("cart"))
+        self.assertEqual(response.context["total_price"], Decimal("10.00"))
+
+        response = await self.async_client.post(
+            reverse("submit_order"),
+            {"table_number": "1", "phone_number": "09123456783"},
+        )
+        self.assertEqual(response.status_code, 302)
+        order = await Order.objects.select_related("customer").aget()
+        self.assertEqual(order.total_price, Decimal("10.00"))
+        self.assertEqual(await sync_to_async(get_points_balance)(order.customer), 8)
+        self.assertEqual(
+            await self.async_client.session.aget("customer_phone_number"),
+            "09123456783",
+        )
+        response = await self.async_client.get(reverse("cart"))
+        self.assertEqual(response.context["total_price"], Decimal("0"))
+
+
+@override_settings(CART_BACKEND="order.cart.LRUCartStore", CART_LRU_MAX_CARTS=2)
+class LRUCartStoreTests(TestCase):
+    def setUp(self):
+        """Create a menu item and start with no stored carts."""
+        LRUCartStore.clear_all()
+        self.category = Category.objects.create(name="Beverages")
+        self.menu_item = MenuItem.objects.create(
+            name="Coffee", price=Decimal("2.50"), category=self.category
+        )
+
+    def test_cart_cookie_only_holds_the_cart_id(self):
+        """Test that the cart lives in memory and the cookie holds its ID."""
+        response = self.client.get(
+            reverse("add_to_cart", args=[self.menu_item.id]), {"quantity": 2}
+        )
+        self.assertEqual(len(response.cookies["cart_id"].value), 32)
+        response = self.client.get(reverse("cart"))
+        self.assertEqual(response.context["total_price"], Decimal("5.00"))
+
+        self.client.get(reverse("remove_from_cart", args=[self.menu_item.id]))
+        response = self.client.get(reverse("cart"))
+        self.assertContains(response, "Your cart is empty.")
+
+    def test_least_recently_used_cart_is_evicted(self):
+        """Test that the oldest cart is dropped once the limit is reached."""
+        first_client = self.client_class()
+        first_client.get(
+            reverse("add_to_cart", args=[self.menu_item.id]), {"quantity": 1}
+        )
+        for _ in range(2):
+            self.client_class().get(
+                reverse("add_to_cart", args=[self.menu_item.id]), {"quantity": 1}
+            )
+        response = first_client.get(reverse("cart"))
+        self.assertEqual(response.context["total_price"], Decimal("0"))
+
+    def test_stored_cart_is_not_shared_with_loaded_carts(self):
+        """Test that only a saved cart changes the store."""
+        cart = LRUCartStore(RequestFactory().get("/")).load()
+        cart.add(self.menu_item, 1)
+        response = HttpResponse()
+        cart.save(response)
+        cart.add(self.menu_item, 5)
+
+        request = RequestFactory().get("/")
+        request.COOKIES["cart_id"] = response.cookies["cart_id"].value
+        loaded = LRUCartStore(request).load()
+        loaded.add(self.menu_item, 2)
+        self.assertEqual(
+            LRUCartStore(request).load().lines[str(self.menu_item.pk)]["quantity"], 1
+        )
+
+
+class IncrementalOrderTotalTests(TestCase):
+    def setUp(self):
+        """Create an order and a menu item for testing."""
+        self.category = Category.objects.create(name="Beverages")
+        self.menu_item = MenuItem.objects.create(
+            name="Coffee", price=Decimal("2.50"), category=self.category
+        )
+        self.order = Order.objects.create(table_number="1")
+
+    def stored_total(self):
+        return Order.objects.get(pk=self.order.pk).total_price
+
+    def test_insert_update_and_delete_shift_the_total(self):
+        """Test that every item change is applied to the stored total."""
+        order_item = OrderItem.objects.create(
+            order=self.order, item=self.menu_item, quantity=2
+        )
+        self.assertEqual(self.stored_total(), Decimal("5.00"))
+
+        order_item = OrderItem.objects.get(pk=order_item.pk)
+        order_item.quantity = 3
+        order_item.save()
+        self.assertEqual(self.stored_total(), Decimal("7.50"))
+
+        order_item.delete()
+        self.assertEqual(self.stored_total(), Decimal("0.00"))
+
+    def test_item_update_does_not_reload_order_items(self):
+        """Test that editing an item costs a constant number of queries."""
+        for _ in range(5):
+            OrderItem.objects.create(order=self.order, item=self.menu_item)
+        order_item = OrderItem.objects.select_related("item", "order").first()
+        order_item.quantity = 4
+        # The locked item row, one UPDATE for the item and one for the total,
+        # inside a savepoint
+        with self.assertNumQueries(5):
+            order_item.save()
+        self.assertEqual(self.stored_total(), Decimal("20.00"))
+
+    def test_order_save_keeps_concurrent_total_changes(self):
+        """Test that saving a stale order does not overwrite its total."""
+        stale_order = Order.objects.get(pk=self.order.pk)
+        OrderItem.objects.create(order=self.order, item=self.menu_item, quantity=2)
+        stale_order.status = "Processing"
+        stale_order.save()
+        self.assertEqual(self.stored_total(), Decimal("5.00"))
+
+    def test_stale_item_edits_do_not_drift_the_total(self):
+        """Test that two edits of the same item loaded together keep the total."""
+        order_item = OrderItem.objects.create(order=self.order, item=self.menu_item)
+        first = OrderItem.objects.get(pk=order_item.pk)
+        second = OrderItem.objects.get(pk=order_item.pk)
+        first.quantity = 3
+        first.save()
+        second.quantity = 2
+        second.save()
+        self.assertEqual(self.stored_total(), Decimal("5.00"))
+
+    def test_calculate_total_price_stores_the_total(self):
+        """Test that recomputing the total writes it to the database."""
+        OrderItem.objects.create(order=self.order, item=self.menu_item, quantity=2)
+        Order.objects.filter(pk=self.order.pk).update(total_price=Decimal("99.00"))
+        self.order.calculate_total_price()
+        self.assertEqual(self.order.total_price, Decimal("5.00"))
+        self.assertEqual(self.stored_total(), Decimal("5.00"))
+
+    def test_reconcile_order_totals_command(self):
+        """Test that the command repairs drifted totals."""
+        OrderItem.objects.create(order=self.order, item=self.menu_item, quantity=2)
+        Order.objects.filter(pk=self.order.pk).update(total_price=Decimal("99.00"))
+        out = StringIO()
+        call_command("reconcile_order_totals", stdout=out)
+        self.assertIn("Reconciled 1 order totals.", out.getvalue())
+        self.assertEqual(self.stored_total(), Decimal("5.00"))
+
+
+class DailySalesRollupTests(TestCase):
+    def setUp(self):
+        """Create an order with two lines of two menu items."""
+        category = Category.objects.create(name="Beverages")
+        self.coffee = MenuItem.objects.create(
+            name="Coffee", price=Decimal("2.50"), category=category
+        )
+        self.tea = MenuItem.objects.create(
+            name="Tea", price=Decimal("1.00"), category=category
+        )
+        self.order = Order.objects.create(table_number="1")
+        self.coffee_line = OrderItem.objects.create(
+            order=self.order, item=self.coffee, quantity=2
+        )
+        OrderItem.objects.create(order=self.order, item=self.tea, quantity=3)
+
+    def rollup(self):
+        return {
+            row.item_id: (row.quantity, row.revenue)
+            for row in DailySalesRollup.objects.all()
+        }
+
+    def set_status(self, status):
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = status
+        order.save()
+
+    def test_completing_an_order_updates_rollup(self):
+        """Test that orders count only while they are completed."""
+        self.assertEqual(self.rollup(), {})
+        self.set_status("Completed")
+        self.assertEqual(
+            self.rollup(),
+            {self.coffee.pk: (2, Decimal("5.00")), self.tea.pk: (3, Decimal("3.00"))},
+        )
+        self.set_status("Completed")  # saving again counts nothing twice
+        self.assertEqual(self.rollup()[self.coffee.pk], (2, Decimal("5.00")))
+
+        self.set_status("Cancelled")
+        self.assertEqual(
+            self.rollup(),
+            {self.coffee.pk: (0, Decimal("0.00")), self.tea.pk: (0, Decimal("0.00"))},
+        )
+
+    def test_changing_items_of_completed_order(self):
+        """Test that edits to a completed order's items reach the rollup."""
+        self.set_status("Completed")
+        line = OrderItem.objects.get(pk=self.coffee_line.pk)
+        line.quantity = 4
+        line.save()
+        self.assertEqual(self.rollup()[self.coffee.pk], (4, Decimal("10.00")))
+
+        line.delete()
+        self.assertEqual(self.rollup()[self.coffee.pk], (0, Decimal("0.00")))
+
+        Order.objects.get(pk=self.order.pk).delete()
+        self.assertEqual(self.rollup()[self.tea.pk], (0, Decimal("0.00")))
+
+    def test_rebuild_matches_incremental_rollup(self):
+        """Test that rebuilding the rollup gives the incremental figures."""
+        self.set_status("Completed")
+        incremental = self.rollup()
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+        self.assertEqual(self.rollup(), incremental)
+
+
+class BenchmarkOrderFiltersTests(TransactionTestCase):
+    def test_benchmark_rolls_back(self):
+        """Test that the benchmark reports both runs and leaves no data behind."""
+        out = StringIO()
+        call_command("benchmark_order_filters", orders=300, repeat=1, stdout=out)
+        self.assertIn("Query plans without indexes", out.getvalue())
+        self.assertIn("orders of a table", out.getvalue())
+        self.assertFalse(Order.objects.exists())
+        index_names = {
+            constraint
+            for constraint in connection.introspection.get_constraints(
+                connection.cursor(), Order._meta.db_table
+            )
+        }
+        self.assertIn("order_status_order_date_idx", index_names)
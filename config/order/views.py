@@ -2,43 +2,43 @@
 
 This module defines views for managing orders, including adding items to the cart,
 submitting orders, and viewing order history.
+
+The customer path (adding to the cart, the cart and submitting the order) is
+async and uses the async ORM API, so under ASGI table-side phones waiting on
+the database do not each hold a thread.
 """
 
-import json
 from datetime import timedelta
 
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, HttpResponseRedirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.utils import timezone
 from cafe.models import Cafe, Table
+from cafe.tables import TableUnavailable, allocate_table
+from customer.models import PointsEntry
+from customer.points import accrue_points
 from staff.models import Staff
+from .cart import aget_cart, get_cart
 from .models import Order, OrderItem, MenuItem, Customer
 
 DEFAULT_GUEST_CUSTOMER_PHONE = "09123456789"  # Default phone number for guest customer
 
 
-def add_to_cart(request, item_id):
+async def add_to_cart(request, item_id):
     """Add a menu item to the cart."""
-    menu_item = get_object_or_404(MenuItem, id=item_id)
+    menu_item = await aget_object_or_404(MenuItem, id=item_id)
 
     quantity = int(request.GET.get("quantity"))
 
-    cart = request.COOKIES.get("cart", "{}")
-    cart = json.loads(cart)
-
-    if item_id in cart:
-        cart[item_id]["quantity"] += quantity
-    else:
-        cart[item_id] = {
-            "name": menu_item.name,
-            "quantity": quantity,
-            "price": str(menu_item.price),
-        }
+    cart = await aget_cart(request)
+    cart.add(menu_item, quantity)
 
     response = HttpResponseRedirect("/menu")
-    response.set_cookie("cart", json.dumps(cart), max_age=3600)
+    await cart.asave(response)
     messages.success(
         request, f"{menu_item.name} * {quantity} has been added to the cart."
     )
@@ -46,7 +46,7 @@ def add_to_cart(request, item_id):
     return response
 
 
-def add_to_cart_view(request, item_id):
+async def add_to_cart_view(request, item_id):
     """Handle the request to add a menu item to the cart.
 
     Args:
@@ -57,7 +57,7 @@ def add_to_cart_view(request, item_id):
         HttpResponse: Redirect response to the menu page.
     """
     if request.method == "GET":
-        response = add_to_cart(request, item_id)
+        response = await add_to_cart(request, item_id)
         return response
     messages.error(request, "Invalid request method.")
     return redirect("menu")
@@ -71,22 +71,18 @@ def remove_from_cart(request, item_id):
     Returns:
         HttpResponse: Redirect response back to the cart page or error message.
     """
-    # Check if the cart exists in the session
-    cart = request.COOKIES.get("cart", "{}")
-    cart = json.loads(cart)
+    cart = get_cart(request)
 
     # Remove the item if it exists in the cart
-    if item_id in cart:
-        del cart[item_id]
-        response = HttpResponse("Item removed from cart")
-        response.set_cookie("cart", json.dumps(cart), max_age=3600)
-    else:
+    if not cart.remove(item_id):
         return HttpResponse("Item not found in cart.", status=404)
 
-    return redirect("cart")  # Redirect back to the cart page
+    response = redirect("cart")  # Redirect back to the cart page
+    cart.save(response)
+    return response
 
 
-def cart_view(request):
+async def cart_view(request):
     """Display the contents of the cart.
 
     Args:
@@ -95,54 +91,47 @@ def cart_view(request):
     Returns:
         HttpResponse: Rendered cart view.
     """
-    cart = request.COOKIES.get("cart", "{}")
-    cart = json.loads(cart)
-
-    total_price = 0.0
-    for item_id, item in cart.items():
-        item_total = float(item["price"]) * item["quantity"]
-        item["total"] = item_total  # Add item total to each item
-        total_price += item_total
+    cart = await aget_cart(request)
 
     context = {
-        "cart": cart,
-        "total_price": total_price,
+        "cart": cart.lines,
+        "total_price": cart.total(),
     }
 
     return render(request, "cart.html", context)
 
 
-def submit_order(request):
-    """Submit an order based on the current cart items.
+def place_order(cart, table_number, phone_number):
+    """Take the table and create the order of a cart in one transaction.
+
+    Transactions are not available to async code yet, so submit_order runs this
+    through sync_to_async.
 
     Args:
-        request (HttpRequest): The HTTP request object.
+        cart (Cart): The customer's cart.
+        table_number (str): The table number entered by the customer.
+        phone_number (str): The phone number of the customer.
 
     Returns:
-        HttpResponse: Redirect response to the order success page, or
-        render cart view if not a POST request.
-    """
-    if request.method == "POST":
-        # Retrieve form data
-        table_number = request.POST.get("table_number")
-        phone_number = request.POST.get("phone_number")
+        tuple: The customer and the list of cart item IDs that no longer exist
+        on the menu.
 
-        # Ensure table_number is valid
-        if not table_number:
-            messages.error(request, "Table number is required.")
-            return redirect("cart")
+    Raises:
+        Table.DoesNotExist: If there is no such table.
+        TableUnavailable: If the table is already taken.
+    """
+    with transaction.atomic():
+        # The customer pages serve a single cafe, the first one
+        cafe = Cafe.objects.first()
 
-        # Check if the table is available
-        table = get_object_or_404(Table, number=table_number)
-        if table.status != "A":
-            messages.error(request, "The selected table is not available.")
-            return redirect("cart")
+        # Take the table first: if the order fails, the table is freed again
+        allocate_table(cafe, table_number)
 
         # Create or get the customer
         customer, created = Customer.objects.get_or_create(
             phone_number=phone_number,
             defaults={
-                "cafe": Cafe.objects.first(),
+                "cafe": cafe,
                 "table_number": table_number,
                 "points": 0,
             },
@@ -151,42 +140,62 @@ def submit_order(request):
         # Create the order instance with initial status
         order = Order.objects.create(
             customer=customer,
+            cafe=cafe,
             table_number=table_number,
             order_date=timezone.now(),
             total_price=0.00,  # Will be calculated later
         )
 
-        # Mark the table as occupied
-        table.status = "unavailable"
-        table.save()
-
-        request.session["customer_phone_number"] = order.customer.phone_number
-
-        # Add order items based on the cart
-        cart = request.COOKIES.get("cart", "{}")
-        cart = json.loads(cart)
-        for item_id, item in cart.items():
-            try:
-                menu_item = MenuItem.objects.get(id=item_id)
-                quantity = item["quantity"]
-
-                # Create OrderItem instance
-                order_item = OrderItem.objects.create(
-                    order=order, item=menu_item, quantity=quantity
-                )
-                customer.points += menu_item.points * quantity
-            except MenuItem.DoesNotExist:
-                messages.error(request, f"Menu item with ID {item_id} does not exist.")
-                continue
-
-        customer.save()
-        # Calculate the total price for the order
-        order.calculate_total_price()
-        order.save()
+        # Add all cart lines and the order total in one batch, then append the
+        # earned points to the ledger instead of rewriting the customer row
+        earned_points, missing_ids = order.add_items_from_cart(cart.lines)
+        accrue_points(
+            [PointsEntry(customer=customer, order=order, points=earned_points)]
+        )
+
+    return customer, missing_ids
+
+
+async def submit_order(request):
+    """Submit an order based on the current cart items.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: Redirect response to the order success page, or
+        render cart view if not a POST request.
+    """
+    if request.method == "POST":
+        # Retrieve form data
+        table_number = request.POST.get("table_number")
+        phone_number = request.POST.get("phone_number")
+
+        # Ensure table_number is valid
+        if not table_number:
+            messages.error(request, "Table number is required.")
+            return redirect("cart")
+
+        cart = await aget_cart(request)
+        try:
+            customer, missing_ids = await sync_to_async(place_order)(
+                cart, table_number, phone_number
+            )
+        except Table.DoesNotExist:
+            raise Http404("No Table matches the given query.")
+        except TableUnavailable:
+            messages.error(request, "The selected table is not available.")
+            return redirect("cart")
+
+        for item_id in missing_ids:
+            messages.error(request, f"Menu item with ID {item_id} does not exist.")
+
+        await request.session.aset("customer_phone_number", customer.phone_number)
 
         # Clear the cart after order submission
         response = HttpResponseRedirect("/order_success")
-        response.delete_cookie("cart")
+        cart.clear()
+        await cart.asave(response)
 
         messages.success(request, "Order submitted successfully!")
         return response
@@ -322,9 +331,6 @@ def change_item_quantity(request, order_id, item_id):
         else:
             messages.error(request, "Quantity must be greater than zero.")
 
-        order.calculate_total_price()
-        order.save()
-
         return redirect("manage_order_items", order_id=order.id)
 
     return render(
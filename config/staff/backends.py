@@ -1,8 +1,75 @@
 # backends.py
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
+from django.utils.crypto import constant_time_compare, salted_hmac
 from .models import Staff
 
 
+class CredentialCache:
+    """
+    Bounded LRU cache of recent successful password checks, kept in process
+    memory.
+
+    Entries are keyed by the staff member and their stored password hash, so
+    they stop matching as soon as the password changes, and hold an HMAC of
+    the password keyed with SECRET_KEY rather than the password itself. A
+    login on a shared tablet that matches an entry younger than
+    STAFF_AUTH_CACHE_TIMEOUT seconds skips the password hasher.
+
+    At most STAFF_AUTH_CACHE_SIZE entries are kept; the least recently used
+    entry is evicted when the limit is reached. A size of 0 turns the cache
+    off.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(password):
+        return salted_hmac("staff.backends.CredentialCache", password).hexdigest()
+
+    def check(self, user, password):
+        """Return whether the password was recently verified for the user."""
+        key = (user.pk, user.password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            verified_at, digest = entry
+            if time.monotonic() - verified_at > settings.STAFF_AUTH_CACHE_TIMEOUT:
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+        return constant_time_compare(digest, self.digest(password))
+
+    def add(self, user, password):
+        """Remember that the password was verified for the user."""
+        max_size = settings.STAFF_AUTH_CACHE_SIZE
+        if max_size <= 0:
+            return
+        entry = (time.monotonic(), self.digest(password))
+        with self._lock:
+            self._entries[(user.pk, user.password)] = entry
+            self._entries.move_to_end((user.pk, user.password))
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every verified password."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+credential_cache = CredentialCache()
+
+
 class PhoneNumberBackend(ModelBackend):
     """
     Custom authentication backend that authenticates users based on their phone number.
@@ -15,6 +82,11 @@ class PhoneNumberBackend(ModelBackend):
         """
         Authenticate a user based on the provided phone number and password.
 
+        Passwords verified recently are checked against the credential cache
+        instead of the password hasher; the cache is filled after every
+        successful check, which also rehashes passwords hashed under an older
+        policy.
+
         Args:
             request (HttpRequest): The HTTP request object.
             phone_number (str): The phone number of the user attempting to log in.
@@ -29,6 +101,11 @@ class PhoneNumberBackend(ModelBackend):
             user = Staff.objects.get(phone_number=phone_number)
         except Staff.DoesNotExist:
             return None
+        if password is None:
+            return None
+        if credential_cache.check(user, password):
+            return user
         if user.check_password(password):
+            credential_cache.add(user, password)
             return user
         return None
@@ -1,154 +1,523 @@
+from datetime import datetime, time, timezone as dt_timezone
+from tempfile import TemporaryFile
 from openpyxl import Workbook
-from django.http import HttpResponse
+from django.db.models import Count, Max, Q, Sum
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from menu.models import MenuItem
 from order.models import Order, OrderItem
 from customer.models import Customer
+from customer.points import points_balance
 from .models import Staff
+from .export_formats import columnar_chunks, csv_chunks, jsonl_chunks
 
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
-def create_orders_sheet():
-    workbook = Workbook()
-    orders_sheet = workbook.active
-    orders_sheet.title = "Order items"
-    orders_sheet.append(
-        [
-            "Id",
-            "Quantity",
-            "Subtotal",
-            "Customer Phone Number",
-            "Order Date",
-            "Table Number",
-        ]
+# Rows fetched from the database per round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_ITEM_COLUMNS = [
+    "Id",
+    "Quantity",
+    "Subtotal",
+    "Customer Phone Number",
+    "Order Date",
+    "Table Number",
+]
+
+ORDER_ITEM_TYPES = ["int", "int", "decimal", "string", "datetime", "string"]
+
+ORDER_COLUMNS = [
+    "Id",
+    "Customer Phone Number",
+    "Staff ID",
+    "Order Date",
+    "Status",
+    "Table Number",
+    "Total Price",
+]
+
+ORDER_TYPES = ["int", "string", "int", "datetime", "string", "string", "decimal"]
+
+CUSTOMER_COLUMNS = [
+    "Customer ID",
+    "First Name",
+    "Last Name",
+    "Phone Number",
+    "Number of Orders",
+    "Total Amount Paid",
+    "Points",
+    "Last Order Date",
+]
+
+STAFF_COLUMNS = [
+    "Staff ID",
+    "First Name",
+    "Last Name",
+    "Phone Number",
+    "Number of Orders",
+]
+
+MENU_ITEM_COLUMNS = [
+    "Menu Item ID",
+    "Name",
+    "Price",
+    "Points",
+    "Category",
+]
+
+
+def order_items_queryset():
+    return OrderItem.objects.select_related("order__customer")
+
+
+def order_item_row(item):
+    """Return the row of an order item, in ORDER_ITEM_COLUMNS order."""
+    order_date_naive = (
+        item.order.order_date.replace(tzinfo=None) if item.order.order_date else None
     )
+    phone_number = item.order.customer.phone_number if item.order.customer else ""
+    return [
+        item.id,
+        item.quantity,
+        item.subtotal,
+        phone_number,
+        order_date_naive,
+        item.order.table_number,
+    ]
 
-    order_items = OrderItem.objects.all()
-    for item in order_items:
-        order_date_naive = (
-            item.order.order_date.replace(tzinfo=None)
-            if item.order.order_date
-            else None
-        )
-        phone_number = item.order.customer.phone_number if item.order.customer else ""
-        orders_sheet.append(
-            [
-                item.id,
-                item.quantity,
-                item.subtotal,
-                phone_number,
-                order_date_naive,
-                item.order.table_number,
-            ]
-        )
-    return workbook
 
+def order_item_rows():
+    """Yield one row per order item, in ORDER_ITEM_COLUMNS order."""
+    order_items = order_items_queryset()
+    for item in order_items.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield order_item_row(item)
 
-def create_customers_sheet():
-    workbook = Workbook()
-    customers_sheet = workbook.active
-    customers_sheet.title = "Customers"
-    customers_sheet.append(
-        [
-            "Customer ID",
-            "First Name",
-            "Last Name",
-            "Phone Number",
-            "Number of Orders",
-            "Total Amount Paid",
-            "Points",
-            "Last Order Date",
-        ]
+
+def orders_queryset():
+    return Order.objects.select_related("customer")
+
+
+def order_row(order):
+    """Return the row of an order, in ORDER_COLUMNS order."""
+    order_date_naive = (
+        order.order_date.replace(tzinfo=None) if order.order_date else None
     )
+    phone_number = order.customer.phone_number if order.customer else ""
+    return [
+        order.id,
+        phone_number,
+        order.staff_id,
+        order_date_naive,
+        order.status,
+        order.table_number,
+        order.total_price,
+    ]
+
+
+def order_rows():
+    """Yield one row per order, in ORDER_COLUMNS order."""
+    orders = orders_queryset().order_by("pk")
+    for order in orders.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield order_row(order)
 
-    customers = Customer.objects.all()
-    for customer in customers:
-        orders_by_customer = Order.objects.filter(customer=customer)
-        number_of_orders = orders_by_customer.count()
-        total_amount_paid = sum(order.total_price for order in orders_by_customer)
+
+def customer_rows():
+    """Yield one row per customer, in CUSTOMER_COLUMNS order."""
+    customers = Customer.objects.annotate(
+        number_of_orders=Count("order"),
+        total_amount_paid=Sum("order__total_price"),
+        last_order_date=Max("order__order_date"),
+        points_balance=points_balance(),
+    ).order_by("pk")
+    for customer in customers.iterator(chunk_size=EXPORT_CHUNK_SIZE):
         last_order_date = (
-            orders_by_customer.order_by("-order_date")
-            .first()
-            .order_date.replace(tzinfo=None)
-            if orders_by_customer.exists()
+            customer.last_order_date.replace(tzinfo=None)
+            if customer.last_order_date
             else None
         )
-        customers_sheet.append(
-            [
-                customer.id,
-                customer.first_name if hasattr(customer, "first_name") else "",
-                customer.last_name if hasattr(customer, "last_name") else "",
-                customer.phone_number,
-                number_of_orders,
-                total_amount_paid,
-                customer.points,
-                last_order_date,
-            ]
-        )
-    return workbook
+        yield [
+            customer.id,
+            customer.first_name if hasattr(customer, "first_name") else "",
+            customer.last_name if hasattr(customer, "last_name") else "",
+            customer.phone_number,
+            customer.number_of_orders,
+            customer.total_amount_paid or 0,
+            customer.points_balance,
+            last_order_date,
+        ]
 
 
-def create_staff_sheet():
-    workbook = Workbook()
-    staff_sheet = workbook.active
-    staff_sheet.title = "Staff"
-    staff_sheet.append(
-        [
-            "Staff ID",
-            "First Name",
-            "Last Name",
-            "Phone Number",
-            "Number of Orders",
-        ]
+def staff_rows():
+    """Yield one row per staff member, in STAFF_COLUMNS order."""
+    staff_members = Staff.objects.annotate(number_of_orders=Count("order")).order_by(
+        "pk"
     )
-
-    staff_members = Staff.objects.all()
-    for staff in staff_members:
-        orders_by_staff = Order.objects.filter(staff=staff)
-        number_of_orders = orders_by_staff.count()
-        staff_sheet.append(
-            [
-                staff.pk,
-                staff.first_name if hasattr(staff, "first_name") else "",
-                staff.last_name if hasattr(staff, "last_name") else "",
-                staff.phone_number,
-                number_of_orders,
-            ]
-        )
-    return workbook
+    for staff in staff_members.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            staff.pk,
+            staff.first_name if hasattr(staff, "first_name") else "",
+            staff.last_name if hasattr(staff, "last_name") else "",
+            staff.phone_number,
+            staff.number_of_orders,
+        ]
 
 
-def create_menu_items_sheet():
-    workbook = Workbook()
-    menu_items_sheet = workbook.active
-    menu_items_sheet.title = "Menu Items"
-    menu_items_sheet.append(
-        [
-            "Menu Item ID",
-            "Name",
-            "Price",
-            "Points",
-            "Category",
+def menu_item_rows():
+    """Yield one row per menu item, in MENU_ITEM_COLUMNS order."""
+    menu_items = MenuItem.objects.select_related("category")
+    for item in menu_items.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        category_name = item.category.name if item.category else ""
+        yield [
+            item.id,
+            item.name,
+            item.price,
+            item.points,
+            category_name,
         ]
-    )
 
-    menu_items = MenuItem.objects.all()
-    for item in menu_items:
-        category_name = item.category.name if item.category else ""
-        menu_items_sheet.append(
-            [
-                item.id,
-                item.name,
-                item.price,
-                item.points,
-                category_name,
-            ]
-        )
+
+def build_workbook(title, columns, rows, write_only=False):
+    """
+    Build a single-sheet workbook.
+
+    In write-only mode openpyxl spools the rows to disk as they are appended, so
+    memory use stays flat whatever the number of rows.
+
+    Args:
+        title (str): The title of the sheet.
+        columns (list): The header row.
+        rows (iterable): The data rows.
+        write_only (bool): Whether to build a write-only workbook.
+
+    Returns:
+        Workbook: The workbook holding the sheet.
+    """
+    workbook = Workbook(write_only=write_only)
+    if write_only:
+        sheet = workbook.create_sheet(title)
+    else:
+        sheet = workbook.active
+        sheet.title = title
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
     return workbook
 
 
+def create_orders_sheet(write_only=False, since=None):
+    rows = order_item_rows() if since is None else changed_rows("orders", since)
+    return build_workbook("Order items", ORDER_ITEM_COLUMNS, rows, write_only)
+
+
+def create_customers_sheet(write_only=False):
+    return build_workbook("Customers", CUSTOMER_COLUMNS, customer_rows(), write_only)
+
+
+def create_staff_sheet(write_only=False):
+    return build_workbook("Staff", STAFF_COLUMNS, staff_rows(), write_only)
+
+
+def create_menu_items_sheet(write_only=False):
+    return build_workbook("Menu Items", MENU_ITEM_COLUMNS, menu_item_rows(), write_only)
+
+
 def generate_excel_response(workbook, filename):
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
     response["Content-Disposition"] = f'attachment; filename="{filename}"'
     workbook.save(response)
     return response
+
+
+def stream_excel_response(workbook, filename):
+    """
+    Serve a workbook as a streaming download.
+
+    The workbook is saved to a temporary file, which is then sent in chunks, so
+    the file is never held in memory as a whole.
+    """
+    spool = TemporaryFile()
+    workbook.save(spool)
+    spool.seek(0)
+    return FileResponse(
+        spool,
+        as_attachment=True,
+        filename=filename,
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+# The exportable datasets. "types" lists the column types of the datasets that
+# can be exported in the columnar format; "queryset" and "row" are given for the
+# datasets that can be exported incrementally, since an updated_at watermark.
+DATASETS = {
+    "orders": {
+        "title": "Order items",
+        "columns": ORDER_ITEM_COLUMNS,
+        "types": ORDER_ITEM_TYPES,
+        "rows": order_item_rows,
+        "queryset": order_items_queryset,
+        "row": order_item_row,
+        "filename": "orders_data",
+    },
+    "order_totals": {
+        "title": "Orders",
+        "columns": ORDER_COLUMNS,
+        "types": ORDER_TYPES,
+        "rows": order_rows,
+        "queryset": orders_queryset,
+        "row": order_row,
+        "filename": "order_totals_data",
+    },
+    "customers": {
+        "title": "Customers",
+        "columns": CUSTOMER_COLUMNS,
+        "rows": customer_rows,
+        "filename": "customers_data",
+    },
+    "staff": {
+        "title": "Staff",
+        "columns": STAFF_COLUMNS,
+        "rows": staff_rows,
+        "filename": "staff_data",
+    },
+    "menu_items": {
+        "title": "Menu Items",
+        "columns": MENU_ITEM_COLUMNS,
+        "rows": menu_item_rows,
+        "filename": "menu_items_data",
+    },
+}
+
+
+def xlsx_chunks(dataset, rows, block_size=FileResponse.block_size):
+    """Build a write-only workbook on disk and yield the file in blocks."""
+    workbook = build_workbook(dataset["title"], dataset["columns"], rows, True)
+    with TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        yield from iter(lambda: spool.read(block_size), b"")
+
+
+EXPORT_FORMATS = {
+    "xlsx": {
+        "extension": "xlsx",
+        "content_type": XLSX_CONTENT_TYPE,
+        "chunks": xlsx_chunks,
+    },
+    "csv": {
+        "extension": "csv.gz",
+        "content_type": "application/gzip",
+        "chunks": lambda dataset, rows: csv_chunks(dataset["columns"], rows),
+    },
+    "jsonl": {
+        "extension": "jsonl.gz",
+        "content_type": "application/gzip",
+        "chunks": lambda dataset, rows: jsonl_chunks(dataset["columns"], rows),
+    },
+    "columnar": {
+        "extension": "col",
+        "content_type": "application/octet-stream",
+        "chunks": lambda dataset, rows: columnar_chunks(
+            dataset["columns"], dataset["types"], rows
+        ),
+    },
+}
+
+
+def supports_format(kind, export_format):
+    """Return whether a dataset can be exported in the given format."""
+    if kind not in DATASETS or export_format not in EXPORT_FORMATS:
+        return False
+    return export_format != "columnar" or "types" in DATASETS[kind]
+
+
+def export_filename(kind, export_format):
+    return f"{DATASETS[kind]['filename']}.{EXPORT_FORMATS[export_format]['extension']}"
+
+
+def export_chunks(kind, export_format, rows=None):
+    """
+    Encode a dataset in an export format.
+
+    Args:
+        kind (str): The dataset name, a key of DATASETS.
+        export_format (str): The format name, a key of EXPORT_FORMATS.
+        rows (iterable): The rows to export, all rows of the dataset by default.
+
+    Returns:
+        iterator: The encoded file, in chunks of bytes.
+    """
+    if not supports_format(kind, export_format):
+        raise ValueError(f"{kind} cannot be exported as {export_format}.")
+    dataset = DATASETS[kind]
+    if rows is None:
+        rows = dataset["rows"]()
+    return EXPORT_FORMATS[export_format]["chunks"](dataset, rows)
+
+
+def stream_export_response(kind, export_format, since=None):
+    """
+    Serve a dataset as a download that is encoded while it is sent.
+
+    With a ``since`` watermark only the rows changed after it are exported, and
+    the watermark to pass next time is sent in the X-Export-Watermark header.
+    """
+    rows = None
+    if since is not None:
+        until = high_watermark(kind, since)
+        rows = changed_rows(kind, since, until)
+    response = StreamingHttpResponse(
+        export_chunks(kind, export_format, rows),
+        content_type=EXPORT_FORMATS[export_format]["content_type"],
+    )
+    filename = export_filename(kind, export_format)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if since is not None:
+        response["X-Export-Watermark"] = until
+    return response
+
+
+def supports_incremental(kind):
+    """Return whether a dataset can be exported since a watermark."""
+    return "queryset" in DATASETS.get(kind, {})
+
+
+def parse_watermark(value):
+    """
+    Parse an export watermark.
+
+    A watermark is either a row ID, an ISO 8601 date or datetime, or the
+    ``"<updated_at>,<ID>"`` pair returned as the next watermark of an export.
+
+    Returns:
+        tuple: ``(updated_at, ID)``, where updated_at is None for an ID
+        watermark, or None if ``value`` is empty.
+
+    Raises:
+        ValueError: If the watermark cannot be parsed.
+    """
+    if not value:
+        return None
+    if value.isdigit():
+        return None, int(value)
+    timestamp, _, row_id = value.partition(",")
+    updated_at = parse_datetime(timestamp)
+    if updated_at is None:
+        day = parse_date(timestamp)
+        if day is None:
+            raise ValueError(f"Invalid export watermark: {value!r}")
+        updated_at = datetime.combine(day, time.min)
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at)
+    return updated_at, int(row_id) if row_id.isdigit() else 0
+
+
+def format_watermark(instance, by_id):
+    """Return the watermark just after a row."""
+    if by_id:
+        return str(instance.pk)
+    updated_at = instance.updated_at.astimezone(dt_timezone.utc).isoformat()
+    return f"{updated_at.replace('+00:00', 'Z')},{instance.pk}"
+
+
+def after_watermark(queryset, watermark, by_id):
+    """Filter a queryset to the rows after a watermark, in keyset order."""
+    if by_id:
+        if watermark is not None:
+            queryset = queryset.filter(pk__gt=watermark[1])
+        return queryset.order_by("pk")
+    if watermark is not None:
+        # The leading range lets the (updated_at, id) index serve the filter
+        # and the order, instead of sorting every row after the watermark
+        updated_at, row_id = watermark
+        queryset = queryset.filter(
+            Q(updated_at__gte=updated_at),
+            Q(updated_at__gt=updated_at) | Q(pk__gt=row_id),
+        )
+    return queryset.order_by("updated_at", "pk")
+
+
+def not_after_watermark(queryset, watermark, by_id):
+    """Filter a queryset to the rows up to and including a watermark."""
+    updated_at, row_id = watermark
+    if by_id:
+        return queryset.filter(pk__lte=row_id)
+    return queryset.filter(
+        Q(updated_at__lte=updated_at),
+        Q(updated_at__lt=updated_at) | Q(pk__lte=row_id),
+    )
+
+
+def _incremental_queryset(kind):
+    if not supports_incremental(kind):
+        raise ValueError(f"{kind} cannot be exported incrementally.")
+    return DATASETS[kind]["queryset"]()
+
+
+def _is_id_watermark(watermark):
+    return watermark is not None and watermark[0] is None
+
+
+def changed_since(kind, since=None, limit=EXPORT_CHUNK_SIZE):
+    """
+    Return one page of the rows changed after a watermark.
+
+    Rows are paged by keyset on ``(updated_at, id)``, or on ``id`` alone when
+    ``since`` is an ID, so each page costs the same however much history there
+    is.
+
+    Args:
+        kind (str): The dataset name, a key of DATASETS.
+        since (str): The watermark, or None to start from the beginning.
+        limit (int): The maximum number of rows in the page.
+
+    Returns:
+        dict: ``rows``, the page of rows; ``next_watermark``, to pass as
+        ``since`` for the next page; and ``has_more``, whether more rows follow.
+    """
+    watermark = parse_watermark(since)
+    by_id = _is_id_watermark(watermark)
+    queryset = after_watermark(_incremental_queryset(kind), watermark, by_id)
+    instances = list(queryset[: limit + 1])
+    has_more = len(instances) > limit
+    instances = instances[:limit]
+    row = DATASETS[kind]["row"]
+    return {
+        "rows": [row(instance) for instance in instances],
+        "next_watermark": (
+            format_watermark(instances[-1], by_id) if instances else since
+        ),
+        "has_more": has_more,
+    }
+
+
+def high_watermark(kind, since=None):
+    """Return the watermark of the last row changed so far."""
+    watermark = parse_watermark(since)
+    by_id = _is_id_watermark(watermark)
+    queryset = after_watermark(_incremental_queryset(kind), watermark, by_id)
+    last = queryset.last()
+    return format_watermark(last, by_id) if last else since
+
+
+def changed_rows(kind, since=None, until=None):
+    """
+    Yield every row changed after ``since``, up to and including ``until``,
+    fetching them in keyset-paginated chunks.
+    """
+    watermark = parse_watermark(since)
+    by_id = _is_id_watermark(watermark)
+    queryset = _incremental_queryset(kind)
+    if until:
+        queryset = not_after_watermark(queryset, parse_watermark(until), by_id)
+    row = DATASETS[kind]["row"]
+    while True:
+        page = list(after_watermark(queryset, watermark, by_id)[:EXPORT_CHUNK_SIZE])
+        for instance in page:
+            yield row(instance)
+        if len(page) < EXPORT_CHUNK_SIZE:
+            return
+        last = page[-1]
+        watermark = (None if by_id else last.updated_at, last.pk)
@@ -0,0 +1,197 @@
+"""
+export_jobs.py
+
+This module runs the staff Excel exports as background jobs.
+
+Starting an export returns a job at once; the workbook is built by a process
+pool into the spool directory (``EXPORT_SPOOL_DIR``) and the job record, kept in
+the Django cache, reports its progress. Spooled files are named after the data
+watermark of the tables they were built from, so exporting unchanged data again
+reuses the finished file instead of building a new one.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from customer.models import Customer
+from menu.models import Category, MenuItem
+from order.models import Order, OrderItem
+from .export import EXPORT_FORMATS, export_chunks, export_filename
+from .models import Staff
+
+EXPORT_JOB_KEY = "export:job:{job_id}"
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# The tables each dataset reads, with the field recording their last change,
+# from which its data watermark is computed.
+EXPORT_SOURCES = {
+    "orders": [
+        (OrderItem, "updated_at"),
+        (Order, "updated_at"),
+        (Customer, "updated_at"),
+    ],
+    "order_totals": [(Order, "updated_at"), (Customer, "updated_at")],
+    "customers": [
+        (Customer, "updated_at"),
+        (Order, "updated_at"),
+        (OrderItem, "updated_at"),
+    ],
+    "staff": [(Staff, "update_at"), (Order, "updated_at")],
+    "menu_items": [(MenuItem, "updated_at"), (Category, "updated_at")],
+}
+
+_executor = None
+_executor_lock = threading.RLock()
+_running = {}  # spooled file path -> future building it
+
+
+def data_watermark(kind):
+    """
+    Summarise the state of the tables an export reads.
+
+    Args:
+        kind (str): The dataset name, a key of DATASETS.
+
+    Returns:
+        str: A digest that changes whenever a row is added, deleted or updated.
+    """
+    state = [
+        model.objects.aggregate(
+            count=Count("pk"), last_pk=Max("pk"), last_change=Max(changed_field)
+        )
+        for model, changed_field in EXPORT_SOURCES[kind]
+    ]
+    return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+
+def spool_dir():
+    path = Path(settings.EXPORT_SPOOL_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def build_export(kind, export_format, path):
+    """
+    Build an export into ``path``; runs in a worker process.
+
+    The file is written under a temporary name first and moved into place, so
+    a spooled file is always complete.
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as spooled_file:
+        for chunk in export_chunks(kind, export_format):
+            spooled_file.write(chunk)
+    os.replace(temporary_path, path)
+    prune_spool(kind, keep=path)
+    return path
+
+
+def prune_spool(kind, keep=None):
+    """Delete spooled files of an export that have outlived their jobs."""
+    expired = time.time() - settings.EXPORT_JOB_TIMEOUT
+    for path in spool_dir().glob(f"{kind}-*.*"):
+        if str(path) != str(keep) and path.stat().st_mtime < expired:
+            path.unlink(missing_ok=True)
+
+
+def get_executor():
+    """Return the process pool, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Workers are spawned rather than forked so that they never share
+            # the database connections of the web process.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.EXPORT_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return _executor
+
+
+def get_job(job_id):
+    """Return the record of an export job, or None if it is unknown or expired."""
+    return cache.get(EXPORT_JOB_KEY.format(job_id=job_id))
+
+
+def save_job(job):
+    cache.set(EXPORT_JOB_KEY.format(job_id=job["id"]), job, settings.EXPORT_JOB_TIMEOUT)
+
+
+def finish_job(job, future):
+    """Record the outcome of a finished export job."""
+    with _executor_lock:
+        _running.pop(job["path"], None)
+    error = future.exception()
+    if error is None:
+        job["status"] = DONE
+    else:
+        job["status"] = FAILED
+        job["error"] = str(error)
+    save_job(job)
+
+
+def start_export(kind, export_format="xlsx"):
+    """
+    Start building an export in the background.
+
+    Args:
+        kind (str): The dataset name, a key of DATASETS.
+        export_format (str): The format name, a key of EXPORT_FORMATS.
+
+    Returns:
+        dict: The job record, already done if the data has not changed since the
+        export was last built.
+    """
+    job_id = uuid.uuid4().hex
+    watermark = data_watermark(kind)
+    extension = EXPORT_FORMATS[export_format]["extension"]
+    job = {
+        "id": job_id,
+        "kind": kind,
+        "format": export_format,
+        "filename": export_filename(kind, export_format),
+        "path": str(spool_dir() / f"{kind}-{watermark}.{extension}"),
+        "status": PENDING,
+        "error": None,
+    }
+
+    if os.path.exists(job["path"]):
+        job["status"] = DONE
+        save_job(job)
+        return job
+
+    if settings.EXPORT_MAX_WORKERS <= 0:
+        try:
+            build_export(kind, export_format, job["path"])
+        except Exception as error:
+            job["status"] = FAILED
+            job["error"] = str(error)
+        else:
+            job["status"] = DONE
+        save_job(job)
+        return job
+
+    save_job(job)
+    with _executor_lock:
+        # Share the build with any job already exporting the same data
+        future = _running.get(job["path"])
+        if future is None:
+            future = _running[job["path"]] = get_executor().submit(
+                build_export, kind, export_format, job["path"]
+            )
+    future.add_done_callback(partial(finish_job, job))
+    return job
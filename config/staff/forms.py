@@ -140,6 +140,8 @@ class DataAnalysisForm(forms.Form):
         FILTER_CHOICES (list): A list of choices for data analysis types,
                                 including popular items and peak business hours.
         filter_type (ChoiceField): A field to select the type of analysis filter.
+        start_date (DateField): Optional first day of the analysed period.
+        end_date (DateField): Optional last day of the analysed period.
     """
 
     FILTER_CHOICES = [
@@ -149,6 +151,12 @@ class DataAnalysisForm(forms.Form):
         # ("customer demographic data",'demographic data'),
     ]
     filter_type = forms.ChoiceField(choices=FILTER_CHOICES)
+    start_date = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    end_date = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
 
 
 class SaleAnalysisForm(forms.Form):
@@ -157,14 +165,53 @@ class SaleAnalysisForm(forms.Form):
 
     Attributes:
         FILTER_CHOICES (list): A list of choices for sales analysis types,
-                                including total, daily, monthly, and yearly sales.
+                                including total, hourly, daily, weekly, monthly
+                                and yearly sales.
         filter_type (ChoiceField): A field to select the type of sales analysis filter.
+        start_date (DateField): Optional first day of the analysed period.
+        end_date (DateField): Optional last day of the analysed period.
     """
 
     FILTER_CHOICES = [
         ("total sales", "total sales"),
+        ("hourly sales", "hourly sales"),
         ("daily sales", "daily sales"),
+        ("weekly sales", "weekly sales"),
         ("monthly sales", "monthly sales"),
         ("yearly sales", "yearly sales"),
     ]
     filter_type = forms.ChoiceField(choices=FILTER_CHOICES)
+    start_date = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    end_date = forms.DateField(
+        required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+
+
+class SalesSeriesForm(forms.Form):
+    """
+    A form validating the query parameters of the sales series endpoint.
+
+    Attributes:
+        granularity (ChoiceField): The bucket size: hour, day, week, month or year.
+        start_date (DateField): Optional first day of the series.
+        end_date (DateField): Optional last day of the series.
+        category (IntegerField): Optional category ID to filter by.
+        item (IntegerField): Optional menu item ID to filter by.
+        staff (IntegerField): Optional staff ID to filter by.
+    """
+
+    GRANULARITY_CHOICES = [
+        ("hour", "hour"),
+        ("day", "day"),
+        ("week", "week"),
+        ("month", "month"),
+        ("year", "year"),
+    ]
+    granularity = forms.ChoiceField(choices=GRANULARITY_CHOICES, required=False)
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+    category = forms.IntegerField(required=False)
+    item = forms.IntegerField(required=False)
+    staff = forms.IntegerField(required=False)
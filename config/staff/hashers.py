@@ -0,0 +1,32 @@
+"""
+hashers.py
+
+This module defines the password hasher that applies the staff password
+policy.
+
+The policy is the preferred hasher (the first entry of PASSWORD_HASHERS, see
+the PASSWORD_HASHER setting) and, for PBKDF2, the STAFF_PASSWORD_ITERATIONS
+iteration count. Passwords hashed under another policy are rehashed under the
+current one the next time their owner logs in (see Staff.check_password).
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class PolicyPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with SHA256 using the STAFF_PASSWORD_ITERATIONS iteration count,
+    or Django's default when it is not set.
+
+    It shares its algorithm name with Django's PBKDF2 hasher, so existing
+    hashes keep verifying and are only rehashed when their iteration count
+    differs from the policy.
+    """
+
+    @property
+    def iterations(self):
+        return (
+            getattr(settings, "STAFF_PASSWORD_ITERATIONS", None)
+            or PBKDF2PasswordHasher.iterations
+        )
@@ -0,0 +1,238 @@
+"""
+instrumentation.py
+
+This module records the SQL cost of every request, per URL name.
+
+QueryStatsMiddleware wraps the database connection while a request is
+handled and counts its queries, their total time and the queries run more
+than once with the same SQL (duplicate fingerprints, the mark of an N+1 loop).
+The figures are sent back in a ``Server-Timing`` header, so they show up in
+the browser's developer tools, added to the process-local statistics shown on
+the staff query stats page, and checked against the query budget of the view
+(QUERY_BUDGETS, or QUERY_BUDGET_DEFAULT): a request over its budget logs a
+warning.
+
+Queries run while a streaming response is being sent, after the view
+returned, are not counted.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED = "<unresolved>"
+
+# Duplicate fingerprints kept per view, and the SQL shown for each of them
+MAX_FINGERPRINTS = 20
+SQL_SAMPLE_LENGTH = 300
+
+
+def fingerprint(sql):
+    """Return a short fingerprint of a parametrized SQL statement."""
+    return hashlib.md5(sql.encode(), usedforsecurity=False).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper counting the queries of one request.
+
+    Attributes:
+        count (int): The number of queries run.
+        duration (float): Their total time, in seconds.
+        statements (Counter): How many times each SQL statement was run.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """Return the statements run more than once, with their counts."""
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+
+class ViewStats:
+    """The SQL statistics of the requests of one URL name."""
+
+    def __init__(self, view_name):
+        self.view_name = view_name
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_time = 0.0
+        self.total_time = 0.0
+        self.over_budget = 0
+        # Maps fingerprints to [SQL, requests that repeated it, most repeats]
+        self.duplicates = {}
+
+    def add(self, recorder, total_time, over_budget):
+        self.requests += 1
+        self.queries += recorder.count
+        self.max_queries = max(self.max_queries, recorder.count)
+        self.sql_time += recorder.duration
+        self.total_time += total_time
+        self.over_budget += over_budget
+        for sql, count in recorder.duplicates().items():
+            key = fingerprint(sql)
+            duplicate = self.duplicates.get(key)
+            if duplicate is None:
+                if len(self.duplicates) >= MAX_FINGERPRINTS:
+                    continue
+                duplicate = self.duplicates[key] = [sql[:SQL_SAMPLE_LENGTH], 0, 0]
+            duplicate[1] += 1
+            duplicate[2] = max(duplicate[2], count)
+
+    def to_dict(self):
+        requests = self.requests or 1
+        return {
+            "view_name": self.view_name,
+            "requests": self.requests,
+            "avg_queries": self.queries / requests,
+            "max_queries": self.max_queries,
+            "avg_sql_ms": self.sql_time * 1000 / requests,
+            "avg_total_ms": self.total_time * 1000 / requests,
+            "budget": query_budget(self.view_name),
+            "over_budget": self.over_budget,
+            "duplicates": [
+                {"fingerprint": key, "sql": sql, "requests": seen, "max_repeats": most}
+                for key, (sql, seen, most) in sorted(
+                    self.duplicates.items(), key=lambda item: -item[1][1]
+                )
+            ],
+        }
+
+
+class QueryStats:
+    """
+    The SQL statistics of this process, per URL name. Safe to update from any
+    thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, recorder, total_time, over_budget=False):
+        with self._lock:
+            stats = self._views.get(view_name)
+            if stats is None:
+                stats = self._views[view_name] = ViewStats(view_name)
+            stats.add(recorder, total_time, over_budget)
+
+    def snapshot(self):
+        """Return the statistics of every URL name, most queries first."""
+        with self._lock:
+            rows = [stats.to_dict() for stats in self._views.values()]
+        return sorted(rows, key=lambda row: -row["avg_queries"])
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+query_stats = QueryStats()
+
+
+def query_budget(view_name):
+    """Return the query budget of a URL name, or None if it has none."""
+    return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+
+def server_timing(recorder, total_time):
+    """
+    Return the ``Server-Timing`` header value of a request: the time spent in
+    SQL, the rest of the time (the view code and the rendering) as ``app``,
+    and the total.
+    """
+    duplicated = sum(recorder.duplicates().values())
+    app_time = max(total_time - recorder.duration, 0)
+    return (
+        f'sql;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries, '
+        f'{duplicated} duplicated", app;dur={app_time * 1000:.1f};desc="non-SQL", '
+        f"total;dur={total_time * 1000:.1f}"
+    )
+
+
+def install_recorder(recorder):
+    """Wrap the queries of the current thread's connection with a recorder."""
+    connection.execute_wrappers.append(recorder)
+
+
+def uninstall_recorder(recorder):
+    connection.execute_wrappers.remove(recorder)
+
+
+class QueryStatsMiddleware:
+    """
+    Records the queries of every request and reports them in a
+    ``Server-Timing`` header. Turned off when QUERY_STATS_ENABLED is False.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_STATS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        self.finish(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        # Connections are per thread: install the recorder on the thread that
+        # runs the thread-sensitive ORM calls of this request
+        await sync_to_async(install_recorder)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(uninstall_recorder)(recorder)
+        self.finish(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, recorder, total_time):
+        """Report the queries of a request and check them against its budget."""
+        match = request.resolver_match
+        view_name = (match.view_name if match else None) or UNRESOLVED
+        budget = query_budget(view_name)
+        over_budget = budget is not None and recorder.count > budget
+        if over_budget:
+            logger.warning(
+                "%s ran %d queries, over its budget of %d (%d duplicated): %s",
+                view_name,
+                recorder.count,
+                budget,
+                sum(recorder.duplicates().values()),
+                request.path,
+            )
+        query_stats.record(view_name, recorder, total_time, over_budget)
+        response["Server-Timing"] = server_timing(recorder, total_time)
@@ -0,0 +1,84 @@
+"""
+benchmark_logins.py
+
+Management command that measures staff logins per second through the
+authentication backends: with Django's default password hasher and no
+credential cache (the behaviour before the password policy), with the
+password policy alone, and with the policy and the credential cache.
+
+The staff member it logs in as is created in a transaction that is rolled
+back, so the database is left as it was.
+"""
+
+import time
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from staff.backends import credential_cache
+from staff.models import Staff
+
+PHONE_NUMBER = "09990000000"
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure staff logins per second before and after the password policy "
+        "and the credential cache. All changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--logins",
+            type=int,
+            default=20,
+            help="Number of logins per scenario (default: 20).",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            help="PBKDF2 iterations to try as the policy "
+            "(default: STAFF_PASSWORD_ITERATIONS).",
+        )
+
+    def handle(self, *args, **options):
+        policy = {}
+        if options["iterations"]:
+            policy["STAFF_PASSWORD_ITERATIONS"] = options["iterations"]
+        scenarios = [
+            (
+                "default hasher, no cache",
+                {
+                    "PASSWORD_HASHERS": [
+                        "django.contrib.auth.hashers.PBKDF2PasswordHasher"
+                    ],
+                    "STAFF_AUTH_CACHE_SIZE": 0,
+                },
+            ),
+            ("password policy, no cache", {**policy, "STAFF_AUTH_CACHE_SIZE": 0}),
+            ("password policy and cache", policy),
+        ]
+
+        for name, overrides in scenarios:
+            with override_settings(**overrides):
+                rate = self.measure(options["logins"])
+            self.stdout.write(f"  {name:<30} {rate:>10.1f} logins/s")
+
+    def measure(self, logins):
+        """Return the logins per second of the current settings."""
+        credential_cache.clear()
+        with transaction.atomic():
+            Staff.objects.create_user(PHONE_NUMBER, PASSWORD)
+            # The first login rehashes the password under the current policy
+            authenticate(None, phone_number=PHONE_NUMBER, password=PASSWORD)
+
+            started = time.perf_counter()
+            for _ in range(max(logins, 1)):
+                if authenticate(None, phone_number=PHONE_NUMBER, password=PASSWORD):
+                    continue
+                raise RuntimeError("The benchmark login failed.")
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        credential_cache.clear()
+        return max(logins, 1) / elapsed
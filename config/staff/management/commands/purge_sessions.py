@@ -0,0 +1,52 @@
+"""
+purge_sessions.py
+
+Management command that deletes the expired sessions from the database. Run
+it periodically (e.g. from cron) with the db and cached_db session tiers, or
+once after switching to signed cookies to empty the sessions table.
+
+Unlike Django's clearsessions, which deletes every expired row in a single
+statement, it deletes them in batches, so a large backlog does not hold a
+long lock on the sessions table while staff are logging in.
+"""
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = "Delete the expired sessions from the database, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of sessions deleted per statement (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        store_class = import_string(f"{settings.SESSION_ENGINE}.SessionStore")
+        # The db and cached_db tiers may use a custom session model
+        model = (
+            store_class.get_model_class()
+            if hasattr(store_class, "get_model_class")
+            else Session
+        )
+        batch_size = max(options["batch_size"], 1)
+        now = timezone.now()
+        purged = 0
+        while True:
+            keys = list(
+                model.objects.filter(expire_date__lt=now).values_list("pk", flat=True)[
+                    :batch_size
+                ]
+            )
+            if not keys:
+                break
+            model.objects.filter(pk__in=keys).delete()
+            purged += len(keys)
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired sessions."))
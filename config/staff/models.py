@@ -6,7 +6,7 @@ including attributes related to staff members and their roles.
 """
 
 from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -95,15 +95,31 @@ class Staff(AbstractBaseUser, PermissionsMixin):
         return f"{self.first_name} {self.last_name}"
 
     def check_password(self, raw_password):
-        """Check the provided password against the stored hashed password."""
-        return check_password(raw_password, self.password)
+        """
+        Check the provided password against the stored hashed password.
+
+        A correct password hashed under another policy than the current one
+        (see staff/hashers.py) is rehashed and saved.
+        """
+
+        def rehash(raw_password):
+            self.set_password(raw_password)
+            self.save(update_fields=["password"])
+
+        return check_password(raw_password, self.password, rehash)
+
+    def has_hashed_password(self):
+        """Return whether the password is hashed by one of the PASSWORD_HASHERS."""
+        try:
+            identify_hasher(self.password)
+        except ValueError:
+            return False
+        return True
 
     def save(self, *args, **kwargs):
         """Override save method to set is_superuser based on role and hash password."""
         self.is_superuser = self.role == "M"
-        if self.password and not self.password.startswith(
-            ("pbkdf2_sha256$", "bcrypt$", "argon2")
-        ):
+        if self.password and not self.has_hashed_password():
             self.password = make_password(self.password)
         super().save(*args, **kwargs)
 
@@ -0,0 +1,89 @@
+"""
+pagination.py
+
+This module pages the order lists of the checkout screens with keyset (seek)
+pagination.
+
+Orders are listed newest first, by ``(order_date, id)``. A page is fetched with
+a range condition on those columns starting at a cursor, the
+``"<order_date>,<ID>"`` pair of the row next to it, instead of an OFFSET, so
+every page costs the same index seek however deep into the list it is.
+"""
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def parse_cursor(value):
+    """
+    Parse an order list cursor.
+
+    Returns:
+        tuple: ``(order_date, ID)``, or None if ``value`` is empty or invalid.
+    """
+    timestamp, _, order_id = (value or "").rpartition(",")
+    try:
+        order_date = parse_datetime(timestamp)
+    except ValueError:
+        return None
+    if order_date is None or not order_id.isdigit():
+        return None
+    return order_date, int(order_id)
+
+
+def format_cursor(order):
+    """Return the cursor of an order."""
+    return f"{order.order_date.isoformat()},{order.pk}"
+
+
+def order_page(queryset, data, page_size=None):
+    """
+    Fetch one page of an order list, newest first.
+
+    The customer and staff member of every order are loaded with the page, so
+    rendering it takes a single query.
+
+    Args:
+        queryset (QuerySet): The filtered orders.
+        data (QueryDict): The request data. ``before`` asks for the page of
+            orders older than its cursor and ``after`` for the page of orders
+            newer than its cursor; without either the newest orders are shown.
+        page_size (int): The number of orders per page, ``ORDER_PAGE_SIZE`` by
+            default.
+
+    Returns:
+        dict: The ``orders`` of the page, plus the ``older_cursor`` and
+        ``newer_cursor`` of the neighbouring pages, None where there is none.
+    """
+    page_size = page_size or settings.ORDER_PAGE_SIZE
+    queryset = queryset.select_related("customer", "staff")
+    before = parse_cursor(data.get("before"))
+    after = parse_cursor(data.get("after"))
+
+    if after is not None:
+        order_date, order_id = after
+        orders = list(
+            queryset.filter(
+                Q(order_date__gt=order_date) | Q(order_date=order_date, pk__gt=order_id)
+            ).order_by("order_date", "pk")[: page_size + 1]
+        )
+        has_newer = len(orders) > page_size
+        orders = orders[:page_size][::-1]
+        has_older = True
+    else:
+        if before is not None:
+            order_date, order_id = before
+            queryset = queryset.filter(
+                Q(order_date__lt=order_date) | Q(order_date=order_date, pk__lt=order_id)
+            )
+        orders = list(queryset.order_by("-order_date", "-pk")[: page_size + 1])
+        has_older = len(orders) > page_size
+        orders = orders[:page_size]
+        has_newer = before is not None
+
+    return {
+        "orders": orders,
+        "older_cursor": format_cursor(orders[-1]) if orders and has_older else None,
+        "newer_cursor": format_cursor(orders[0]) if orders and has_newer else None,
+    }
@@ -1,11 +1,369 @@
-from datetime import timedelta, date
-from collections import defaultdict
+import hashlib
+import inspect
+import time as clock
+from datetime import datetime, time, timedelta, date
+from functools import wraps
+from itertools import product
+from django.conf import settings
 from django.views import View
-from django.db.models import Sum, Count, F
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum, Count, DateField, F, Q
 from django.utils import timezone
-from django.db.models.functions import TruncDate, TruncMonth, TruncYear
-from order.models import Order, OrderItem
+from django.db.models.functions import (
+    ExtractHour,
+    ExtractWeekDay,
+    TruncDay,
+    TruncHour,
+    TruncMonth,
+    TruncWeek,
+    TruncYear,
+)
+from order.models import DailySalesRollup, Order, OrderItem
 from customer.models import Customer
+from customer.points import get_points_balances
+
+WEEKDAY_NAMES = [
+    "Sunday",
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+]
+
+DEMOGRAPHIC_CACHE_TIMEOUT = 60 * 60 * 24  # a day
+
+REPORT_GENERATION_KEY = "report:generation"
+REPORT_CACHE_KEY = "report:{generation}:{day}:{name}:{params}"
+
+# Data-dependent customer dimensions, counted with GROUP BY
+CUSTOMER_GROUP_BY = {
+    "cafe": ("cafe_name", F("cafe__name")),
+    "signup_month": ("signup_month", TruncMonth("created_at")),
+}
+
+
+def years_ago(today, years):
+    """Return the same day ``years`` years before ``today`` (28 Feb for 29 Feb)."""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+def age_bands(edges=(20, 40), today=None):
+    """
+    Builds age band buckets for ``customer_histogram``.
+
+    Args:
+        edges (tuple): Ascending ages separating the bands.
+        today (date): The day ages are computed for, today by default.
+
+    Returns:
+        list: (label, Q) pairs such as ("under_20", ...), ("between_20_and_40",
+        ...) and ("over_40", ...).
+    """
+    today = today or date.today()
+    buckets = [(f"under_{edges[0]}", Q(date_of_birth__gte=years_ago(today, edges[0])))]
+    for lower, upper in zip(edges, edges[1:]):
+        buckets.append(
+            (
+                f"between_{lower}_and_{upper}",
+                Q(
+                    date_of_birth__lt=years_ago(today, lower),
+                    date_of_birth__gte=years_ago(today, upper),
+                ),
+            )
+        )
+    buckets.append(
+        (f"over_{edges[-1]}", Q(date_of_birth__lt=years_ago(today, edges[-1])))
+    )
+    return buckets
+
+
+def gender_buckets():
+    """
+    Builds gender buckets for ``customer_histogram``.
+
+    Returns:
+        list: (label, Q) pairs labelled "females", "males" and "Uncertain".
+    """
+    return [
+        ("females", Q(gender="female")),
+        ("males", Q(gender="man")),
+        ("Uncertain", Q(gender="Uncertain")),
+    ]
+
+
+def customer_histogram(bucket_dimensions=(), group_by=()):
+    """
+    Counts customers in every combination of buckets with a single query.
+
+    Each combination becomes one conditional ``COUNT(...) FILTER (WHERE ...)``
+    column, so adding buckets never adds queries.
+
+    Args:
+        bucket_dimensions (list): Lists of (label, Q) buckets, e.g. from
+            ``age_bands`` and ``gender_buckets``. Every combination of one bucket
+            per dimension is counted under its labels joined with "_".
+        group_by (tuple): Names from CUSTOMER_GROUP_BY ("cafe", "signup_month")
+            to split the counts by.
+
+    Returns:
+        list: One dictionary of counts per group (a single one without
+        ``group_by``), holding the group values under "cafe_name" and
+        "signup_month".
+    """
+    counts = {}
+    for combination in product(*bucket_dimensions):
+        condition = Q()
+        for _, bucket_condition in combination:
+            condition &= bucket_condition
+        label = "_".join(bucket_label for bucket_label, _ in combination) or "total"
+        counts[label] = Count("id", filter=condition)
+
+    if not group_by:
+        return [Customer.objects.aggregate(**counts)]
+
+    groups = dict(CUSTOMER_GROUP_BY[name] for name in group_by)
+    return list(Customer.objects.values(**groups).annotate(**counts).order_by(*groups))
+
+
+def report_range(start=None, end=None, days=30):
+    """
+    Fills in the missing ends of a report date range.
+
+    Plain dates are accepted too; an end date is included in the range.
+
+    Args:
+        start (datetime): Start of the range, ``days`` before ``end`` by default.
+        end (datetime): End of the range, now by default.
+        days (int): Length of the default range in days.
+
+    Returns:
+        tuple: The (start, end) datetimes of the range.
+    """
+    if isinstance(start, date) and not isinstance(start, datetime):
+        start = timezone.make_aware(datetime.combine(start, time.min))
+    if isinstance(end, date) and not isinstance(end, datetime):
+        end = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    end = end or timezone.now()
+    start = start or end - timedelta(days=days)
+    return start, end
+
+
+# Bucket granularities of sales series, with the function truncating a
+# timestamp to its bucket; "hour" can only be served from the order items.
+SALES_GRANULARITIES = {
+    "hour": TruncHour,
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+    "year": TruncYear,
+}
+
+
+class SalesSeries:
+    """
+    Sales of completed orders per time bucket and menu item, stored by column.
+
+    Row ``i`` of the series is made of ``period[i]``, ``item[i]``,
+    ``quantity[i]`` and ``revenue[i]``; rows are ordered by period, then by menu
+    item name.
+
+    Attributes:
+        granularity (str): The bucket size, a key of SALES_GRANULARITIES.
+        start (date): The first day of the series, or None for no lower bound.
+        end (date): The last day of the series, or None for no upper bound.
+        period (list): The start of each row's bucket; dates, or datetimes for
+            hourly series.
+        item (list): The menu item name of each row.
+        quantity (list): The units sold of each row.
+        revenue (list): The revenue (Decimal) of each row.
+    """
+
+    def __init__(self, granularity, start, end, rows):
+        self.granularity = granularity
+        self.start = start
+        self.end = end
+        self.period = [row["period"] for row in rows]
+        self.item = [row["item__name"] for row in rows]
+        self.quantity = [row["quantity"] for row in rows]
+        self.revenue = [row["revenue"] for row in rows]
+
+    def __len__(self):
+        return len(self.period)
+
+    def totals(self):
+        """
+        Returns:
+            list: A dict of the period, quantity and revenue of every bucket.
+        """
+        totals = {}
+        for period, quantity, revenue in zip(self.period, self.quantity, self.revenue):
+            total = totals.setdefault(
+                period, {"period": period, "quantity": 0, "revenue": 0}
+            )
+            total["quantity"] += quantity
+            total["revenue"] += revenue
+        return list(totals.values())
+
+    def by_period(self):
+        """
+        Returns:
+            list: A dict of the period and its menu item rows for every bucket.
+        """
+        periods = {}
+        for row in zip(self.period, self.item, self.quantity, self.revenue):
+            periods.setdefault(row[0], []).append(
+                {"item": row[1], "quantity": row[2], "revenue": row[3]}
+            )
+        return [{"period": period, "items": items} for period, items in periods.items()]
+
+    def to_dict(self):
+        """Returns the series as JSON-serialisable columns."""
+        return {
+            "granularity": self.granularity,
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+            "columns": {
+                "period": [period.isoformat() for period in self.period],
+                "item": self.item,
+                "quantity": self.quantity,
+                "revenue": [f"{revenue:.2f}" for revenue in self.revenue],
+            },
+        }
+
+
+def sales_series(
+    granularity="day", start=None, end=None, category=None, item=None, staff=None
+):
+    """
+    Computes the sales of completed orders per time bucket and menu item.
+
+    Day, week, month and year buckets are summed from the daily sales rollup;
+    hourly buckets and staff filters need the order items themselves. Either way
+    the series is computed with a single query.
+
+    Args:
+        granularity (str): The bucket size, a key of SALES_GRANULARITIES.
+        start (date): The first day to include, or None for no lower bound.
+        end (date): The last day to include, or None for no upper bound.
+        category (int): Only count menu items of this category ID.
+        item (int): Only count this menu item ID.
+        staff (int): Only count orders handled by this staff ID.
+
+    Returns:
+        SalesSeries: The sales series.
+
+    Raises:
+        ValueError: If the granularity is unknown.
+    """
+    if granularity not in SALES_GRANULARITIES:
+        raise ValueError(f"Unknown sales granularity: {granularity!r}")
+    trunc = SALES_GRANULARITIES[granularity]
+
+    filters = {}
+    if category is not None:
+        filters["item__category_id"] = category
+    if item is not None:
+        filters["item_id"] = item
+
+    if granularity == "hour" or staff is not None:
+        if staff is not None:
+            filters["order__staff_id"] = staff
+        start_at, end_at = report_range(start, end)
+        if start is not None:
+            filters["order__created_at__gte"] = start_at
+        if end is not None:
+            filters["order__created_at__lt"] = end_at
+        if granularity == "hour":
+            period = trunc("order__created_at")
+        else:
+            period = trunc("order__created_at", output_field=DateField())
+        rows = OrderItem.objects.filter(order__status="Completed", **filters).annotate(
+            period=period
+        )
+        quantity, revenue = Sum("quantity"), Sum("subtotal")
+    else:
+        if start is not None:
+            filters["date__gte"] = start
+        if end is not None:
+            filters["date__lte"] = end
+        period = F("date") if granularity == "day" else trunc("date")
+        rows = DailySalesRollup.objects.filter(**filters).annotate(period=period)
+        quantity, revenue = Sum("quantity"), Sum("revenue")
+
+    rows = (
+        rows.values("period", "item__name")
+        .annotate(quantity=quantity, revenue=revenue)
+        .order_by("period", "item__name")
+    )
+    return SalesSeries(granularity, start, end, list(rows))
+
+
+def get_report_generation():
+    """Return the current report generation, starting one if none is cached."""
+    return cache.get_or_set(REPORT_GENERATION_KEY, clock.time_ns, timeout=None)
+
+
+def invalidate_reports():
+    """
+    Start a new report generation so that every cached report is recomputed.
+
+    The generation is bumped again once the current transaction commits, so a
+    report computed by another request before the commit is not kept.
+    """
+    cache.set(REPORT_GENERATION_KEY, clock.time_ns(), timeout=None)
+    transaction.on_commit(
+        lambda: cache.set(REPORT_GENERATION_KEY, clock.time_ns(), timeout=None)
+    )
+
+
+def cached_report(timeout=None):
+    """
+    Caches the results of a report method, keyed by its name and arguments.
+
+    Arguments are bound to the method's signature first, so calls passing the same
+    values positionally, by keyword or through defaults share one entry.
+
+    Results are kept for ``timeout`` seconds (``REPORT_CACHE_TIMEOUT`` by
+    default), at most until the end of the day, and are dropped as soon as
+    completed orders change (see staff/signals.py).
+
+    Args:
+        timeout (int): The lifetime of a cached result in seconds.
+    """
+
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            arguments = signature.bind(self, *args, **kwargs)
+            arguments.apply_defaults()
+            params = repr(list(arguments.arguments.items())[1:])
+            key = REPORT_CACHE_KEY.format(
+                generation=get_report_generation(),
+                day=timezone.localdate().isoformat(),
+                name=method.__name__,
+                params=hashlib.md5(params.encode()).hexdigest(),
+            )
+            result = cache.get(key)
+            if result is None:
+                result = method(self, *args, **kwargs)
+                cache.set(
+                    key,
+                    result,
+                    timeout or getattr(settings, "REPORT_CACHE_TIMEOUT", 60 * 5),
+                )
+            return result
+
+        return wrapper
+
+    return decorator
 
 
 class ReportView(View):
@@ -14,13 +372,14 @@ class ReportView(View):
     and orders for a specific period.
     """
 
+    @cached_report()
     def top_products(self):
         """
         Retrieves the top 5 products sold in the last month.
 
         Returns:
-            QuerySet: A queryset containing the top products with their names,
-            prices, total orders, and total sales amount.
+            list: The top products with their names, prices, total orders, and
+            total sales amount.
         """
         now = timezone.now()
         last_month_start = now - timedelta(days=30)
@@ -33,132 +392,92 @@ class ReportView(View):
             .order_by("-total_orders")[:5]
         )
 
-        return top_products
+        return list(top_products)
 
-    def peak_business_hour(self):
+    @cached_report()
+    def peak_business_hour(self, start=None, end=None):
         """
-        Analyzes peak business hours based on orders extracted from the last month.
+        Analyzes peak business hours for the orders placed in a date range.
+
+        The orders are counted per weekday and hour in a single grouped query,
+        whatever the number of orders.
+
+        Args:
+            start (datetime): Start of the range (inclusive), 30 days ago by default.
+            end (datetime): End of the range (exclusive), now by default.
 
         Returns:
-            dict: A dictionary containing the most frequent hour of orders per day
-            and overall most frequent hour across all days in the last month.
+            dict: A dictionary containing the 7x24 order count heatmap (rows are
+            weekdays starting on Sunday, columns are hours), the most frequent
+            hour of orders per day and the overall most frequent hour.
         """
-        now = timezone.now()
-        last_month_start = now - timedelta(days=30)
-
-        # Filter orders from the last month
-        orders = Order.objects.filter(created_at__gte=last_month_start)
+        start, end = report_range(start, end)
 
-        # Extract the hour and day of the week from the orders
-        order_times = defaultdict(lambda: defaultdict(int))
+        counts = (
+            Order.objects.filter(created_at__gte=start, created_at__lt=end)
+            .annotate(
+                weekday=ExtractWeekDay("created_at"), hour=ExtractHour("created_at")
+            )
+            .values("weekday", "hour")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
 
-        # Iterate through orders and count occurrences of hour per day
-        for order in orders:
-            day = order.created_at.strftime("%A")  # Get day of the week
-            hour = order.created_at.strftime("%H")  # Get hour
-            order_times[day][hour] += 1
+        # ExtractWeekDay numbers the days from 1 (Sunday) to 7 (Saturday)
+        heatmap = [[0] * 24 for _ in WEEKDAY_NAMES]
+        for row in counts:
+            heatmap[row["weekday"] - 1][row["hour"]] = row["count"]
 
-            # Calculate most frequent hours per day of the week
-            most_frequent_per_day = {}
-            total_orders = orders.count()
-            overall_count = defaultdict(int)
+        most_frequent_per_day = {}
+        for day, hours in zip(WEEKDAY_NAMES, heatmap):
+            peak_hour = max(range(24), key=hours.__getitem__)
+            if hours[peak_hour]:
+                most_frequent_per_day[day] = {
+                    "hour": f"{peak_hour:02d}",
+                    "count": hours[peak_hour],
+                }
 
-        for day, timestamps in order_times.items():
-            most_frequent_hour = max(
-                timestamps.items(), key=lambda x: x[1], default=(None, 0)
-            )
-            most_frequent_per_day[day] = {
-                "hour": most_frequent_hour[0],
-                "count": most_frequent_hour[1],
-            }
-
-        # Aggregate for overall most frequent hour
-        if most_frequent_hour[0] is not None:
-            overall_count[most_frequent_hour[0]] += most_frequent_hour[1]
-
-        # Calculate the overall most frequent hour in the last month
-        overall_most_frequent_hour = max(
-            overall_count.items(), key=lambda x: x[1], default=(None, 0)
-        )
+        hour_totals = [sum(hours[hour] for hours in heatmap) for hour in range(24)]
+        overall_peak_hour = max(range(24), key=hour_totals.__getitem__)
 
         orders = {
+            "heatmap": heatmap,
+            "heatmap_rows": list(zip(WEEKDAY_NAMES, heatmap)),
+            "start": start,
+            "end": end,
             "most_frequent_per_day": most_frequent_per_day,
             "overall_most_frequent_hour": {
-                "hour": overall_most_frequent_hour[0],
-                "total_orders": overall_most_frequent_hour[1],
-                "total_orders_month": total_orders,
+                "hour": (
+                    f"{overall_peak_hour:02d}"
+                    if hour_totals[overall_peak_hour]
+                    else None
+                ),
+                "total_orders": hour_totals[overall_peak_hour],
+                "total_orders_month": sum(hour_totals),
             },
         }
         return orders
 
-    def customer_demographic_data(self):
+    @cached_report(timeout=DEMOGRAPHIC_CACHE_TIMEOUT)
+    def customer_demographic_data(self, today=None):
         """
         Collects demographic data regarding customers based on age and gender.
 
+        All nine buckets are counted in a single query, and the result is cached
+        for the rest of the day.
+
+        Args:
+            today (date): The day ages are computed for, today by default.
+
         Returns:
             dict: A dictionary summarizing customer counts by gender and age group.
         """
-        today = date.today()
-        under_20_females = Customer.objects.filter(
-            gender="female",
-            date_of_birth__gte=today.replace(year=today.year - 20),
-        ).count()
-
-        between_20_and_40_females = Customer.objects.filter(
-            gender="female",
-            date_of_birth__lt=today.replace(year=today.year - 20),
-            date_of_birth__gte=today.replace(year=today.year - 40),
-        ).count()
-
-        over_40_females = Customer.objects.filter(
-            gender="female",
-            date_of_birth__lt=today.replace(year=today.year - 40),
-        ).count()
-
-        under_20_Uncertain = Customer.objects.filter(
-            gender="Uncertain",
-            date_of_birth__gte=today.replace(year=today.year - 20),
-        ).count()
-
-        between_20_and_40_Uncertain = Customer.objects.filter(
-            gender="Uncertain",
-            date_of_birth__lt=today.replace(year=today.year - 20),
-            date_of_birth__gte=today.replace(year=today.year - 40),
-        ).count()
-
-        over_40_Uncertain = Customer.objects.filter(
-            gender="Uncertain",
-            date_of_birth__lt=today.replace(year=today.year - 40),
-        ).count()
-
-        under_20_males = Customer.objects.filter(
-            gender="man", date_of_birth__gte=today.replace(year=today.year - 20)
-        ).count()
-
-        between_20_and_40_males = Customer.objects.filter(
-            gender="man",
-            date_of_birth__lt=today.replace(year=today.year - 20),
-            date_of_birth__gte=today.replace(year=today.year - 40),
-        ).count()
-
-        over_40_males = Customer.objects.filter(
-            gender="man", date_of_birth__lt=today.replace(year=today.year - 40)
-        ).count()
-
-        context = {
-            "under_20_Uncertain": under_20_Uncertain,
-            "between_20_and_40_Uncertain": between_20_and_40_Uncertain,
-            "over_40_Uncertain": over_40_Uncertain,
-            "under_20_females": under_20_females,
-            "between_20_and_40_females": between_20_and_40_females,
-            "over_40_females": over_40_females,
-            "under_20_males": under_20_males,
-            "between_20_and_40_males": between_20_and_40_males,
-            "over_40_males": over_40_males,
-            "year": today.year,
-        }
+        today = today or date.today()
+        (context,) = customer_histogram([age_bands(today=today), gender_buckets()])
+        context["year"] = today.year
         return context
 
+    @cached_report()
     def total_sales(self):
         """
         Computes total sales data including individual items and overall totals.
@@ -181,163 +500,40 @@ class ReportView(View):
         )
 
         context = {
-            "sales_data": sales_data,
+            "sales_data": list(sales_data),
             "total_sales_cost": total_sales_cost,
         }
         return context
 
-    def daily_sales(self):
-        """
-        Retrieves daily sales figures across all completed orders.
-
-        Returns:
-            dict: A dictionary containing daily total sales and product sales
-            data organized by date.
+    @cached_report()
+    def sales(
+        self,
+        granularity="day",
+        start=None,
+        end=None,
+        category=None,
+        item=None,
+        staff=None,
+    ):
         """
-        results = (
-            Order.objects.filter(status="Completed")
-            .annotate(date=TruncDate("created_at"))
-            .prefetch_related("order_items_set")
-            .values("date")
-            .annotate(
-                total_sales=Sum("order_items__subtotal"),
-                total_items=Sum("order_items__quantity"),
-            )
-        )
-
-        sales_data = (
-            OrderItem.objects.filter(order__status="Completed")
-            .annotate(date=TruncDate("created_at"))
-            .values("item__name", "date")
-            .annotate(total_quantity=Sum("quantity"), total_sales=Sum("subtotal"))
-        )
-
-        product_sales_data = defaultdict(
-            lambda: defaultdict(lambda: {"total_quantity": 0, "total_sales": 0})
-        )
+        Retrieves the sales of completed orders per time bucket and menu item.
 
-        for product_sales in sales_data:
-            date = product_sales["date"]
-            product_name = product_sales["item__name"]
-            product_sales_data[date][product_name]["total_quantity"] += product_sales[
-                "total_quantity"
-            ]
-            product_sales_data[date][product_name]["total_sales"] += product_sales[
-                "total_sales"
-            ]
-
-        context = {
-            "daily_total_sales": results,
-            "daily_product_sales": sales_data,
-            "daily_sortbydate": product_sales_data,
-        }
-
-        return context
-
-    def monthly_sales(self):
-        """
-        Retrieves monthly sales figures across all completed orders.
+        Takes the arguments of sales_series().
 
         Returns:
-            dict: A dictionary containing daily total sales and product sales
-            data organized by date.
+            SalesSeries: The sales per bucket and menu item.
         """
-        results = (
-            Order.objects.filter(status="Completed")
-            .annotate(date=TruncMonth("created_at"))
-            .prefetch_related("order_items_set")
-            .values("date")
-            .annotate(
-                total_sales=Sum("order_items__subtotal"),
-                total_items=Sum("order_items__quantity"),
-            )
-        )
-
-        sales_data = (
-            OrderItem.objects.filter(order__status="Completed")
-            .annotate(date=TruncMonth("created_at"))
-            .values("item__name", "date")
-            .annotate(total_quantity=Sum("quantity"), total_sales=Sum("subtotal"))
-        )
-
-        product_sales_data = defaultdict(
-            lambda: defaultdict(lambda: {"total_quantity": 0, "total_sales": 0})
-        )
-
-        for product_sales in sales_data:
-            date = product_sales["date"]
-            product_name = product_sales["item__name"]
-            product_sales_data[date][product_name]["total_quantity"] += product_sales[
-                "total_quantity"
-            ]
-            product_sales_data[date][product_name]["total_sales"] += product_sales[
-                "total_sales"
-            ]
-
-        context = {
-            "daily_total_sales": results,
-            "daily_product_sales": sales_data,
-            "daily_sortbydate": product_sales_data,
-        }
-
-        return context
-
-    def yearly_sales(self):
-        """
-        Retrieves yearly sales figures across all completed orders.
-
-        Returns:
-            dict: A dictionary containing daily total sales and product sales
-            data organized by date.
-        """
-        results = (
-            Order.objects.filter(status="Completed")
-            .annotate(date=TruncYear("created_at"))
-            .prefetch_related("order_items_set")
-            .values("date")
-            .annotate(
-                total_sales=Sum("order_items__subtotal"),
-                total_items=Sum("order_items__quantity"),
-            )
-        )
-
-        sales_data = (
-            OrderItem.objects.filter(order__status="Completed")
-            .annotate(date=TruncYear("created_at"))
-            .values("item__name", "date")
-            .annotate(total_quantity=Sum("quantity"), total_sales=Sum("subtotal"))
-        )
-
-        product_sales_data = defaultdict(
-            lambda: defaultdict(lambda: {"total_quantity": 0, "total_sales": 0})
-        )
-
-        for product_sales in sales_data:
-            date = product_sales["date"]
-            product_name = product_sales["item__name"]
-            product_sales_data[date][product_name]["total_quantity"] += product_sales[
-                "total_quantity"
-            ]
-            product_sales_data[date][product_name]["total_sales"] += product_sales[
-                "total_sales"
-            ]
-
-        context = {
-            "daily_total_sales": results,
-            "daily_product_sales": sales_data,
-            "daily_sortbydate": product_sales_data,
-        }
-
-        return context
+        return sales_series(granularity, start, end, category, item, staff)
 
+    @cached_report()
     def customer_analytics(self):
         """
         Retrieves the top 5 customers based on their order activity within the last month.
 
         This function filters orders from the last 30 days, aggregates the number of orders
         and total spending for each customer, and sorts them in descending order of total
-        spent and number of orders. It then retrieves the associated points of each top customer
-        based on their phone number.
+        spent and number of orders. It then retrieves the points balances of the top customers
+        in one batch.
 
         Returns:
             list: A list of dictionaries, each containing the customer's phone number,
@@ -349,18 +545,18 @@ class ReportView(View):
         # Get the top 5 customers by number of orders and total spent
         top_customers = (
             Order.objects.filter(order_date__gte=last_month_start)
-            .values("customer__phone_number")
+            .values("customer_id", "customer__phone_number")
             .annotate(number_of_orders=Count("id"), total_spent=Sum("total_price"))
             .order_by("-total_spent", "-number_of_orders")[:5]
         )
 
+        top_customers = list(top_customers)
+        balances = get_points_balances(
+            customer["customer_id"]
+            for customer in top_customers
+            if customer["customer_id"] is not None
+        )
         for customer in top_customers:
-            if customer["customer__phone_number"] == None:
-                continue
-            else:
-                customer_obj = Customer.objects.get(
-                    phone_number=customer["customer__phone_number"]
-                )
-            customer["points"] = customer_obj.points
+            customer["points"] = balances.get(customer.pop("customer_id"), 0)
 
         return top_customers
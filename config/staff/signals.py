@@ -0,0 +1,46 @@
+"""
+signals.py
+
+This module drops the cached dashboard reports whenever completed orders
+change: an order is completed or reopened, a completed order is deleted, or an
+item of a completed order is saved or deleted.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from order.models import Order, OrderItem
+from .report import invalidate_reports
+
+
+def is_completed(order_id, order=None):
+    """Return whether the order is completed, reading it only when not loaded."""
+    if order is not None:
+        return order.status == "Completed"
+    return Order.objects.filter(pk=order_id, status="Completed").exists()
+
+
+@receiver(post_save, sender=Order)
+def invalidate_reports_on_order_save(sender, instance, created, **kwargs):
+    """
+    Invalidates the reports when an order is saved as completed or leaves the
+    completed status.
+    """
+    previous_status = getattr(instance, "_loaded_status", None)
+    if "Completed" in (instance.status, previous_status):
+        invalidate_reports()
+
+
+@receiver(post_delete, sender=Order)
+def invalidate_reports_on_order_delete(sender, instance, **kwargs):
+    """Invalidates the reports when a completed order is deleted."""
+    if instance.status == "Completed":
+        invalidate_reports()
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_reports_on_order_item_change(sender, instance, **kwargs):
+    """Invalidates the reports when an item of a completed order changes."""
+    order = instance.order if OrderItem.order.is_cached(instance) else None
+    if is_completed(instance.order_id, order):
+        invalidate_reports()
@@ -1,7 +1,55 @@
-from django.test import TestCase
+import asyncio
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import gzip
+import json
+import re
+from decimal import Decimal
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+from asgiref.sync import sync_to_async
+from openpyxl import load_workbook
+from django.test import TestCase, override_settings
+from django.contrib.auth import authenticate
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
 from django.core.exceptions import ValidationError
 from django.urls import reverse
+from django.utils import timezone
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from cafe.models import Cafe, Table
+from customer.models import Customer, PointsEntry
+from menu.models import Category, MenuItem
+from order.events import ORDER_CREATED, STATUS_CHANGED, order_events
+from order.models import Order, OrderItem
+from .backends import credential_cache
+from .hashers import PolicyPBKDF2PasswordHasher
+from .instrumentation import QueryRecorder, query_stats
 from .models import Staff
+from .export import (
+    MENU_ITEM_COLUMNS,
+    ORDER_ITEM_COLUMNS,
+    after_watermark,
+    changed_rows,
+    changed_since,
+    customer_rows,
+    menu_item_rows,
+    order_item_rows,
+    order_items_queryset,
+    parse_watermark,
+    staff_rows,
+)
+from .export_formats import read_columnar
+from .export_jobs import get_job
+from .report import (
+    ReportView,
+    sales_series,
+    age_bands,
+    customer_histogram,
+    gender_buckets,
+)
 
 
 class StaffModelTests(TestCase):
@@ -116,3 +164,862 @@ class StaffModelTests(TestCase):
         )
         with self.assertRaises(ValidationError):
             staff.full_clean()  # باید خطای اعتبارسنجی ایجاد کند
+
+
+class PeakBusinessHourTests(TestCase):
+    def setUp(self):
+        """Create orders at known times on a Monday and a Tuesday."""
+        cache.clear()
+        times = [
+            datetime(2024, 11, 4, 9, 15, tzinfo=dt_timezone.utc),  # Monday
+            datetime(2024, 11, 4, 9, 45, tzinfo=dt_timezone.utc),
+            datetime(2024, 11, 4, 13, 0, tzinfo=dt_timezone.utc),
+            datetime(2024, 11, 5, 13, 30, tzinfo=dt_timezone.utc),  # Tuesday
+            datetime(2024, 10, 1, 9, 0, tzinfo=dt_timezone.utc),  # Out of range
+        ]
+        for created_at in times:
+            order = Order.objects.create(table_number="1")
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+
+    def test_peak_business_hour_heatmap(self):
+        """Test the heatmap and peaks are computed with a single query."""
+        with self.assertNumQueries(1):
+            report = ReportView().peak_business_hour(
+                start=date(2024, 11, 1), end=date(2024, 11, 30)
+            )
+        self.assertEqual(len(report["heatmap"]), 7)
+        self.assertEqual(report["heatmap"][1][9], 2)  # Monday 09:00
+        self.assertEqual(report["heatmap"][2][13], 1)  # Tuesday 13:00
+        self.assertEqual(
+            report["most_frequent_per_day"],
+            {
+                "Monday": {"hour": "09", "count": 2},
+                "Tuesday": {"hour": "13", "count": 1},
+            },
+        )
+        self.assertEqual(
+            report["overall_most_frequent_hour"],
+            {"hour": "09", "total_orders": 2, "total_orders_month": 4},
+        )
+
+
+class CustomerDemographicTests(TestCase):
+    def setUp(self):
+        """Create customers of different ages and genders."""
+        cache.clear()
+        self.today = date(2024, 11, 4)
+        self.cafe = Cafe.objects.create(
+            name="Test Cafe",
+            address="123 Test Street",
+            opening_time="08:00",
+            closing_time="20:00",
+        )
+        customers = [
+            ("09120000001", "female", date(2010, 1, 1)),  # under 20
+            ("09120000002", "female", date(1990, 1, 1)),  # between 20 and 40
+            ("09120000003", "man", date(1970, 1, 1)),  # over 40
+            ("09120000004", "man", date(1975, 1, 1)),  # over 40
+            ("09120000005", "Uncertain", date(2000, 1, 1)),  # between 20 and 40
+        ]
+        for phone_number, gender, date_of_birth in customers:
+            Customer.objects.create(
+                phone_number=phone_number,
+                gender=gender,
+                date_of_birth=date_of_birth,
+                table_number=1,
+                cafe=self.cafe,
+            )
+
+    def test_customer_demographic_data(self):
+        """Test that all buckets are counted with one cached query."""
+        with self.assertNumQueries(1):
+            context = ReportView().customer_demographic_data(today=self.today)
+        self.assertEqual(context["under_20_females"], 1)
+        self.assertEqual(context["between_20_and_40_females"], 1)
+        self.assertEqual(context["over_40_males"], 2)
+        self.assertEqual(context["between_20_and_40_Uncertain"], 1)
+        self.assertEqual(context["under_20_males"], 0)
+        self.assertEqual(context["year"], 2024)
+
+        with self.assertNumQueries(0):
+            ReportView().customer_demographic_data(today=self.today)
+
+    def test_customer_histogram_grouped_by_cafe(self):
+        """Test custom age bands split by cafe."""
+        rows = customer_histogram(
+            [age_bands(edges=(30,), today=self.today), gender_buckets()],
+            group_by=("cafe",),
+        )
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["cafe_name"], "Test Cafe")
+        self.assertEqual(rows[0]["under_30_females"], 1)
+        self.assertEqual(rows[0]["over_30_males"], 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        """Create a superuser and a few menu items to export."""
+        self.manager = Staff.objects.create_superuser(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(self.manager)
+        category = Category.objects.create(name="Drinks")
+        for number in range(3):
+            MenuItem.objects.create(
+                name=f"Tea {number}", price=10, points=1, category=category
+            )
+
+    def test_menu_items_export_is_streamed(self):
+        """Test that the export is a streamed, readable workbook."""
+        response = self.client.get(reverse("export_menu_items"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("menu_items_data.xlsx", response["Content-Disposition"])
+
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), MENU_ITEM_COLUMNS)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1:], ("Tea 0", 10, 1, "Drinks"))
+
+    def add_orders(self, count):
+        """Create ``count`` orders, each with its own customer and an item."""
+        item = MenuItem.objects.first()
+        for number in range(count):
+            customer = Customer.objects.create(
+                phone_number=f"0913{Customer.objects.count():07d}", table_number=1
+            )
+            order = Order.objects.create(
+                customer=customer, staff=self.manager, table_number="1"
+            )
+            OrderItem.objects.create(order=order, item=item, quantity=2)
+
+    def count_export_queries(self, rows):
+        with CaptureQueriesContext(connection) as queries:
+            exported = list(rows())
+        return len(exported), len(queries)
+
+    def test_export_query_count_is_constant(self):
+        """Test that exporting more rows does not run more queries."""
+        for rows in (order_item_rows, customer_rows, staff_rows, menu_item_rows):
+            with self.subTest(rows=rows.__name__):
+                self.add_orders(1)
+                small_rows, small_queries = self.count_export_queries(rows)
+                self.add_orders(5)
+                large_rows, large_queries = self.count_export_queries(rows)
+                self.assertEqual(small_queries, large_queries)
+                if rows in (order_item_rows, customer_rows):
+                    self.assertGreater(large_rows, small_rows)
+
+    def test_customer_rows_totals(self):
+        """Test the per-customer order totals."""
+        self.add_orders(1)
+        Order.objects.create(customer=Customer.objects.get(), table_number="1")
+        row = next(customer_rows())
+        self.assertEqual(row[4], 2)  # number of orders
+        self.assertEqual(row[5], 20)  # total amount paid
+        self.assertIsNotNone(row[7])  # last order date
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        """Run export jobs inline, spooling into a temporary directory."""
+        cache.clear()
+        spool = TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        settings_override = override_settings(
+            EXPORT_MAX_WORKERS=0, EXPORT_SPOOL_DIR=spool.name
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.manager = Staff.objects.create_superuser(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(self.manager)
+        self.category = Category.objects.create(name="Drinks")
+        MenuItem.objects.create(name="Tea", price=10, points=1, category=self.category)
+
+    def start(self, kind="menu_items"):
+        response = self.client.post(reverse("start_export", args=[kind]))
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_export_job_download(self):
+        """Test that a finished job reports its status and serves the file."""
+        job = self.start()
+        status = self.client.get(job["status_url"]).json()
+        self.assertEqual(status["status"], "done")
+
+        response = self.client.get(status["download_url"])
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(workbook.active.max_row, 2)
+
+    def test_unchanged_data_reuses_spooled_file(self):
+        """Test that the data watermark decides when a file is rebuilt."""
+        first = self.start()
+        # The user (the session is cached), then one watermark query per table
+        with self.assertNumQueries(3):
+            second = self.start()
+        self.assertNotEqual(first["job_id"], second["job_id"])
+        first_path = get_job(first["job_id"])["path"]
+        self.assertEqual(get_job(second["job_id"])["path"], first_path)
+
+        MenuItem.objects.create(name="Cake", price=20, points=2, category=self.category)
+        third = self.start()
+        self.assertNotEqual(get_job(third["job_id"])["path"], first_path)
+
+    def test_unknown_export_and_job(self):
+        """Test that unknown exports and jobs are not found."""
+        self.assertEqual(
+            self.client.post(reverse("start_export", args=["nothing"])).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(reverse("export_job_status", args=["missing"])).status_code,
+            404,
+        )
+
+
+class ExportFormatTests(TestCase):
+    def setUp(self):
+        """Create an order with two items to export."""
+        self.manager = Staff.objects.create_superuser(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(self.manager)
+        category = Category.objects.create(name="Drinks")
+        customer = Customer.objects.create(phone_number="09130000000", table_number=1)
+        self.order = Order.objects.create(customer=customer, table_number="3")
+        for name, price in (("Tea", "10.50"), ("Coffee", "20.00")):
+            item = MenuItem.objects.create(
+                name=name, price=Decimal(price), points=1, category=category
+            )
+            OrderItem.objects.create(order=self.order, item=item, quantity=2)
+
+    def export(self, kind, export_format):
+        response = self.client.get(
+            reverse("export_data", args=[kind]), {"format": export_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_csv_export(self):
+        """Test that CSV exports are gzip-compressed with a header row."""
+        lines = gzip.decompress(self.export("orders", "csv")).decode().splitlines()
+        self.assertEqual(lines[0], ",".join(ORDER_ITEM_COLUMNS))
+        self.assertEqual(len(lines), 3)
+
+    def test_jsonl_export(self):
+        """Test that JSON Lines exports are keyed by the column names."""
+        lines = gzip.decompress(self.export("menu_items", "jsonl")).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(rows[0]["name"], "Tea")
+        self.assertEqual(rows[0]["price"], "10.50")
+        self.assertEqual(rows[1]["category"], "Drinks")
+
+    def test_columnar_export_round_trip(self):
+        """Test that columnar exports decode to the exported values."""
+        data = read_columnar(BytesIO(self.export("orders", "columnar")))
+        self.assertEqual(data["quantity"], [2, 2])
+        self.assertEqual(data["subtotal"], [Decimal("21.00"), Decimal("40.00")])
+        self.assertEqual(data["customer_phone_number"], ["09130000000"] * 2)
+        self.assertEqual(data["table_number"], ["3", "3"])
+
+        data = read_columnar(BytesIO(self.export("order_totals", "columnar")))
+        self.assertEqual(data["id"], [self.order.pk])
+        self.assertEqual(data["total_price"], [Decimal("61.00")])
+        self.assertEqual(data["staff_id"], [None])
+
+    def test_unsupported_format(self):
+        """Test that only typed datasets can be exported as columnar."""
+        url = reverse("export_data", args=["customers"])
+        self.assertEqual(self.client.get(url, {"format": "columnar"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"format": "pdf"}).status_code, 400)
+
+
+class IncrementalExportTests(TestCase):
+    def setUp(self):
+        """Create order items changed a day apart."""
+        self.manager = Staff.objects.create_superuser(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(self.manager)
+        category = Category.objects.create(name="Drinks")
+        self.menu_item = MenuItem.objects.create(
+            name="Tea", price=10, points=1, category=category
+        )
+        self.order = Order.objects.create(table_number="1")
+        start = datetime(2024, 11, 1, tzinfo=dt_timezone.utc)
+        for day in range(5):
+            item = OrderItem.objects.create(order=self.order, item=self.menu_item)
+            OrderItem.objects.filter(pk=item.pk).update(
+                updated_at=start + timedelta(days=day)
+            )
+        Order.objects.filter(pk=self.order.pk).update(updated_at=start)
+
+    def test_keyset_pages(self):
+        """Test that pages follow each other and end with the next watermark."""
+        with self.assertNumQueries(1):
+            page = changed_since("orders", limit=2)
+        self.assertEqual(len(page["rows"]), 2)
+        self.assertTrue(page["has_more"])
+
+        seen = [row[0] for row in page["rows"]]
+        while page["has_more"]:
+            page = changed_since("orders", page["next_watermark"], limit=2)
+            seen.extend(row[0] for row in page["rows"])
+        self.assertEqual(seen, sorted(OrderItem.objects.values_list("pk", flat=True)))
+
+        watermark = page["next_watermark"]
+        self.assertEqual(changed_since("orders", watermark)["rows"], [])
+        item = OrderItem.objects.order_by("pk").first()
+        item.quantity = 3
+        item.save()
+        page = changed_since("orders", watermark)
+        self.assertEqual([row[0] for row in page["rows"]], [item.pk])
+
+    def test_date_and_id_watermarks(self):
+        """Test watermarks given as a date or as a row ID."""
+        rows = list(changed_rows("orders", "2024-11-03"))
+        self.assertEqual(len(rows), 3)
+
+        first_pk = OrderItem.objects.order_by("pk").first().pk
+        page = changed_since("orders", str(first_pk))
+        self.assertEqual(len(page["rows"]), 4)
+        self.assertEqual(page["next_watermark"], str(first_pk + 4))
+
+    def test_order_change_reexports_its_items(self):
+        """Test that editing an exported order field re-exports its items."""
+        order = Order.objects.get(pk=self.order.pk)
+        watermark = changed_since("orders")["next_watermark"]
+        order.status = "Completed"
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        self.assertFalse(
+            any(
+                query["sql"].startswith('UPDATE "order_orderitem"')
+                for query in queries.captured_queries
+            )
+        )
+        self.assertEqual(changed_since("orders", watermark)["rows"], [])
+
+        order.table_number = "2"
+        order.save()
+        page = changed_since("orders", watermark)
+        self.assertEqual(
+            [row[0] for row in page["rows"]],
+            sorted(OrderItem.objects.values_list("pk", flat=True)),
+        )
+        self.assertEqual({row[5] for row in page["rows"]}, {"2"})
+
+    def test_pages_use_the_updated_at_index(self):
+        """Test that a page is read through the (updated_at, id) index."""
+        if connection.vendor != "sqlite":
+            self.skipTest("The plan is checked on SQLite only.")
+        watermark = parse_watermark(changed_since("orders", limit=2)["next_watermark"])
+        queryset = after_watermark(order_items_queryset(), watermark, False)
+        plan = queryset[:2].explain()
+        self.assertIn("orderitem_updated_at_id_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_order_total_change_moves_watermark(self):
+        """Test that items changing an order's total mark the order as changed."""
+        watermark = changed_since("order_totals")["next_watermark"]
+        OrderItem.objects.create(order=self.order, item=self.menu_item)
+        page = changed_since("order_totals", watermark)
+        self.assertEqual([row[0] for row in page["rows"]], [self.order.pk])
+
+    def test_export_endpoints(self):
+        """Test the changes endpoint and incremental file exports."""
+        response = self.client.get(
+            reverse("export_changes", args=["orders"]), {"limit": 3}
+        )
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual(len(page["rows"]), 3)
+        self.assertEqual(page["rows"][0]["quantity"], 1)
+
+        response = self.client.get(
+            reverse("export_data", args=["orders"]),
+            {"format": "csv", "since": page["next_watermark"]},
+        )
+        lines = gzip.decompress(b"".join(response.streaming_content)).splitlines()
+        self.assertEqual(len(lines), 3)  # the header and the last two items
+        self.assertIn(",", response["X-Export-Watermark"])
+
+        response = self.client.get(
+            reverse("export_changes", args=["customers"]), {"since": "1"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SalesRollupReportTests(TestCase):
+    def setUp(self):
+        """Create completed orders on two days of two months."""
+        cache.clear()
+        category = Category.objects.create(name="Drinks")
+        self.tea = MenuItem.objects.create(
+            name="Tea", price=10, points=1, category=category
+        )
+        for day in (date(2024, 10, 31), date(2024, 11, 1), date(2024, 11, 1)):
+            order = Order.objects.create(table_number="1")
+            Order.objects.filter(pk=order.pk).update(
+                created_at=datetime.combine(day, datetime.min.time(), dt_timezone.utc)
+            )
+            OrderItem.objects.create(order=order, item=self.tea, quantity=2)
+            order = Order.objects.get(pk=order.pk)
+            order.status = "Completed"
+            order.save()
+        Order.objects.create(table_number="2")  # pending orders are not counted
+
+    def test_daily_and_monthly_sales(self):
+        """Test that daily and monthly figures come from the rollup."""
+        with self.assertNumQueries(1):
+            daily = ReportView().sales()
+        self.assertEqual(daily.period, [date(2024, 10, 31), date(2024, 11, 1)])
+        self.assertEqual(daily.quantity, [2, 4])
+        self.assertEqual(daily.totals()[1]["revenue"], 40)
+
+        monthly = sales_series("month")
+        self.assertEqual([total["revenue"] for total in monthly.totals()], [20, 40])
+
+    def test_hourly_and_filtered_series(self):
+        """Test series computed from the order items, with filters."""
+        with self.assertNumQueries(1):
+            hourly = sales_series("hour", start=date(2024, 11, 1))
+        self.assertEqual(hourly.period, [datetime(2024, 11, 1, tzinfo=dt_timezone.utc)])
+        self.assertEqual(hourly.quantity, [4])
+        self.assertEqual(len(sales_series("week", item=self.tea.pk + 1)), 0)
+        self.assertEqual(len(sales_series("year", staff=1)), 0)
+
+    def test_sales_series_endpoint(self):
+        """Test the JSON columns of the sales series endpoint."""
+        manager = Staff.objects.create_superuser(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(manager)
+        response = self.client.get(
+            reverse("sales_series"),
+            {"granularity": "month", "start_date": "2024-11-01"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["columns"],
+            {
+                "period": ["2024-11-01"],
+                "item": ["Tea"],
+                "quantity": [4],
+                "revenue": ["40.00"],
+            },
+        )
+        response = self.client.get(reverse("sales_series"), {"granularity": "decade"})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            reverse("sale_analysis"), {"filter_type": "weekly sales"}
+        )
+        self.assertContains(response, "Final report")
+
+    def test_sales_views_read_cached_series(self):
+        """Test that the sales analysis views serve the cached series."""
+        manager = Staff.objects.create_superuser(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(manager)
+        with mock.patch(
+            "staff.report.sales_series", wraps=sales_series
+        ) as compute_series:
+            for _ in range(2):
+                self.client.get(reverse("sales_series"), {"granularity": "month"})
+                self.client.post(
+                    reverse("sale_analysis"), {"filter_type": "monthly sales"}
+                )
+        self.assertEqual(compute_series.call_count, 1)
+
+    def test_reports_are_cached_until_orders_complete(self):
+        """Test that reports are served from the cache until an order completes."""
+        daily = ReportView().sales()
+        with self.assertNumQueries(0):
+            self.assertEqual(ReportView().sales().quantity, daily.quantity)
+
+        order = Order.objects.create(table_number="3")
+        OrderItem.objects.create(order=order, item=self.tea, quantity=1)
+        with self.assertNumQueries(0):
+            ReportView().sales()
+
+        order.status = "Completed"
+        order.save()
+        self.assertEqual(sum(ReportView().sales().quantity), 7)
+
+    def test_customer_analytics_reads_points_balances_in_one_query(self):
+        """Test that the points balances of the top customers are read at once."""
+        cafe = Cafe.objects.create(
+            name="Test Cafe",
+            address="123 Test Street",
+            opening_time="08:00",
+            closing_time="20:00",
+        )
+        customer = Customer.objects.create(
+            phone_number="09120000001", table_number=1, cafe=cafe, points=12
+        )
+        order = Order.objects.create(
+            table_number="1", customer=customer, total_price=500
+        )
+        PointsEntry.objects.create(customer=customer, order=order, points=3)
+        with self.assertNumQueries(2):
+            top_customers = ReportView().customer_analytics()
+        self.assertEqual(top_customers[0]["customer__phone_number"], "09120000001")
+        self.assertEqual(top_customers[0]["points"], 15)
+
+
+@override_settings(ORDER_PAGE_SIZE=2)
+class CheckoutPaginationTests(TestCase):
+    def setUp(self):
+        """Create a manager, a customer and five orders an hour apart."""
+        self.manager = Staff.objects.create_superuser(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(self.manager)
+        customer = Customer.objects.create(phone_number="09120000001", table_number=1)
+        start = datetime(2024, 11, 4, 9, 0, tzinfo=dt_timezone.utc)
+        self.orders = []
+        for hour in range(5):
+            order = Order.objects.create(
+                table_number="1", customer=customer, staff=self.manager
+            )
+            Order.objects.filter(pk=order.pk).update(
+                order_date=start + timedelta(hours=hour)
+            )
+            self.orders.append(order.pk)
+        self.orders.reverse()  # newest first
+
+    def test_keyset_pages(self):
+        """Test paging through all orders both ways with constant queries."""
+        url = reverse("staff_checkout")
+        response = self.client.post(url, {"filter_type": "all"})
+        page = [order.pk for order in response.context["orders"]]
+        self.assertEqual(page, self.orders[:2])
+        self.assertIsNone(response.context["newer_cursor"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                url,
+                {"filter_type": "all", "before": response.context["older_cursor"]},
+            )
+        self.assertEqual(
+            [order.pk for order in response.context["orders"]], self.orders[2:4]
+        )
+        self.assertContains(response, "Older orders")
+        self.assertContains(response, "Newer orders")
+        # user and the page itself; the session is read from the cache
+        self.assertEqual(len(queries), 2)
+
+        response = self.client.post(
+            url, {"filter_type": "all", "after": response.context["newer_cursor"]}
+        )
+        self.assertEqual(
+            [order.pk for order in response.context["orders"]], self.orders[:2]
+        )
+        self.assertIsNone(response.context["newer_cursor"])
+
+    def test_manager_checkout_filter_is_paginated(self):
+        """Test that the filtered lists of the manager checkout are paged too."""
+        response = self.client.post(
+            reverse("manager_checkout"),
+            {"filter_type": "status", "filter_value": "Pending", "before": "junk"},
+        )
+        self.assertEqual(
+            [order.pk for order in response.context["orders"]], self.orders[:2]
+        )
+        self.assertEqual(response.context["order"].pk, self.orders[0])
+
+
+class OrderBoardTests(TestCase):
+    def setUp(self):
+        self.staff_member = Staff.objects.create_user(
+            phone_number="09120000000", password="testpassword"
+        )
+
+    def create_and_complete_order(self):
+        """Create an order and complete it, running the publish callbacks."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            order = Order.objects.create(table_number="4", staff=self.staff_member)
+            order.status = "Completed"
+            order.save()
+            order.table_number = "5"
+            order.save()  # not a status change
+        with self.assertNumQueries(2):  # one read per published change
+            for callback in callbacks:
+                callback()
+        return order
+
+    async def test_order_changes_are_published(self):
+        """Test that creating an order and changing its status are published."""
+        subscription = order_events.subscribe()
+        try:
+            order = await sync_to_async(self.create_and_complete_order)()
+            created = await subscription.get(1)
+            changed = await subscription.get(1)
+            self.assertIsNone(await subscription.get(0.01))
+        finally:
+            order_events.unsubscribe(subscription)
+        self.assertEqual(created[1:3], (ORDER_CREATED, created[2]))
+        self.assertEqual(created[2]["id"], order.pk)
+        self.assertEqual(changed[1], STATUS_CHANGED)
+        self.assertEqual(changed[2]["status"], "Completed")
+        self.assertEqual(changed[2]["staff"], " ")
+
+        replayed = order_events.subscribe(last_event_id=created[0])
+        try:
+            self.assertEqual(await replayed.get(1), changed)
+        finally:
+            order_events.unsubscribe(replayed)
+
+    async def test_event_stream(self):
+        """Test that published events are streamed as server-sent events."""
+        await self.async_client.aforce_login(self.staff_member)
+        response = await self.async_client.get(reverse("order_board_events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+        stream = order_events.stream()
+        self.assertTrue((await anext(stream)).startswith("retry:"))
+        await asyncio.to_thread(order_events.publish, ORDER_CREATED, {"id": 7})
+        event = await anext(stream)
+        self.assertIn("event: order_created\n", event)
+        self.assertIn('data: {"id": 7}\n\n', event)
+        await stream.aclose()
+        self.assertFalse(order_events.has_subscribers())
+
+    async def test_events_published_without_subscribers_are_replayed(self):
+        """Test that a board reconnecting after a gap gets the missed events."""
+        self.assertFalse(order_events.has_subscribers())
+        last_event_id = order_events.last_event_id()
+        order = await sync_to_async(self.create_and_complete_order)()
+
+        await self.async_client.aforce_login(self.staff_member)
+        response = await self.async_client.get(
+            reverse("order_board_events"),
+            headers={"Last-Event-ID": str(last_event_id)},
+        )
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b"retry:"))
+        created = (await anext(events)).decode()
+        changed = (await anext(events)).decode()
+        await response.streaming_content.aclose()
+        self.assertIn(f"id: {last_event_id + 1}\nevent: order_created\n", created)
+        self.assertIn(f'"id": {order.pk}', created)
+        self.assertIn("event: status_changed\n", changed)
+
+    def test_order_board_page(self):
+        """Test that the board lists the newest orders and opens the stream."""
+        Order.objects.create(table_number="4")
+        last_event_id = order_events.publish(ORDER_CREATED, {"id": 1})
+        self.client.force_login(self.staff_member)
+        response = self.client.get(reverse("order_board"))
+        self.assertContains(
+            response,
+            f"{reverse('order_board_events')}?last_event_id={last_event_id}",
+        )
+        self.assertEqual(len(response.context["orders"]), 1)
+
+
+class UpdateOrderStatusTests(TestCase):
+    def test_completing_an_order_frees_its_cafe_table(self):
+        """Test that only the table of the order's own cafe is freed, once."""
+        cafes = [
+            Cafe.objects.create(
+                name=name,
+                address="Test Street",
+                opening_time="08:00",
+                closing_time="20:00",
+            )
+            for name in ("First Cafe", "Second Cafe")
+        ]
+        for cafe in cafes:
+            Table.objects.create(cafe=cafe, number=1, status="U")
+        order = Order.objects.create(table_number="1", cafe=cafes[1])
+        staff_member = Staff.objects.create_user(
+            phone_number="09120000000", password="testpassword"
+        )
+        self.client.force_login(staff_member)
+        self.client.post(
+            reverse("update_order_status", args=[order.pk]), {"status": "Completed"}
+        )
+        self.assertEqual(
+            list(Table.objects.order_by("cafe_id").values_list("status", flat=True)),
+            ["U", "A"],
+        )
+
+        # The table is taken by the next customer; completing the order again
+        # must not free it
+        Table.objects.filter(cafe=cafes[1]).update(status="U")
+        self.client.post(
+            reverse("update_order_status", args=[order.pk]), {"status": "Completed"}
+        )
+        self.assertEqual(Table.objects.get(cafe=cafes[1]).status, "U")
+
+
+@override_settings(STAFF_PASSWORD_ITERATIONS=1000)
+class StaffAuthenticationTests(TestCase):
+    def setUp(self):
+        """Create a staff member and start with an empty credential cache."""
+        credential_cache.clear()
+        self.addCleanup(credential_cache.clear)
+        self.staff_member = Staff.objects.create_user("09120000001", "secret")
+
+    def login(self, password="secret", phone_number="09120000001"):
+        return authenticate(None, phone_number=phone_number, password=password)
+
+    def test_policy_change_rehashes_on_login(self):
+        """Test that a password is rehashed under a new policy when logging in."""
+        self.assertTrue(self.staff_member.password.startswith("pbkdf2_sha256$1000$"))
+        with override_settings(STAFF_PASSWORD_ITERATIONS=2000):
+            self.assertIsNone(self.login("wrong"))
+            self.staff_member.refresh_from_db()
+            self.assertTrue(
+                self.staff_member.password.startswith("pbkdf2_sha256$1000$")
+            )
+
+            self.assertEqual(self.login(), self.staff_member)
+            self.staff_member.refresh_from_db()
+            self.assertTrue(
+                self.staff_member.password.startswith("pbkdf2_sha256$2000$")
+            )
+            self.assertTrue(self.staff_member.check_password("secret"))
+
+    def test_recent_login_skips_the_hasher(self):
+        """Test that logging in again is checked against the credential cache."""
+        self.assertEqual(self.login(), self.staff_member)
+        with mock.patch.object(PolicyPBKDF2PasswordHasher, "verify") as verify:
+            self.assertEqual(self.login(), self.staff_member)
+        verify.assert_not_called()
+        self.assertIsNone(self.login("wrong"))
+
+        # A changed password no longer matches the cached check
+        self.staff_member.set_password("changed")
+        self.staff_member.save()
+        self.assertIsNone(self.login())
+        self.assertEqual(self.login("changed"), self.staff_member)
+
+    @override_settings(STAFF_AUTH_CACHE_SIZE=1)
+    def test_credential_cache_is_bounded(self):
+        """Test that the least recently verified login is evicted."""
+        Staff.objects.create_user("09120000002", "other")
+        self.login()
+        self.login("other", "09120000002")
+        self.assertEqual(len(credential_cache), 1)
+        with override_settings(STAFF_AUTH_CACHE_SIZE=0):
+            credential_cache.clear()
+            self.login()
+            self.assertEqual(len(credential_cache), 0)
+
+    def test_benchmark_logins_command(self):
+        """Test that the benchmark reports every scenario and leaves no staff."""
+        out = StringIO()
+        call_command("benchmark_logins", logins=1, stdout=out)
+        self.assertEqual(out.getvalue().count("logins/s"), 3)
+        self.assertEqual(Staff.objects.count(), 1)
+
+
+class SessionTierTests(TestCase):
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+    def test_cached_db_sessions_are_read_from_the_cache(self):
+        """Test that a logged in staff request does not read the sessions table."""
+        staff_member = Staff.objects.create_user("09120000001", "secret")
+        self.client.force_login(staff_member)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("order_board"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            any("django_session" in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_purge_sessions_deletes_expired_sessions_in_batches(self):
+        """Test that only the expired sessions are purged."""
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(
+                session_key=f"expired{number}",
+                session_data="",
+                expire_date=now - timedelta(minutes=1),
+            )
+        Session.objects.create(
+            session_key="current", session_data="", expire_date=now + timedelta(hours=1)
+        )
+        out = StringIO()
+        call_command("purge_sessions", batch_size=2, stdout=out)
+        self.assertIn("Purged 5 expired sessions.", out.getvalue())
+        self.assertEqual(
+            list(Session.objects.values_list("session_key", flat=True)), ["current"]
+        )
+
+
+class QueryStatsTests(TestCase):
+    def setUp(self):
+        """Log a staff member in and start with no recorded statistics."""
+        query_stats.clear()
+        self.addCleanup(query_stats.clear)
+        self.staff_member = Staff.objects.create_user("09120000001", "secret")
+        self.client.force_login(self.staff_member)
+
+    def stats(self, view_name):
+        return next(
+            row for row in query_stats.snapshot() if row["view_name"] == view_name
+        )
+
+    def test_queries_are_reported_per_url_name(self):
+        """Test the Server-Timing header and the statistics of a request."""
+        response = self.client.get(reverse("order_board"))
+        timing = re.fullmatch(
+            r'sql;dur=([\d.]+);desc="\d+ queries, 0 duplicated", '
+            r'app;dur=([\d.]+);desc="non-SQL", total;dur=([\d.]+)',
+            response["Server-Timing"],
+        )
+        self.assertIsNotNone(timing)
+        sql, app, total = map(float, timing.groups())
+        self.assertGreater(app, 0)
+        self.assertAlmostEqual(sql + app, total, delta=0.2)  # rounded to 0.1 ms
+        stats = self.stats("order_board")
+        self.assertEqual(stats["requests"], 1)
+        self.assertGreater(stats["max_queries"], 0)
+        self.assertEqual(stats["over_budget"], 0)
+
+        response = self.client.get(reverse("query_stats"))
+        self.assertContains(response, "order_board")
+        self.client.post(reverse("query_stats"))
+        self.assertEqual(
+            [row["view_name"] for row in query_stats.snapshot()], ["query_stats"]
+        )
+
+    @override_settings(QUERY_BUDGETS={"order_board": 0})
+    def test_exceeding_the_budget_logs_a_warning(self):
+        """Test that a request over its query budget is logged and counted."""
+        with self.assertLogs("staff.instrumentation", "WARNING") as logs:
+            self.client.get(reverse("order_board"))
+        self.assertIn("order_board ran", logs.output[0])
+        self.assertEqual(self.stats("order_board")["over_budget"], 1)
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        """Test that a statement run several times is reported once."""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for phone_number in ("09120000001", "09120000002", "09120000003"):
+                Staff.objects.filter(phone_number=phone_number).exists()
+        self.assertEqual(recorder.count, 3)
+        query_stats.record("lookup", recorder, 0.01)
+        (duplicate,) = self.stats("lookup")["duplicates"]
+        self.assertEqual(duplicate["max_repeats"], 3)
+        self.assertIn("staff_staff", duplicate["sql"])
+
+    async def test_async_views_are_recorded(self):
+        """Test that the ORM calls of an async view are counted."""
+        category = await Category.objects.acreate(name="Beverages")
+        item = await MenuItem.objects.acreate(
+            name="Tea", price=10, points=1, category=category
+        )
+        response = await self.async_client.get(
+            reverse("add_to_cart", args=[item.id]), {"quantity": 1}
+        )
+        self.assertIn("Server-Timing", response)
+        self.assertGreater(self.stats("add_to_cart")["max_queries"], 0)
@@ -15,10 +15,17 @@ urlpatterns = [
     path("Edit-product.html", views.EditProduct.as_view(), name="edit-product"),
     path("checkout/", views.staff_checkout, name="staff_checkout"),
     path("manager_checkout/", views.manager_checkout, name="manager_checkout"),
+    path("checkout/board/", views.order_board, name="order_board"),
+    path(
+        "checkout/board/events/",
+        views.order_board_events,
+        name="order_board_events",
+    ),
     path("update_staff/<int:order_id>/", views.update_order_staff, name="update_staff"),
     path("data_analysis.html", views.DataAnalysis.as_view(), name="data_analysis"),
     path("order_details/<int:order_id>/", views.order_details, name="order_details"),
     path("sale_analysis.html", views.SalesAnalysis.as_view(), name="sale_analysis"),
+    path("report/sales-series/", views.sales_series_data, name="sales_series"),
     path(
         "update_order/<int:order_id>/",
         views.update_order_status,
@@ -40,6 +47,7 @@ urlpatterns = [
         name="remove_order_item",
     ),
     path("search_customer/", views.search_customer, name="search_customer"),
+    path("query-stats/", views.query_stats_view, name="query_stats"),
     path(
         "report/top-selling-items/", views.top_selling_items, name="top_selling_items"
     ),
@@ -73,4 +81,15 @@ urlpatterns = [
     path("export_customers/", views.download_customers, name="export_customers"),
     path("export_staff/", views.download_staff, name="export_staff"),
     path("export_menu_items/", views.download_menu_items, name="export_menu_items"),
+    path("exports/<str:kind>/", views.export_data, name="export_data"),
+    path("exports/<str:kind>/changes/", views.export_changes, name="export_changes"),
+    path("exports/<str:kind>/start/", views.start_export_job, name="start_export"),
+    path(
+        "exports/jobs/<str:job_id>/", views.export_job_status, name="export_job_status"
+    ),
+    path(
+        "exports/jobs/<str:job_id>/download/",
+        views.export_job_download,
+        name="export_job_download",
+    ),
 ]
@@ -8,13 +8,25 @@ from django.contrib import messages
 from django.views.generic.edit import FormView
 from django.shortcuts import get_object_or_404
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.db import transaction
 from django.db.models import Sum, Count
 from django.utils import timezone
 from django.contrib.auth.decorators import user_passes_test
-from cafe.models import Table
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.views.decorators.http import require_POST
+from cafe.models import Cafe
+from cafe.tables import get_occupancy, release_table
+from order.events import order_events
 from order.models import Order, OrderItem
 from customer.models import Customer
+from customer.points import get_points_balances
 from menu.models import MenuItem, Category
 from .models import Staff
 from .forms import (
@@ -22,6 +34,7 @@ from .forms import (
     DataAnalysisForm,
     SaleAnalysisForm,
     OrderFilterFormManager,
+    SalesSeriesForm,
 )
 from .forms import StaffRegistrationForm
 from .report import ReportView
@@ -30,8 +43,29 @@ from .export import (
     create_customers_sheet,
     create_staff_sheet,
     create_menu_items_sheet,
-    generate_excel_response,
+    stream_excel_response,
+    stream_export_response,
+    supports_format,
+    supports_incremental,
+    changed_since,
+    parse_watermark,
+    DATASETS,
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
 )
+from .export_formats import field_name
+from .export_jobs import DONE, get_job, start_export
+from .instrumentation import query_stats
+from .pagination import order_page
+
+# The sales analysis filters served by ReportView.sales
+SALES_SERIES_FILTERS = {
+    "hourly sales": "hour",
+    "daily sales": "day",
+    "weekly sales": "week",
+    "monthly sales": "month",
+    "yearly sales": "year",
+}
 
 
 @method_decorator(login_required, name="dispatch")
@@ -411,11 +445,18 @@ def staff_checkout(request):
             ):
                 form.add_error("filter_value", "Please enter a valid value.")
             elif filter_type == "last_order":
-                orders = Order.objects.order_by("-order_date")[:1]  # Last order
+                # Last order
+                orders = Order.objects.select_related("customer", "staff").order_by(
+                    "-order_date"
+                )[:1]
                 return render(request, template_name, {"form": form, "orders": orders})
             elif filter_type == "all":
                 orders = Order.objects.all()
-                return render(request, template_name, {"form": form, "orders": orders})
+                return render(
+                    request,
+                    template_name,
+                    {"form": form, **order_page(orders, request.POST)},
+                )
             elif filter_type == "my_orders":
                 user_firstname = request.user.first_name
                 user_lastname = request.user.last_name
@@ -423,7 +464,11 @@ def staff_checkout(request):
                 orders = Order.objects.filter(
                     staff__first_name=user_firstname, staff__last_name=user_lastname
                 )
-                return render(request, template_name, {"form": form, "orders": orders})
+                return render(
+                    request,
+                    template_name,
+                    {"form": form, **order_page(orders, request.POST)},
+                )
             elif (
                 filter_type not in ("last_order", "my_orders", "all")
                 and filter_value != ""
@@ -435,7 +480,12 @@ def staff_checkout(request):
                         date_filter = datetime.datetime.strptime(
                             filter_value, "%Y-%m-%d"
                         )
-                        orders = Order.objects.filter(order_date__date=date_filter)
+                        # A range on order_date can use its index, unlike __date
+                        day_start = timezone.make_aware(date_filter)
+                        orders = Order.objects.filter(
+                            order_date__gte=day_start,
+                            order_date__lt=day_start + timedelta(days=1),
+                        )
                     except ValueError:
                         orders = (
                             Order.objects.none()
@@ -446,18 +496,14 @@ def staff_checkout(request):
                     customers = Customer.objects.filter(table_number=filter_value)
                     orders = Order.objects.filter(customer__in=customers)
 
-                # Ensure we have an order to work with
-                if orders.exists():
-                    order = (
-                        orders.first()
-                    )  # Get the first order from the filtered results
-                else:
-                    order = None  # No orders found
+                # The first order of the page, if any
+                page = order_page(orders, request.POST)
+                order = page["orders"][0] if page["orders"] else None
 
                 return render(
                     request,
                     template_name,
-                    {"form": form, "orders": orders, "order": order},
+                    {"form": form, **page, "order": order},
                 )
 
         return render(request, template_name, {"form": form})
@@ -489,7 +535,10 @@ def manager_checkout(request):
             ):
                 form.add_error("filter_value", "Please enter a valid value.")
             elif filter_type == "last_order":
-                orders = Order.objects.order_by("-order_date")[:1]  # Last order
+                # Last order
+                orders = Order.objects.select_related("customer", "staff").order_by(
+                    "-order_date"
+                )[:1]
                 return render(
                     request,
                     template_name,
@@ -500,14 +549,22 @@ def manager_checkout(request):
                 return render(
                     request,
                     template_name,
-                    {"form": form, "orders": orders, "staffs": staffs},
+                    {
+                        "form": form,
+                        **order_page(orders, request.POST),
+                        "staffs": staffs,
+                    },
                 )
             elif filter_type == "all":
                 orders = Order.objects.all()
                 return render(
                     request,
                     template_name,
-                    {"form": form, "orders": orders, "staffs": staffs},
+                    {
+                        "form": form,
+                        **order_page(orders, request.POST),
+                        "staffs": staffs,
+                    },
                 )
             elif filter_type == "my_orders":
                 user_firstname = request.user.first_name
@@ -519,7 +576,11 @@ def manager_checkout(request):
                 return render(
                     request,
                     template_name,
-                    {"form": form, "orders": orders, "staffs": staffs},
+                    {
+                        "form": form,
+                        **order_page(orders, request.POST),
+                        "staffs": staffs,
+                    },
                 )
             elif (
                 filter_type not in ("last_order", "my_orders", "all")
@@ -532,7 +593,12 @@ def manager_checkout(request):
                         date_filter = datetime.datetime.strptime(
                             filter_value, "%Y-%m-%d"
                         )
-                        orders = Order.objects.filter(order_date__date=date_filter)
+                        # A range on order_date can use its index, unlike __date
+                        day_start = timezone.make_aware(date_filter)
+                        orders = Order.objects.filter(
+                            order_date__gte=day_start,
+                            order_date__lt=day_start + timedelta(days=1),
+                        )
                     except ValueError:
                         orders = (
                             Order.objects.none()
@@ -543,39 +609,105 @@ def manager_checkout(request):
                     customers = Customer.objects.filter(table_number=filter_value)
                     orders = Order.objects.filter(customer__in=customers)
 
-                # Ensure we have an order to work with
-                if orders.exists():
-                    order = (
-                        orders.first()
-                    )  # Get the first order from the filtered results
-                else:
-                    order = None  # No orders found
+                # The first order of the page, if any
+                page = order_page(orders, request.POST)
+                order = page["orders"][0] if page["orders"] else None
 
                 return render(
                     request,
                     template_name,
-                    {"form": form, "orders": orders, "order": order, "staffs": staffs},
+                    {"form": form, **page, "order": order, "staffs": staffs},
                 )
 
         return render(request, template_name, {"form": form, "staffs": staffs})
 
 
+@login_required
+def order_board(request):
+    """Renders the live order board, which the browser keeps up to date from
+    the order event stream, with the free and occupied tables of each cafe.
+    The stream starts after the newest event published before the orders were
+    read, so the board misses no change made while the page loads.
+    Returns:
+        Rendered order board with the newest orders.
+    """
+    last_event_id = order_events.last_event_id()
+    occupancy = get_occupancy().summary()
+    cafes = Cafe.objects.in_bulk(list(occupancy))
+    tables = [
+        {"cafe": cafes.get(cafe_id), **numbers}
+        for cafe_id, numbers in occupancy.items()
+    ]
+    return render(
+        request,
+        "order_board.html",
+        {
+            **order_page(Order.objects.all(), request.GET),
+            "tables": tables,
+            "last_event_id": last_event_id,
+        },
+    )
+
+
+@login_required
+async def order_board_events(request):
+    """Streams order-created and status-changed events as server-sent events.
+
+    The stream stays open for as long as the browser listens, so it must be
+    served over ASGI (config/asgi.py). A browser that reconnects sends the ID
+    of the last event it got and receives the events it missed; the first
+    connection gives it as the ``last_event_id`` query parameter instead.
+    Returns:
+        Streaming text/event-stream response.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id", ""
+    )
+    response = StreamingHttpResponse(
+        order_events.stream(int(last_event_id) if last_event_id.isdigit() else None),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # ask proxies not to buffer the events
+    return response
+
+
+@login_required
+def query_stats_view(request):
+    """Renders the SQL statistics of this process per URL name, most queries
+    first, recorded by the query stats middleware (staff/instrumentation.py).
+    A POST clears them.
+    Returns:
+        Rendered query stats page.
+    """
+    if request.method == "POST":
+        query_stats.clear()
+        return redirect("query_stats")
+    return render(request, "query_stats.html", {"views": query_stats.snapshot()})
+
+
 @login_required
 def update_order_status(request, order_id):
     """Updates the status of a specific order.
+
+    The order's table is freed only when the order becomes Completed, in the
+    transaction that saves it, with the order row locked: completing an order
+    twice (a resubmitted form, a stale tab) must not free the table of the
+    next customer.
     Returns:
         Redirect to the staff checkout page.
     """
     if request.method == "POST":
-        order = get_object_or_404(Order, id=order_id)
         new_status = request.POST.get("status")
-        order.status = new_status
-        if new_status == "Completed":
-            table = Table.objects.get(number=order.customer.table_number)
-            print(table.number)
-            table.status = "A"
-            table.save()
-        order.save()
+        with transaction.atomic():
+            order = get_object_or_404(Order.objects.select_for_update(), id=order_id)
+            completing = (
+                new_status == "Completed" and order._loaded_status != "Completed"
+            )
+            order.status = new_status
+            order.save()
+            if completing:
+                release_table(order.cafe_id, order.table_number)
         return redirect("staff_checkout")
 
 
@@ -798,7 +930,11 @@ class DataAnalysis(View):
                 )
 
             elif filter_type == "peak business hour":
-                orders = ReportView.peak_business_hour(self)
+                orders = ReportView.peak_business_hour(
+                    self,
+                    start=form.cleaned_data["start_date"],
+                    end=form.cleaned_data["end_date"],
+                )
                 return render(
                     request, "data_analysis.html", {"form": form, "orders": orders}
                 )
@@ -856,26 +992,44 @@ class SalesAnalysis(View):
                     request, "sale_analysis.html", {"orders": context, "form": form}
                 )
 
-            elif filter_type == "daily sales":
-                context = ReportView.daily_sales(self)
-                return render(
-                    request, "sale_analysis.html", {"form": form, "orders": context}
-                )
-
-            elif filter_type == "monthly sales":
-                context = ReportView.monthly_sales(self)
-                return render(
-                    request, "sale_analysis.html", {"form": form, "orders": context}
+            elif filter_type in SALES_SERIES_FILTERS:
+                series = ReportView().sales(
+                    SALES_SERIES_FILTERS[filter_type],
+                    start=form.cleaned_data["start_date"],
+                    end=form.cleaned_data["end_date"],
                 )
-            elif filter_type == "yearly sales":
-                context = ReportView.yearly_sales(self)
                 return render(
-                    request, "sale_analysis.html", {"form": form, "orders": context}
+                    request, "sale_analysis.html", {"form": form, "series": series}
                 )
             else:
                 form.add_error("filter_type", "Please enter a valid value.")
 
 
+@user_passes_test(lambda u: u.is_superuser)
+@login_required
+def sales_series_data(request):
+    """
+    Returns a sales series as JSON columns.
+
+    Query parameters (all optional):
+        granularity: hour, day (the default), week, month or year.
+        start_date, end_date: The first and last days of the series.
+        category, item, staff: IDs to restrict the series to.
+    """
+    form = SalesSeriesForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    series = ReportView().sales(
+        form.cleaned_data["granularity"] or "day",
+        start=form.cleaned_data["start_date"],
+        end=form.cleaned_data["end_date"],
+        category=form.cleaned_data["category"],
+        item=form.cleaned_data["item"],
+        staff=form.cleaned_data["staff"],
+    )
+    return JsonResponse(series.to_dict())
+
+
 @login_required
 def search_customer(request):
     """
@@ -890,8 +1044,11 @@ def search_customer(request):
     if request.method == "GET":
         phone_number = request.GET.get("phone_number", "")
         if phone_number:
-            customers = Customer.objects.filter(phone_number=phone_number)
+            customers = list(Customer.objects.filter(phone_number=phone_number))
             # order = Order.objects.filter(customer__phone_number=phone_number)
+            balances = get_points_balances(customer.pk for customer in customers)
+            for customer in customers:
+                customer.points_balance = balances.get(customer.pk, customer.points)
     return render(request, "search_customer.html", {"customers": customers})
 
 
@@ -1034,26 +1191,150 @@ def customer_order_history_report(request):
 @user_passes_test(lambda u: u.is_superuser)
 @login_required
 def download_orders(request):
-    workbook = create_orders_sheet()
-    return generate_excel_response(workbook, "orders_data.xlsx")
+    workbook = create_orders_sheet(write_only=True)
+    return stream_excel_response(workbook, "orders_data.xlsx")
 
 
 @user_passes_test(lambda u: u.is_superuser)
 @login_required
 def download_customers(request):
-    workbook = create_customers_sheet()
-    return generate_excel_response(workbook, "customers_data.xlsx")
+    workbook = create_customers_sheet(write_only=True)
+    return stream_excel_response(workbook, "customers_data.xlsx")
 
 
 @user_passes_test(lambda u: u.is_superuser)
 @login_required
 def download_staff(request):
-    workbook = create_staff_sheet()
-    return generate_excel_response(workbook, "staff_data.xlsx")
+    workbook = create_staff_sheet(write_only=True)
+    return stream_excel_response(workbook, "staff_data.xlsx")
 
 
 @user_passes_test(lambda u: u.is_superuser)
 @login_required
 def download_menu_items(request):
-    workbook = create_menu_items_sheet()
-    return generate_excel_response(workbook, "menu_items_data.xlsx")
+    workbook = create_menu_items_sheet(write_only=True)
+    return stream_excel_response(workbook, "menu_items_data.xlsx")
+
+
+def export_job_payload(job):
+    """Return the public fields of an export job with its URLs."""
+    payload = {
+        "job_id": job["id"],
+        "export": job["kind"],
+        "format": job["format"],
+        "status": job["status"],
+        "error": job["error"],
+        "status_url": reverse("export_job_status", args=[job["id"]]),
+    }
+    if job["status"] == DONE:
+        payload["download_url"] = reverse("export_job_download", args=[job["id"]])
+    return payload
+
+
+def requested_export_format(request, kind):
+    """
+    Return the export format named by the ``format`` parameter (XLSX by default).
+
+    Raises:
+        Http404: If the dataset does not exist.
+    """
+    if kind not in DATASETS:
+        raise Http404("Unknown export.")
+    return request.GET.get("format", "xlsx")
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@login_required
+def export_data(request, kind):
+    """
+    Stream a dataset in the format given by the ``format`` query parameter:
+    xlsx, csv (gzip-compressed), jsonl (gzip-compressed) or columnar.
+
+    For orders and order totals, a ``since`` watermark restricts the export to
+    the rows changed after it.
+    """
+    export_format = requested_export_format(request, kind)
+    if not supports_format(kind, export_format):
+        return HttpResponseBadRequest(f"{kind} cannot be exported as {export_format}.")
+    since = request.GET.get("since")
+    if since is not None:
+        if not supports_incremental(kind):
+            return HttpResponseBadRequest(f"{kind} cannot be exported incrementally.")
+        try:
+            parse_watermark(since)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+    return stream_export_response(kind, export_format, since)
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@login_required
+def export_changes(request, kind):
+    """
+    Return a page of the rows changed after the ``since`` watermark as JSON,
+    with the watermark of the next page.
+
+    Query parameters:
+        since: The watermark returned by the previous page, a row ID or an ISO
+            date or datetime; the first page starts from the oldest change.
+        limit: The page size, at most staff.export.EXPORT_CHUNK_SIZE rows.
+    """
+    if kind not in DATASETS:
+        raise Http404("Unknown export.")
+    if not supports_incremental(kind):
+        return HttpResponseBadRequest(f"{kind} cannot be exported incrementally.")
+    try:
+        limit = min(int(request.GET.get("limit", EXPORT_CHUNK_SIZE)), EXPORT_CHUNK_SIZE)
+        page = changed_since(kind, request.GET.get("since"), max(limit, 1))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    keys = [field_name(column) for column in DATASETS[kind]["columns"]]
+    page["rows"] = [dict(zip(keys, row)) for row in page["rows"]]
+    return JsonResponse(page)
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@login_required
+@require_POST
+def start_export_job(request, kind):
+    """
+    Start a background export and return its job ID at once.
+
+    Args:
+        kind (str): The dataset to export, a key of staff.export.DATASETS. The
+            ``format`` query parameter selects the file format.
+    """
+    export_format = requested_export_format(request, kind)
+    if not supports_format(kind, export_format):
+        return HttpResponseBadRequest(f"{kind} cannot be exported as {export_format}.")
+    job = start_export(kind, export_format)
+    return JsonResponse(export_job_payload(job), status=202)
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@login_required
+def export_job_status(request, job_id):
+    """Report the status of a background export."""
+    job = get_job(job_id)
+    if job is None:
+        raise Http404("Unknown export job.")
+    return JsonResponse(export_job_payload(job))
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@login_required
+def export_job_download(request, job_id):
+    """Download the file built by a finished background export."""
+    job = get_job(job_id)
+    if job is None or job["status"] != DONE:
+        raise Http404("The export is not ready.")
+    try:
+        spooled_file = open(job["path"], "rb")
+    except FileNotFoundError:
+        raise Http404("The export has expired.")
+    return FileResponse(
+        spooled_file,
+        as_attachment=True,
+        filename=job["filename"],
+        content_type=EXPORT_FORMATS[job["format"]]["content_type"],
+    )